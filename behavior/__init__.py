@@ -1,11 +1,11 @@
 from .configuration import Configuration
 
-from .data import (Agent, AgentTuple, cut_to_windows, Block, Confidence, ConfidenceCategory, ConfidenceComparer,
-                   Direction, Speed, Distance, DistanceChange, MutualDirection, SingleBlock,
+from .data import (Agent, AgentTuple, cut_to_windows, Block, BlockDataset, Confidence, ConfidenceArray, ConfidenceCategory,
+                   ConfidenceComparer, Direction, Speed, Distance, DistanceChange, MutualDirection, SingleBlock,
                    TimeFrame, RelativeTimeFrame, TupleBlock, BehaviorVariable, AgentVariable)
 from .configuration import ConfidenceConjunctionStrategy
 
-from .node import (BehaviorNode, StateNode, MutualStateNode, ActorTargetStateNode, Factory, ConjunctionNode,
+from .node import (BehaviorNode, LayerCache, StateNode, MutualStateNode, ActorTargetStateNode, Factory, ConjunctionNode,
                    DisjunctionNode, NegationNode, ConfidenceRestrictingNode, TimeRestrictingNode, SequentialNode)
 
 from .time_graph import (TimeGraphLayer, LambdaTimeGraphLayer, DenseTimeGraphLayer, ContractedTimeGraphLayer, TimeGraph,
@@ -14,3 +14,4 @@ from .time_graph import (TimeGraphLayer, LambdaTimeGraphLayer, DenseTimeGraphLay
 from .grammar import parse_behavior
 
 from .template import BehaviorTemplate
+from .search import SearchProgress, CancellationToken
@@ -23,6 +23,15 @@ class Configuration:
     max_memory: int = 3
     """Limit for maximum paths kept in each node in time graph computing."""
 
+    prune_dead_ends: bool = True
+    """Skip time graph nodes from which the end of the graph cannot be reached in time graph computing."""
+
+    layer_cache_memory: int = 64 * 2 ** 20
+    """Memory budget of layer cache (see LayerCache) in bytes, least recently used entries are evicted beyond it."""
+
+    window_cache_size: int = 256
+    """Number of sets of agents whose windows are cached (see WindowCache) during search."""
+
     debug: bool = False
     """Debug mode triggers some additional steps for computing (for better information during breakpoint inspection)"""
 
@@ -1,8 +1,13 @@
 from .agent import Agent, AgentTuple, cut_to_windows
 from .block import Block
-from .confidence import Confidence, ConfidenceCategory, ConfidenceComparer
+from .dataset import BlockDataset
+from .confidence import Confidence, ConfidenceArray, ConfidenceCategory, ConfidenceComparer
 from .features import Direction, Speed, Distance, DistanceChange, MutualDirection
+from .presence import PresenceIndex
+from .relation import RelationIndex
 from .single_block import SingleBlock
-from .time_frame import TimeFrame, RelativeTimeFrame
+from .time_frame import TimeFrame, RelativeTimeFrame, to_micros, from_micros
 from .tuple_block import TupleBlock
 from .variable import BehaviorVariable, AgentVariable
+from .window_cache import WindowCache
+from .window_table import WindowTable, MISSING
@@ -2,12 +2,16 @@ from __future__ import annotations
 
 import bisect
 from datetime import datetime, timedelta
-from typing import cast, TypeAlias
+from typing import cast
 
-from .block import Block
+import numpy as np
+
+from .block import Block, GranulatedWindows
+from .features import FEATURE_CODES
 from .single_block import SingleBlock
-from .time_frame import TimeFrame
+from .time_frame import TimeFrame, to_micros
 from .tuple_block import TupleBlock
+from .window_table import WindowTable, BlockSection, TupleBlockSection, BlockWindow
 
 
 class BlockList:
@@ -72,6 +76,27 @@ class BlockList:
     def duration(self) -> timedelta:
         return self.blocks[-1].end_time - self.blocks[0].start_time
 
+    @property
+    def start_time(self) -> datetime | None:
+        """
+        Start of the first block, None if there are no blocks.
+        """
+        return self.blocks[0].start_time if len(self.blocks) > 0 else None
+
+    def micro_times(self, reference_time: datetime) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Start and end times of blocks, in microseconds since reference time.
+        """
+        return (np.array([to_micros(block.start_time - reference_time) for block in self.blocks], dtype=np.int64),
+                np.array([to_micros(block.end_time - reference_time) for block in self.blocks], dtype=np.int64))
+
+    def feature_codes(self, feature: str) -> np.ndarray:
+        """
+        Codes of a feature of blocks (see features), by attribute name of the feature.
+        """
+        codes = FEATURE_CODES[feature]
+        return np.array([codes[getattr(block, feature)] for block in self.blocks], dtype=np.uint8)
+
 
 class Agent(BlockList):
     """
@@ -102,11 +127,6 @@ class Agent(BlockList):
         return f"Agent({self.agent_id}, {self.blocks[:2]}{"..." if len(self.blocks) > 0 else ""})"
 
 
-BlockSection: TypeAlias = list[SingleBlock | None]
-TupleBlockSection: TypeAlias = list[list[TupleBlock | None]]
-BlockWindow: TypeAlias = tuple[BlockSection, TupleBlockSection, timedelta]
-
-
 class AgentTuple(BlockList):
     """
     Class corresponding to a semantically enriched trajectory pair.
@@ -142,28 +162,19 @@ class AgentTuple(BlockList):
 
 def cut_to_windows(agents: list[Agent], agent_tuples: list[AgentTuple],
                    strip_incomplete: bool = False,
-                   max_window_size: timedelta = timedelta(seconds=1)) -> list[BlockWindow]:
-    windows: list[BlockWindow] = []
-    for block_section, (start_offset, end_offset) in Block.granulate(*[agent.blocks for agent in agents],
-                                                                     *[agent_tuple.blocks for agent_tuple in
-                                                                       agent_tuples],
-                                                                     strip_incomplete=strip_incomplete,
-                                                                     max_window_size=max_window_size):
-
-        single_block_section = cast(list[SingleBlock], block_section[:len(agents)])
-        traj_to_idx = {agent.agent_id: i for i, agent in enumerate(agents)}
-
-        tuple_block_section = cast(list[TupleBlock], block_section[len(agents):])
-
-        tuple_block_section_map = [[None for _ in agents] for _ in agents]
-        for agent_tuple, tuple_block in zip(agent_tuples, tuple_block_section):
-            actor_id = agent_tuple.actor.agent_id
-            actor_idx = traj_to_idx[actor_id]
-            target_id = agent_tuple.target.agent_id
-            target_idx = traj_to_idx[target_id]
-            tuple_block_section_map[actor_idx][target_idx] = tuple_block
-
-        duration = end_offset - start_offset
-
-        windows.append((single_block_section, tuple_block_section_map, duration))
-    return windows
+                   max_window_size: timedelta = timedelta(seconds=1)) -> WindowTable:
+    """
+    Cut agents and their agent tuples into windows, granulated from their blocks (see Block.granulate).
+    :param agents: Agents in the order of windows' sections.
+    :param agent_tuples: Agent tuples of agents.
+    :param strip_incomplete: If set to true, windows with an agent or an agent tuple with no spanning block are skipped.
+    :param max_window_size: Maximal size of each window.
+    :return: Table of windows, also a sequence of windows as BlockWindow.
+    """
+    block_lists: list[BlockList] = [*agents, *agent_tuples]
+    reference_time = min([block_list.start_time for block_list in block_lists if block_list.start_time is not None],
+                         default=datetime.min)
+    granulated = GranulatedWindows.granulate(reference_time,
+                                             [block_list.micro_times(reference_time) for block_list in block_lists],
+                                             strip_incomplete, max_window_size)
+    return WindowTable.from_granulated(granulated, agents, agent_tuples)
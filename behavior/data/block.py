@@ -3,6 +3,10 @@ from __future__ import annotations
 from datetime import datetime, timedelta
 from typing import Generator
 
+import numpy as np
+
+from .time_frame import to_micros, from_micros
+
 
 class Block:
     """
@@ -12,6 +16,9 @@ class Block:
     start_time: datetime
     end_time: datetime
 
+    min_window_size = timedelta(seconds=0.2)
+    """Granulated windows of at most this size are skipped"""
+
     def __init__(self, start_time: datetime, end_time: datetime):
         self.start_time = start_time
         self.end_time = end_time
@@ -71,72 +78,113 @@ class Block:
         :return: Generator yielding tuples containing the window (list of blocks and Nones of length equal to that of
         block_groups), and tuple of date-times specifying the start and end datetime of the yielded window.
         """
+        windows = Block.granulate_indexes(*block_groups, strip_incomplete=strip_incomplete,
+                                          max_window_size=max_window_size)
+        for idx, block_idxs in enumerate(windows.block_idxs.tolist()):
+            start_time, end_time = windows.time_frame(idx)
+            yield ([block_group[block_idx].during_time(start_time, end_time) if block_idx >= 0 else None
+                    for block_group, block_idx in zip(block_groups, block_idxs)],
+                   (start_time, end_time))
+
+    @staticmethod
+    def granulate_indexes(*block_groups: list["Block"], strip_incomplete: bool = True,
+                          max_window_size: timedelta = timedelta(seconds=1)) -> GranulatedWindows:
+        """
+        Granulate provided lists of blocks into windows as granulate does, but return indexes of blocks spanning each
+        window instead of their sections.
+        Windows are cut at every boundary of any block (and subdivided by max_window_size), windows of at most 0.2
+        seconds are skipped, as are windows with no spanning block or, if strip_incomplete is set, with a block group
+        having no spanning block.
+        :param block_groups: Lists of chronologically ordered blocks with no overlap.
+        :param strip_incomplete: If set to true, all windows which have a block group with no spanning block will be
+        skipped.
+        :param max_window_size: Maximal size of each window.
+        :return: Granulated windows.
+        """
+        present_groups = [block_group for block_group in block_groups if len(block_group) > 0]
+        reference_time = min([block_group[0].start_time for block_group in present_groups], default=datetime.min)
+        times = [(np.array([to_micros(block.start_time - reference_time) for block in block_group], dtype=np.int64),
+                  np.array([to_micros(block.end_time - reference_time) for block in block_group], dtype=np.int64))
+                 for block_group in block_groups]
+        return GranulatedWindows.granulate(reference_time, times, strip_incomplete, max_window_size)
+
+
+class GranulatedWindows:
+    """
+    Windows of lists of blocks (see Block.granulate_indexes), held as arrays of their bounds and of indexes of blocks
+    spanning them.
+    """
+
+    reference_time: datetime
+    starts: np.ndarray
+    """Start of each window, in microseconds since reference time"""
+    ends: np.ndarray
+    """End of each window, in microseconds since reference time"""
+    block_idxs: np.ndarray
+    """Index of the block spanning each window in each block group (of shape windows x groups), -1 if none does"""
+
+    def __init__(self, reference_time: datetime, starts: np.ndarray, ends: np.ndarray, block_idxs: np.ndarray):
+        self.reference_time = reference_time
+        self.starts = starts
+        self.ends = ends
+        self.block_idxs = block_idxs
+
+    @staticmethod
+    def granulate(reference_time: datetime, times: list[tuple[np.ndarray, np.ndarray]], strip_incomplete: bool,
+                  max_window_size: timedelta) -> GranulatedWindows:
+        """
+        Granulate block groups given by times of their blocks (see Block.granulate_indexes).
+        :param reference_time: Time the times of blocks are relative to.
+        :param times: Start and end times of blocks of each group, in microseconds since reference time.
+        """
+        if not any(len(group_starts) > 0 for group_starts, _ in times):
+            empty = np.zeros(0, dtype=np.int64)
+            return GranulatedWindows(reference_time, empty, empty, np.zeros((0, len(times)), dtype=np.int64))
+
+        # Natural bounds of windows are all bounds of blocks, windows longer than max_window_size are subdivided
+        bounds = np.unique(np.concatenate([time for group_times in times for time in group_times]))
+        # Any size over the total duration subdivides nothing (and does not overflow)
+        max_size = min(to_micros(max_window_size), int(bounds[-1] - bounds[0]) + 1)
+        lengths = np.diff(bounds)
+        subdivisions = (lengths - 1) // max_size + 1
+        interval_idxs = np.repeat(np.arange(len(lengths)), subdivisions)
+        subdivision_idxs = np.arange(len(interval_idxs)) - np.repeat(np.cumsum(subdivisions) - subdivisions,
+                                                                     subdivisions)
+        starts = bounds[interval_idxs] + subdivision_idxs * max_size
+        ends = np.minimum(starts + max_size, bounds[interval_idxs + 1])
+
+        # Window is spanned by the first block of a group ending after its start, if the block starts before its end
+        block_idxs = np.full((len(starts), len(times)), -1, dtype=np.int64)
+        for group_idx, (group_starts, group_ends) in enumerate(times):
+            if len(group_starts) == 0:
+                continue
+            idxs = np.searchsorted(group_ends, starts, side='right')
+            is_spanned = idxs < len(group_ends)
+            is_spanned[is_spanned] &= group_starts[idxs[is_spanned]] < ends[is_spanned]
+            block_idxs[is_spanned, group_idx] = idxs[is_spanned]
+
+        is_spanned = block_idxs >= 0
+        is_kept = (ends - starts > to_micros(Block.min_window_size)) & is_spanned.any(axis=1)
+        if strip_incomplete:
+            is_kept &= is_spanned.all(axis=1)
+        return GranulatedWindows(reference_time, starts[is_kept], ends[is_kept], block_idxs[is_kept])
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def durations(self) -> np.ndarray:
+        """
+        Duration of each window in microseconds.
+        """
+        return self.ends - self.starts
 
-        # indexes of blocks we are working with
-        block_section_idxs = [0 for _ in block_groups]
-        # references to blocks we are working with
-        block_section: list[Block | None] = [bg[0] if len(bg) > 0 else None for bg in block_groups]
-        # absolute start time of passed trajectories
-        start_time = min(block.start_time for block in block_section if block is not None)
-        # absolute end time of passed trajectories
-        end_time = max(block_group[-1].end_time for block_group in block_groups if len(block_group) > 0 and block_group[-1] is not None)
-
-        # time bounds that will define the next yielded time window
-
-        # INV: everything before left_bound_time was yielded
-        left_bound_time = start_time
-        # needs to be determined as the minimal of all potential bounds in block section
-        # - for blocks that started before (or at) left_bound_time - their end_time
-        # - for blocks that will start after left_bound_time - their start_time
-        right_bound_time = end_time
-
-        exhausted_block_idxs = []
-        while left_bound_time < end_time:
-            for i, block in enumerate(block_section):
-                if block is None:
-                    continue
-                # inside block
-                if block.start_time <= left_bound_time:
-                    if right_bound_time < block.end_time:
-                        pass
-                    elif right_bound_time == block.end_time:
-                        exhausted_block_idxs.append(i)
-                    elif right_bound_time > block.end_time:
-                        right_bound_time = block.end_time
-                        exhausted_block_idxs = [i]
-                # first block in agent that is not the earliest
-                else:
-                    if right_bound_time > block.start_time:
-                        right_bound_time = block.start_time
-                        exhausted_block_idxs = []
-                    else:
-                        pass
-
-            if right_bound_time - left_bound_time > max_window_size:
-                right_bound_time = left_bound_time + max_window_size
-                exhausted_block_idxs = []
-
-            sliding_window = [block.during_time(left_bound_time, right_bound_time)
-                              if block is not None and block.start_time < right_bound_time
-                              else None
-                              for block in block_section]
-            # print(f"Sliding window with {sum([x is not None for x in sliding_window])} values from {left_bound_time} to {right_bound_time}")
-            if left_bound_time + timedelta(seconds=0.2) >= right_bound_time:
-                pass  # print("LBT >= RBT")
-            elif all([b is None for b in sliding_window]):
-                pass  # print("Window empty", right_bound_time - left_bound_time)
-            elif strip_incomplete and None in sliding_window:
-                pass
-            else:
-                yield sliding_window, (left_bound_time, right_bound_time)
-
-            for block_idx in exhausted_block_idxs:
-                next_block_idx = block_section_idxs[block_idx] + 1
-                block_section_idxs[block_idx] += 1
-                if next_block_idx >= len(block_groups[block_idx]):
-                    block_section[block_idx] = None
-                else:
-                    block_section[block_idx] = block_groups[block_idx][next_block_idx]
-
-            left_bound_time = right_bound_time
-            right_bound_time = end_time
+    def time_frame(self, idx: int) -> tuple[datetime, datetime]:
+        return (self.reference_time + from_micros(int(self.starts[idx])),
+                self.reference_time + from_micros(int(self.ends[idx])))
+
+    def select(self, group_idxs: list[int]) -> GranulatedWindows:
+        """
+        Windows with block groups selected (and ordered) by their indexes.
+        """
+        return GranulatedWindows(self.reference_time, self.starts, self.ends, self.block_idxs[:, group_idxs])
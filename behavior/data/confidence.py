@@ -5,7 +5,9 @@ import math
 from enum import Enum
 from functools import cmp_to_key
 from operator import itemgetter
-from typing import Callable, Any
+from typing import Callable, Any, Iterable, Iterator
+
+import numpy as np
 
 
 class ConfidenceCategory(Enum):
@@ -41,6 +43,20 @@ class Confidence(collections.namedtuple('Confidence', ['nom', 'denom'])):
     def __mul__(self, other: float) -> Confidence:
         return Confidence(self.nom * other, self.denom * other)
 
+    @property
+    def category(self) -> ConfidenceCategory:
+        if self.nom == float('inf') and self.denom == float('inf'):
+            return ConfidenceCategory.ABSOLUTE
+        if self.nom == 0 and self.denom == 0:
+            return ConfidenceCategory.IMPARTIAL
+        if self.nom == 0 and self.denom == float('inf'):
+            return ConfidenceCategory.IMPOSSIBLE
+        if self.nom == 0:
+            return ConfidenceCategory.IMPROBABLE
+        if self.nom == self.denom:
+            return ConfidenceCategory.CERTAIN
+        return ConfidenceCategory.UNCERTAIN
+
     def __repr__(self):
         return f"Confidence({self.nom}, {self.denom})"
 
@@ -64,6 +80,108 @@ class Confidence(collections.namedtuple('Confidence', ['nom', 'denom'])):
         return Confidence(float('inf'), float('inf'))
 
 
+class ConfidenceArray:
+    """
+    Columnar counterpart of Confidence, holding a sequence of confidences as paired arrays of nominators and
+    denominators. Operations are element-wise and mirror those of Confidence.
+    """
+
+    noms: np.ndarray
+    denoms: np.ndarray
+
+    def __init__(self, noms: np.ndarray | list[float], denoms: np.ndarray | list[float]):
+        self.noms = np.asarray(noms, dtype=np.float64)
+        self.denoms = np.asarray(denoms, dtype=np.float64)
+        if self.noms.shape != self.denoms.shape:
+            raise ValueError(f"Nominators and denominators differ in shape: {self.noms.shape}, {self.denoms.shape}")
+
+    @staticmethod
+    def from_confidences(confidences: Iterable[Confidence]) -> ConfidenceArray:
+        confidences = list(confidences)
+        return ConfidenceArray([nom for nom, _ in confidences], [denom for _, denom in confidences])
+
+    def to_confidences(self) -> list[Confidence]:
+        return [Confidence(nom, denom) for nom, denom in zip(self.noms.tolist(), self.denoms.tolist())]
+
+    @staticmethod
+    def impossible(size: int) -> ConfidenceArray:
+        return ConfidenceArray(np.zeros(size), np.full(size, np.inf))
+
+    @staticmethod
+    def impartial(size: int) -> ConfidenceArray:
+        return ConfidenceArray(np.zeros(size), np.zeros(size))
+
+    def __len__(self):
+        return len(self.noms)
+
+    def __getitem__(self, key) -> Confidence | ConfidenceArray:
+        if isinstance(key, (int, np.integer)):
+            return Confidence(float(self.noms[key]), float(self.denoms[key]))
+        return ConfidenceArray(self.noms[key], self.denoms[key])
+
+    def __iter__(self) -> Iterator[Confidence]:
+        return iter(self.to_confidences())
+
+    def __add__(self, other: ConfidenceArray | Confidence) -> ConfidenceArray:
+        if isinstance(other, Confidence):
+            return ConfidenceArray(self.noms + other.nom, self.denoms + other.denom)
+        return ConfidenceArray(self.noms + other.noms, self.denoms + other.denoms)
+
+    def __mul__(self, other: float | np.ndarray) -> ConfidenceArray:
+        return ConfidenceArray(self.noms * other, self.denoms * other)
+
+    def __truediv__(self, other: float | np.ndarray) -> ConfidenceArray:
+        return ConfidenceArray(self.noms / other, self.denoms / other)
+
+    def complement(self) -> ConfidenceArray:
+        """
+        Complements of confidences, i.e., confidences of their negations.
+        """
+        with np.errstate(invalid='ignore'):
+            return ConfidenceArray(self.denoms - self.noms, self.denoms)
+
+    def where(self, condition: np.ndarray, other: ConfidenceArray | Confidence) -> ConfidenceArray:
+        """
+        Element-wise selection of confidences, keeping those where condition holds and taking other's otherwise.
+        """
+        if isinstance(other, Confidence):
+            other_noms, other_denoms = other
+        else:
+            other_noms, other_denoms = other.noms, other.denoms
+        return ConfidenceArray(np.where(condition, self.noms, other_noms), np.where(condition, self.denoms, other_denoms))
+
+    def conformities(self) -> np.ndarray:
+        """
+        Vectorized float() of confidences. Impartial confidences (0 / 0), for which float() fails, result in NaN.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            conformities = self.noms / self.denoms
+        return np.where((self.noms == np.inf) & (self.denoms == np.inf), 1.0, conformities)
+
+    def categories(self) -> np.ndarray:
+        """
+        Vectorized Confidence.category.
+        :return: Array of values of ConfidenceCategory members.
+        """
+        is_zero = self.noms == 0
+        return np.select(
+            [(self.noms == np.inf) & (self.denoms == np.inf),
+             is_zero & (self.denoms == 0),
+             is_zero & (self.denoms == np.inf),
+             is_zero,
+             self.noms == self.denoms],
+            [ConfidenceCategory.ABSOLUTE.value,
+             ConfidenceCategory.IMPARTIAL.value,
+             ConfidenceCategory.IMPOSSIBLE.value,
+             ConfidenceCategory.IMPROBABLE.value,
+             ConfidenceCategory.CERTAIN.value],
+            ConfidenceCategory.UNCERTAIN.value
+        )
+
+    def __repr__(self):
+        return f"ConfidenceArray({self.noms.tolist()}, {self.denoms.tolist()})"
+
+
 class ConfidenceComparer:
     """
     Configurable comparer instance used to create an absolute ordering of confidences.
@@ -92,9 +210,53 @@ class ConfidenceComparer:
         cmp = self.compare(c1, c2)
         return int(math.copysign(1, cmp))
 
+    def compare_arrays(self,
+                       noms1: np.ndarray | float, denoms1: np.ndarray | float,
+                       noms2: np.ndarray | float, denoms2: np.ndarray | float) -> np.ndarray:
+        """
+        Vectorized counterpart of compare, comparing confidences given by their nominators and denominators
+        element-wise. Scalars are broadcast, so that an array of confidences can be compared against a single one.
+        :return: Array of values between -1 and 1, as returned by compare for each pair of confidences.
+        Signs of the values correspond to those of compare_int, including signed zeros (see numpy.signbit).
+        """
+        noms1 = np.asarray(noms1, dtype=np.float64)
+        denoms1 = np.asarray(denoms1, dtype=np.float64)
+        noms2 = np.asarray(noms2, dtype=np.float64)
+        denoms2 = np.asarray(denoms2, dtype=np.float64)
+        return self.param * ConfidenceComparer._compare_arrays_by_time(noms1, noms2) + \
+            (1 - self.param) * ConfidenceComparer._compare_arrays_by_confidence(noms1, denoms1, noms2, denoms2)
+
+    def min_accepted_conformity(self, threshold: Confidence) -> float:
+        """
+        Get a lower bound of conformity of confidences comparing at least equal to threshold (i.e., for which
+        compare_int(c, threshold) >= 0). The time term of the comparison is less than 1, so it can make up for at
+        most t / (1 - t) of conformity.
+        :param threshold: Confidence compared against.
+        :return: Least conformity an accepted confidence may have, -inf if any conformity may be accepted.
+        """
+        if self.param >= 1:
+            return float('-inf')
+        return ConfidenceComparer._conformity(threshold) - self.param / (1 - self.param)
+
+    def get_scalar_key(self) -> Callable[[Confidence], float] | None:
+        """
+        Get a key mapping confidences to floats, ordered the same way as by compare_int. Such key exists only for
+        t = 0 (conformity, with impartial confidences as 0) and t = 1 (nominator). For any other t, the comparison
+        mixes a difference of conformities with a ratio of nominators, which is not transitive
+        (e.g., 1.03/1.26 < 2.35/6.09 < 3.70/132.25 < 1.03/1.26 for t = 0.5), hence no such key exists.
+        :return: Callable scalar key, or None if comparer has no scalar key.
+        """
+        if self.param == 0:
+            return ConfidenceComparer._conformity
+        if self.param == 1:
+            return itemgetter(0)
+        return None
+
     def get_key_sorter(self, getter: None | int | Callable[[Any], Confidence] = None) -> Callable | None:
         """
         Convert comparer to a key selector function (i.e., used in built-ins such as sum or sort).
+        If comparer has a scalar key (see get_scalar_key), it is used directly, otherwise keys compare pairwise
+        via compare_int.
         :param getter: Direction to the getter. Can be None, int as an index selector in lists of tuples,
         or Callable to get the value dynamically.
         :return: A Callable key selector usable for key=... arguments.
@@ -103,8 +265,21 @@ class ConfidenceComparer:
             return None
         if isinstance(getter, int):
             getter = itemgetter(getter)
+
+        scalar_key = self.get_scalar_key()
+        if scalar_key is not None:
+            return lambda item: scalar_key(getter(item))
         return cmp_to_key(lambda be1, be2: self.compare_int(getter(be1), getter(be2)))
 
+    @staticmethod
+    def _conformity(c: Confidence) -> float:
+        """
+        Conformity (float() value) of confidence, with impartial confidence (0 / 0) being treated as 0.
+        """
+        if c.nom == 0 and c.denom == 0:
+            return 0.0
+        return float(c)
+
     @staticmethod
     def _compare_by_confidence(c1: Confidence, c2: Confidence) -> float:
         """
@@ -137,6 +312,34 @@ class ConfidenceComparer:
             nom_div = c1.nom / c2.nom
             return nom_div - 1
 
+    @staticmethod
+    def _conformity_array(noms: np.ndarray, denoms: np.ndarray) -> np.ndarray:
+        """
+        Vectorized float() of confidences, with impartial confidences (0 / 0) being treated as 0.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            conformity = noms / denoms
+        conformity = np.where((noms == np.inf) & (denoms == np.inf), 1.0, conformity)
+        return np.where((noms == 0) & (denoms == 0), 0.0, conformity)
+
+    @staticmethod
+    def _compare_arrays_by_confidence(noms1: np.ndarray, denoms1: np.ndarray,
+                                      noms2: np.ndarray, denoms2: np.ndarray) -> np.ndarray:
+        """
+        Vectorized counterpart of _compare_by_confidence.
+        """
+        return (ConfidenceComparer._conformity_array(noms1, denoms1) -
+                ConfidenceComparer._conformity_array(noms2, denoms2))
+
+    @staticmethod
+    def _compare_arrays_by_time(noms1: np.ndarray, noms2: np.ndarray) -> np.ndarray:
+        """
+        Vectorized counterpart of _compare_by_time.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            by_time = np.where(noms1 >= noms2, 1 - noms2 / noms1, noms1 / noms2 - 1)
+        return np.where(noms1 == noms2, 0.0, by_time)
+
     @staticmethod
     def ConformityBased() -> ConfidenceComparer:
         return ConfidenceComparer(0.01)
@@ -0,0 +1,402 @@
+from __future__ import annotations
+
+import sys
+from datetime import datetime, timedelta
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from .agent import Agent, AgentTuple
+from .block import Block
+from .features import SINGLE_FEATURE_VALUES, TUPLE_FEATURE_VALUES, FEATURE_CODES
+from .single_block import SingleBlock
+from .time_frame import TimeFrame, to_micros, from_micros
+from .tuple_block import TupleBlock
+
+
+class BlockDataset:
+    """
+    Columnar representation of agents and agent tuples. Blocks of all agents (and of all agent tuples) are held in flat
+    arrays, each agent (agent tuple) spanning a slice given by offsets. Times are held as microseconds since reference
+    time, feature values as their codes (see FEATURE_CODES).
+    Dataset may be placed in shared memory, in which case it is pickled only as a reference to it, so that it can be
+    passed to other processes without copying.
+    """
+
+    reference_time: datetime
+    arrays: dict[str, np.ndarray]
+    """
+    Arrays of the dataset:
+    - agent_ids, agent_offsets (of size agent count + 1)
+    - block_starts, block_ends, speeds, directions
+    - actor_ids, target_ids, tuple_offsets (of size agent tuple count + 1)
+    - tuple_block_starts, tuple_block_ends, intended_distance_changes, actual_distance_changes, relative_directions,
+    mutual_directions, distances
+    """
+
+    shared_memory: SharedMemory | None
+    """Shared memory holding arrays, None if the dataset is held in process' memory"""
+    is_owner: bool
+    """Whether shared memory was created by this dataset, i.e., whether it is to be unlinked by it"""
+
+    def __init__(self, reference_time: datetime, arrays: dict[str, np.ndarray],
+                 shared_memory: SharedMemory | None = None, is_owner: bool = False):
+        self.reference_time = reference_time
+        self.arrays = arrays
+        self.shared_memory = shared_memory
+        self.is_owner = is_owner
+
+    @staticmethod
+    def from_agents(agents: dict[int, Agent], agent_tuples: dict[(int, int), AgentTuple]) -> BlockDataset:
+        """
+        Create dataset of provided agents and agent tuples.
+        """
+        blocks = [block for agent in agents.values() for block in agent.blocks]
+        tuple_blocks = [block for agent_tuple in agent_tuples.values() for block in agent_tuple.blocks]
+        reference_time = min([block.start_time for block in blocks + tuple_blocks], default=datetime.min)
+
+        def to_codes(blocks: list[Block], feature: str) -> np.ndarray:
+            codes = FEATURE_CODES[feature]
+            return np.array([codes[getattr(block, feature)] for block in blocks], dtype=np.uint8)
+
+        def to_micro_times(times: list[datetime]) -> np.ndarray:
+            return np.array([to_micros(time - reference_time) for time in times], dtype=np.int64)
+
+        def to_offsets(lengths: list[int]) -> np.ndarray:
+            return np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).astype(np.int64)
+
+        arrays = {
+            'agent_ids': np.array(list(agents.keys()), dtype=np.int64),
+            'agent_offsets': to_offsets([len(agent.blocks) for agent in agents.values()]),
+            'block_starts': to_micro_times([block.start_time for block in blocks]),
+            'block_ends': to_micro_times([block.end_time for block in blocks]),
+            'speeds': to_codes(blocks, 'speed'),
+            'directions': to_codes(blocks, 'direction'),
+
+            'actor_ids': np.array([actor_id for actor_id, _ in agent_tuples.keys()], dtype=np.int64),
+            'target_ids': np.array([target_id for _, target_id in agent_tuples.keys()], dtype=np.int64),
+            'tuple_offsets': to_offsets([len(agent_tuple.blocks) for agent_tuple in agent_tuples.values()]),
+            'tuple_block_starts': to_micro_times([block.start_time for block in tuple_blocks]),
+            'tuple_block_ends': to_micro_times([block.end_time for block in tuple_blocks]),
+            'intended_distance_changes': to_codes(tuple_blocks, 'intended_distance_change'),
+            'actual_distance_changes': to_codes(tuple_blocks, 'actual_distance_change'),
+            'relative_directions': to_codes(tuple_blocks, 'relative_direction'),
+            'mutual_directions': to_codes(tuple_blocks, 'mutual_direction'),
+            'distances': to_codes(tuple_blocks, 'distance'),
+        }
+        return BlockDataset(reference_time, arrays)
+
+    def share(self) -> BlockDataset:
+        """
+        Copy the dataset into newly created shared memory. Returned dataset owns the shared memory and should be
+        closed (see close) once no other process uses it.
+        """
+        layout = BlockDataset.__layout(self.arrays)
+        size = max([offset + nbytes for _, _, offset, nbytes in layout.values()] + [1])
+
+        shared_memory = SharedMemory(create=True, size=size)
+        arrays = BlockDataset.__map_arrays(shared_memory, layout)
+        for key, array in arrays.items():
+            array[...] = self.arrays[key]
+
+        return BlockDataset(self.reference_time, arrays, shared_memory, is_owner=True)
+
+    @staticmethod
+    def __layout(arrays: dict[str, np.ndarray]) -> dict[str, tuple[str, tuple[int, ...], int, int]]:
+        """
+        Layout of arrays in a single buffer, each aligned to 8 bytes.
+        :return: Dictionary of (dtype, shape, offset, size in bytes) of each array.
+        """
+        layout = {}
+        offset = 0
+        for key, array in arrays.items():
+            layout[key] = array.dtype.str, array.shape, offset, array.nbytes
+            offset += -(-array.nbytes // 8) * 8
+        return layout
+
+    @staticmethod
+    def __map_arrays(shared_memory: SharedMemory, layout: dict[str, tuple[str, tuple[int, ...], int, int]]) \
+            -> dict[str, np.ndarray]:
+        return {key: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shared_memory.buf, offset=offset)
+                for key, (dtype, shape, offset, _) in layout.items()}
+
+    def __getstate__(self):
+        if self.shared_memory is None:
+            return self.reference_time, self.arrays, None, None
+        return self.reference_time, None, self.shared_memory.name, BlockDataset.__layout(self.arrays)
+
+    def __setstate__(self, state):
+        self.reference_time, self.arrays, shared_memory_name, layout = state
+        self.is_owner = False
+        self.shared_memory = None
+        if shared_memory_name is not None:
+            # Attaching process does not own shared memory, it must not be unlinked once the process exits
+            if sys.version_info >= (3, 13):
+                self.shared_memory = SharedMemory(name=shared_memory_name, track=False)
+            else:
+                self.shared_memory = SharedMemory(name=shared_memory_name)
+            self.arrays = BlockDataset.__map_arrays(self.shared_memory, layout)
+
+    def close(self):
+        """
+        Release shared memory, unlinking it if it is owned by this dataset. Dataset can no longer be used afterward.
+        """
+        if self.shared_memory is None:
+            return
+        self.arrays = {}
+        self.shared_memory.close()
+        if self.is_owner:
+            self.shared_memory.unlink()
+        self.shared_memory = None
+
+    def to_agents(self) -> tuple[dict[int, Agent], dict[(int, int), AgentTuple]]:
+        """
+        Create views of agents and agent tuples of the dataset. Their blocks are created once they are accessed.
+        :return: Dictionaries of agents and agent tuples, matching those the dataset was created from.
+        """
+        agents = {agent_id: DatasetAgent(self, idx)
+                  for idx, agent_id in enumerate(self.arrays['agent_ids'].tolist())}
+        agent_tuples = {(actor_id, target_id): DatasetAgentTuple(self, idx, agents[actor_id], agents[target_id])
+                        for idx, (actor_id, target_id)
+                        in enumerate(zip(self.arrays['actor_ids'].tolist(), self.arrays['target_ids'].tolist()))}
+        return agents, agent_tuples
+
+    def to_micros(self, time: datetime) -> int:
+        """
+        Convert time to microseconds since reference time of the dataset.
+        """
+        return to_micros(time - self.reference_time)
+
+    def single_blocks(self, idx: int) -> list[SingleBlock]:
+        """
+        Create blocks of idx-th agent of the dataset.
+        """
+        start, end = self.arrays['agent_offsets'][idx:idx + 2].tolist()
+        return self.single_block_range(start, end)
+
+    def single_block_range(self, start: int, end: int,
+                           from_time: int | None = None, to_time: int | None = None) -> list[SingleBlock]:
+        """
+        Create blocks of agents between start-th (inclusive) and end-th (exclusive) block of the dataset.
+        :param from_time: If set, blocks are cut to start no sooner than at this time (in microseconds).
+        :param to_time: If set, blocks are cut to end no later than at this time (in microseconds).
+        """
+        starts, ends = self.__clipped_times('block_starts', 'block_ends', start, end, from_time, to_time)
+        speeds, directions = SINGLE_FEATURE_VALUES['speed'], SINGLE_FEATURE_VALUES['direction']
+        return [SingleBlock(self.reference_time + from_micros(start_time),
+                            self.reference_time + from_micros(end_time),
+                            speeds[speed], directions[direction])
+                for start_time, end_time, speed, direction
+                in zip(starts, ends, *[self.arrays[key][start:end].tolist() for key in ['speeds', 'directions']])]
+
+    def tuple_blocks(self, idx: int) -> list[TupleBlock]:
+        """
+        Create blocks of idx-th agent tuple of the dataset.
+        """
+        start, end = self.arrays['tuple_offsets'][idx:idx + 2].tolist()
+        return self.tuple_block_range(start, end)
+
+    def tuple_block_range(self, start: int, end: int,
+                          from_time: int | None = None, to_time: int | None = None) -> list[TupleBlock]:
+        """
+        Create blocks of agent tuples between start-th (inclusive) and end-th (exclusive) tuple block of the dataset.
+        :param from_time: If set, blocks are cut to start no sooner than at this time (in microseconds).
+        :param to_time: If set, blocks are cut to end no later than at this time (in microseconds).
+        """
+        starts, ends = self.__clipped_times('tuple_block_starts', 'tuple_block_ends', start, end, from_time, to_time)
+        intended_distance_changes = TUPLE_FEATURE_VALUES['intended_distance_change']
+        actual_distance_changes = TUPLE_FEATURE_VALUES['actual_distance_change']
+        relative_directions = TUPLE_FEATURE_VALUES['relative_direction']
+        mutual_directions = TUPLE_FEATURE_VALUES['mutual_direction']
+        distances = TUPLE_FEATURE_VALUES['distance']
+        return [TupleBlock(self.reference_time + from_micros(start_time),
+                           self.reference_time + from_micros(end_time),
+                           intended_distance_changes[intended_distance_change],
+                           actual_distance_changes[actual_distance_change], relative_directions[relative_direction],
+                           mutual_directions[mutual_direction], distances[distance])
+                for (start_time, end_time, intended_distance_change, actual_distance_change, relative_direction,
+                     mutual_direction, distance)
+                in zip(starts, ends, *[self.arrays[key][start:end].tolist()
+                                       for key in ['intended_distance_changes', 'actual_distance_changes',
+                                                   'relative_directions', 'mutual_directions', 'distances']])]
+
+    def __clipped_times(self, starts_key: str, ends_key: str, start: int, end: int,
+                        from_time: int | None, to_time: int | None) -> tuple[list[int], list[int]]:
+        starts = self.arrays[starts_key][start:end]
+        ends = self.arrays[ends_key][start:end]
+        if from_time is not None:
+            starts = np.maximum(starts, from_time)
+        if to_time is not None:
+            ends = np.minimum(ends, to_time)
+        return starts.tolist(), ends.tolist()
+
+
+class DatasetBlockList:
+    """
+    Columnar view of blocks of an agent (or of an agent tuple) held in BlockDataset, i.e., a range of blocks of the
+    dataset, optionally cut to a time frame. Blocks are looked up by numpy.searchsorted over block times of the
+    dataset and cutting to a time frame creates another view of the same arrays. Blocks are only created once they are
+    first accessed.
+    Inherited by DatasetAgent and DatasetAgentTuple, along with Agent (AgentTuple) whose methods are overridden.
+    """
+
+    dataset: BlockDataset
+    block_range: tuple[int, int]
+    """Start (inclusive) and end (exclusive) index of viewed blocks in arrays of the dataset"""
+    time_range: tuple[int | None, int | None]
+    """Time (in microseconds) viewed blocks are cut to start no sooner than and to end no later than, if set"""
+
+    _starts_key: str
+    _ends_key: str
+
+    def _init_view(self, dataset: BlockDataset, block_range: tuple[int, int],
+                   time_range: tuple[int | None, int | None]):
+        self.dataset = dataset
+        self.block_range = block_range
+        self.time_range = time_range
+        self._blocks = None
+
+    def _create_blocks(self) -> list[Block]:
+        raise NotImplementedError("Abstract method")
+
+    def _view(self, block_range: tuple[int, int], time_range: tuple[int | None, int | None]) -> DatasetBlockList:
+        raise NotImplementedError("Abstract method")
+
+    @property
+    def blocks(self) -> list[Block]:
+        if self._blocks is None:
+            self._blocks = self._create_blocks()
+        return self._blocks
+
+    def column(self, key: str) -> np.ndarray:
+        """
+        View of viewed blocks' values of a column of the dataset (e.g., of feature codes).
+        """
+        start, end = self.block_range
+        return self.dataset.arrays[key][start:end]
+
+    @property
+    def starts(self) -> np.ndarray:
+        """
+        Start times of viewed blocks in microseconds since reference time of the dataset.
+        """
+        starts = self.column(self._starts_key)
+        from_time, _ = self.time_range
+        return starts if from_time is None else np.maximum(starts, from_time)
+
+    @property
+    def ends(self) -> np.ndarray:
+        """
+        End times of viewed blocks in microseconds since reference time of the dataset.
+        """
+        ends = self.column(self._ends_key)
+        _, to_time = self.time_range
+        return ends if to_time is None else np.minimum(ends, to_time)
+
+    def at_time(self, time: datetime) -> Block | None:
+        micros = self.dataset.to_micros(time)
+        from_time, to_time = self.time_range
+        if (from_time is not None and micros < from_time) or (to_time is not None and micros > to_time):
+            return None
+
+        idx = int(np.searchsorted(self.column(self._starts_key), micros, side='right')) - 1
+        if idx < 0 or self.column(self._ends_key)[idx] < micros:
+            return None
+        if self._blocks is not None:
+            return self._blocks[idx]
+
+        start, _ = self.block_range
+        return self._view((start + idx, start + idx + 1), self.time_range).blocks[0]
+
+    def during_time(self, timeframe: TimeFrame) -> DatasetBlockList:
+        from_time = self.dataset.to_micros(timeframe.start)
+        to_time = self.dataset.to_micros(timeframe.end)
+
+        # Views of views are cut to intersection of both time frames
+        current_from_time, current_to_time = self.time_range
+        if current_from_time is not None:
+            from_time = max(from_time, current_from_time)
+        if current_to_time is not None:
+            to_time = min(to_time, current_to_time)
+
+        # Blocks ending after the start and starting before the end of the time frame
+        start, _ = self.block_range
+        first_idx = int(np.searchsorted(self.column(self._ends_key), from_time, side='right'))
+        last_idx = int(np.searchsorted(self.column(self._starts_key), to_time, side='left'))
+        if from_time > to_time or first_idx >= last_idx:
+            return self._view((start, start), (None, None))
+        return self._view((start + first_idx, start + last_idx), (from_time, to_time))
+
+    @property
+    def start_time(self) -> datetime | None:
+        start, end = self.block_range
+        if start >= end:
+            return None
+        return self.dataset.reference_time + from_micros(int(self.starts[0]))
+
+    def micro_times(self, reference_time: datetime) -> tuple[np.ndarray, np.ndarray]:
+        offset = to_micros(self.dataset.reference_time - reference_time)
+        return self.starts + offset, self.ends + offset
+
+    def feature_codes(self, feature: str) -> np.ndarray:
+        # Columns of feature codes are named by features, e.g., speeds
+        return self.column(f'{feature}s')
+
+    @property
+    def duration(self) -> timedelta:
+        start, end = self.block_range
+        if start >= end:
+            raise IndexError("duration of no blocks")
+        return from_micros(int(self.ends[-1]) - int(self.starts[0]))
+
+
+class DatasetAgent(DatasetBlockList, Agent):
+    """
+    View of an agent held in BlockDataset. Blocks are created from the dataset once they are first accessed.
+    """
+
+    idx: int
+
+    _starts_key = 'block_starts'
+    _ends_key = 'block_ends'
+
+    def __init__(self, dataset: BlockDataset, idx: int, block_range: tuple[int, int] | None = None,
+                 time_range: tuple[int | None, int | None] = (None, None)):
+        self.agent_id = int(dataset.arrays['agent_ids'][idx])
+        self.idx = idx
+        if block_range is None:
+            block_range = tuple(dataset.arrays['agent_offsets'][idx:idx + 2].tolist())
+        self._init_view(dataset, block_range, time_range)
+
+    def _create_blocks(self) -> list[SingleBlock]:
+        return self.dataset.single_block_range(*self.block_range, *self.time_range)
+
+    def _view(self, block_range: tuple[int, int], time_range: tuple[int | None, int | None]) -> DatasetAgent:
+        return DatasetAgent(self.dataset, self.idx, block_range, time_range)
+
+
+class DatasetAgentTuple(DatasetBlockList, AgentTuple):
+    """
+    View of an agent tuple held in BlockDataset. Blocks are created from the dataset once they are first accessed.
+    """
+
+    idx: int
+
+    _starts_key = 'tuple_block_starts'
+    _ends_key = 'tuple_block_ends'
+
+    def __init__(self, dataset: BlockDataset, idx: int, actor: Agent, target: Agent,
+                 block_range: tuple[int, int] | None = None,
+                 time_range: tuple[int | None, int | None] = (None, None)):
+        self.actor = actor
+        self.target = target
+        self.idx = idx
+        if block_range is None:
+            block_range = tuple(dataset.arrays['tuple_offsets'][idx:idx + 2].tolist())
+        self._init_view(dataset, block_range, time_range)
+
+    def _create_blocks(self) -> list[TupleBlock]:
+        return self.dataset.tuple_block_range(*self.block_range, *self.time_range)
+
+    def _view(self, block_range: tuple[int, int], time_range: tuple[int | None, int | None]) -> DatasetAgentTuple:
+        return DatasetAgentTuple(self.dataset, self.idx, self.actor, self.target, block_range, time_range)
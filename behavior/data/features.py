@@ -38,3 +38,22 @@ class Distance(Enum):
     ADJACENT = "Adjacent"
     NEAR = "Near"
     FAR = "Far"
+
+
+# Values of features of single blocks and of tuple blocks by their attribute names, features are encoded (e.g., in
+# BlockDataset or WindowTable) as indexes of their values
+SINGLE_FEATURE_VALUES: dict[str, list[Enum]] = {
+    'speed': list(Speed),
+    'direction': list(Direction),
+}
+TUPLE_FEATURE_VALUES: dict[str, list[Enum]] = {
+    'intended_distance_change': list(DistanceChange),
+    'actual_distance_change': list(DistanceChange),
+    'relative_direction': list(Direction),
+    'mutual_direction': list(MutualDirection),
+    'distance': list(Distance),
+}
+FEATURE_CODES: dict[str, dict[Enum, int]] = {
+    feature: {value: code for code, value in enumerate(values)}
+    for feature, values in (SINGLE_FEATURE_VALUES | TUPLE_FEATURE_VALUES).items()
+}
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+import numpy as np
+
+from .agent import Agent
+from .time_frame import to_micros
+
+
+class PresenceIndex:
+    """
+    Index of lifetimes of agents, i.e., of time frames from the start of their first block to the end of their last
+    block. Provides lookup of agents present together with others for a required duration.
+    """
+
+    starts: np.ndarray
+    """Start of lifetime of each agent, in microseconds since the earliest start"""
+    ends: np.ndarray
+    """End of lifetime of each agent, in microseconds since the earliest start"""
+    is_present: np.ndarray
+    """Whether agent has any blocks, agents with no blocks are never present"""
+
+    def __init__(self, agents: list[Agent]):
+        present_agents = [agent for agent in agents if len(agent.blocks) > 0]
+        reference_time = min([agent.blocks[0].start_time for agent in present_agents], default=None)
+
+        self.is_present = np.array([len(agent.blocks) > 0 for agent in agents], dtype=bool)
+        self.starts = np.zeros(len(agents), dtype=np.int64)
+        self.ends = np.zeros(len(agents), dtype=np.int64)
+        self.starts[self.is_present] = [to_micros(agent.blocks[0].start_time - reference_time)
+                                        for agent in present_agents]
+        self.ends[self.is_present] = [to_micros(agent.blocks[-1].end_time - reference_time)
+                                      for agent in present_agents]
+
+    def __len__(self):
+        return len(self.is_present)
+
+    def co_present(self, start: int, end: int, duration: int) -> np.ndarray:
+        """
+        Find agents present during at least duration of time frame from start to end.
+        Overlaps must be of positive length even if duration is zero.
+        :param start: Start of time frame, in microseconds since the earliest start.
+        :param end: End of time frame, in microseconds since the earliest start.
+        :param duration: Required duration, in microseconds.
+        :return: Boolean mask of agents.
+        """
+        overlaps = np.minimum(self.ends, end) - np.maximum(self.starts, start)
+        return self.is_present & (overlaps >= max(duration, 1))
+
+    def join(self, variable_groups: list[list[int]], durations: list[timedelta], is_symmetrical: bool,
+             first_agent_idx: int | None = None, variable_candidates: list[np.ndarray] | None = None,
+             pair_candidates: dict[tuple[int, int], np.ndarray] | None = None):
+        """
+        Enumerate selections of agents for variables (with no agent selected twice) such that agents selected for each
+        group of variables are all present together for at least its duration. Selections are built variable by
+        variable, only extending partial selections with agents present together with those already selected.
+        :param variable_groups: Groups of variables, each variable being represented by its position in a selection.
+        :param durations: Required duration of presence of each variable group.
+        :param is_symmetrical: If set, only selections of increasing agent indexes are enumerated (combinations),
+        otherwise all orders are (permutations).
+        :param first_agent_idx: If set, only selections starting with agent at this index are enumerated.
+        :param variable_candidates: If set, boolean mask of agents which may be selected for each variable.
+        :param pair_candidates: If set, boolean matrix of agent pairs which may be selected for pairs of variables
+        (first variable being the lower one), by the pair of variables.
+        :return: Generator of selections as tuples of agent indexes, in the order of itertools' enumeration.
+        """
+        variable_count = max([variable + 1 for group in variable_groups for variable in group], default=0)
+        groups_of_variables = [[(group, to_micros(duration))
+                                for group, duration in zip(variable_groups, durations) if variable in group]
+                               for variable in range(variable_count)]
+
+        selection: list[int] = []
+
+        def extend_selection():
+            variable = len(selection)
+            if variable == variable_count:
+                yield tuple(selection)
+                return
+
+            candidates = self.is_present.copy()
+            if variable_candidates is not None:
+                candidates &= variable_candidates[variable]
+            for (first_variable, second_variable), pair_matrix in (pair_candidates or {}).items():
+                if second_variable == variable:
+                    candidates &= pair_matrix[selection[first_variable]]
+            for group, duration in groups_of_variables[variable]:
+                # Intersection of lifetimes of agents already selected for the group
+                selected = [selection[var] for var in group if var < variable]
+                start = max([self.starts[idx] for idx in selected], default=np.iinfo(np.int64).min)
+                end = min([self.ends[idx] for idx in selected], default=np.iinfo(np.int64).max)
+                candidates &= self.co_present(start, end, duration)
+
+            if variable == 0 and first_agent_idx is not None:
+                candidate_idxs = [first_agent_idx] if candidates[first_agent_idx] else []
+            elif is_symmetrical and selection:
+                candidate_idxs = np.flatnonzero(candidates[selection[-1] + 1:]) + selection[-1] + 1
+            else:
+                candidate_idxs = np.flatnonzero(candidates)
+
+            for idx in np.asarray(candidate_idxs, dtype=np.int64).tolist():
+                if idx in selection:
+                    continue
+                selection.append(idx)
+                yield from extend_selection()
+                selection.pop()
+
+        return extend_selection()
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from enum import Enum
+
+from .agent import AgentTuple
+
+
+class RelationIndex:
+    """
+    Index of tuple feature values of agent tuples. For each (ordered) pair of agents, it holds for how long did each
+    feature of their tuple blocks have each value in total, e.g., for how long were they adjacent.
+    """
+
+    features = ['intended_distance_change', 'actual_distance_change', 'relative_direction', 'mutual_direction',
+                'distance']
+
+    durations: dict[tuple[int, int], dict[tuple[str, Enum], float]]
+    """Total duration in seconds of blocks of agent tuple (actor ID, target ID), by (feature name, feature value)"""
+
+    def __init__(self, agent_tuples: dict[(int, int), AgentTuple]):
+        self.durations = {}
+        for key, agent_tuple in agent_tuples.items():
+            durations = defaultdict(float)
+            for feature in RelationIndex.features:
+                for block in agent_tuple.blocks:
+                    durations[feature, getattr(block, feature)] += block.duration.total_seconds()
+            self.durations[key] = dict(durations)
+
+    def duration(self, actor_id: int, target_id: int, feature: str, value: Enum) -> float:
+        """
+        Total duration in seconds of tuple blocks of actor and target with feature of a given value.
+        """
+        return self.durations.get((actor_id, target_id), {}).get((feature, value), 0.0)
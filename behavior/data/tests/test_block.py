@@ -61,6 +61,34 @@ class BlockTest(unittest.TestCase):
         self.assertEqual(reference_date + timedelta(seconds=0), granulated[0][1][0])
         self.assertEqual(reference_date + timedelta(seconds=50), granulated[-1][1][1])
 
+    def test_granulate_indexes(self):
+        anna = [SingleBlock(reference_date, reference_date + timedelta(seconds=2.5), Speed.WALK, Direction.LEFT),
+                SingleBlock(reference_date + timedelta(seconds=3), reference_date + timedelta(seconds=3.1),
+                            Speed.RUN, Direction.LEFT)]
+        bob = [SingleBlock(reference_date + timedelta(seconds=1), reference_date + timedelta(seconds=4),
+                           Speed.STAND, Direction.NOT_MOVING)]
+
+        windows = Block.granulate_indexes(anna, bob, [], strip_incomplete=False)
+        # Windows of at most 0.2 seconds are skipped
+        self.assertListEqual([0, 1_000_000, 2_000_000, 2_500_000, 3_100_000], windows.starts.tolist())
+        self.assertListEqual([1_000_000, 2_000_000, 2_500_000, 3_000_000, 4_000_000], windows.ends.tolist())
+        # Groups with no spanning block are -1
+        self.assertListEqual([[0, -1, -1], [0, 0, -1], [0, 0, -1], [-1, 0, -1], [-1, 0, -1]],
+                             windows.block_idxs.tolist())
+        self.assertEqual((reference_date + timedelta(seconds=2.5), reference_date + timedelta(seconds=3)),
+                         windows.time_frame(3))
+
+        # Windows match those of granulate
+        for strip_incomplete in [True, False]:
+            granulated = list(Block.granulate(anna, bob, strip_incomplete=strip_incomplete))
+            windows = Block.granulate_indexes(anna, bob, strip_incomplete=strip_incomplete)
+            self.assertListEqual([time_frame for _, time_frame in granulated],
+                                 list(map(windows.time_frame, range(len(windows)))))
+            self.assertListEqual([[block is not None for block in section] for section, _ in granulated],
+                                 (windows.block_idxs >= 0).tolist())
+
+        self.assertListEqual([[-1, 0], [0, 0], [0, 0], [0, -1], [0, -1]], windows.select([1, 0]).block_idxs.tolist())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,9 @@
 import unittest
+from functools import cmp_to_key
 
-from ..confidence import Confidence, ConfidenceComparer
+import numpy as np
+
+from ..confidence import Confidence, ConfidenceArray, ConfidenceCategory, ConfidenceComparer
 
 
 class ConfidenceTest(unittest.TestCase):
@@ -158,6 +161,51 @@ class ConfidenceTest(unittest.TestCase):
         self.assertConfidenceLess(Confidence.impartial(), Confidence.absolute())
         self.assertConfidenceLess(Confidence(1.0, 10.0), Confidence.absolute())
 
+    def test_compare_arrays(self):
+        confidences = [Confidence.impossible(), Confidence.impartial(), Confidence(0.0, 10.0), Confidence(1.0, 10.0),
+                       Confidence(1.0, 100.0), Confidence(5.0, 10.0), Confidence.certain(1.0),
+                       Confidence.certain(2.0), Confidence.absolute()]
+
+        for param in [0.0, 0.01, 0.5, 0.99, 1.0]:
+            comparer = ConfidenceComparer(param)
+            for c2 in confidences:
+                compared = comparer.compare_arrays([c.nom for c in confidences], [c.denom for c in confidences],
+                                                   c2.nom, c2.denom)
+                for c1, value in zip(confidences, compared):
+                    self.assertEqual(comparer.compare(c1, c2), value)
+                    self.assertEqual(comparer.compare_int(c1, c2), -1 if np.signbit(value) else 1)
+
+    def test_scalar_key(self):
+        confidences = [Confidence.impossible(), Confidence.impartial(), Confidence(0.0, 10.0), Confidence(1.0, 10.0),
+                       Confidence(1.0, 100.0), Confidence(5.0, 10.0), Confidence(10.0, 20.0), Confidence.certain(1.0),
+                       Confidence.certain(2.0), Confidence.absolute()]
+
+        for param in [0.0, 1.0]:
+            comparer = ConfidenceComparer(param)
+            key = comparer.get_scalar_key()
+            for c1 in confidences:
+                for c2 in confidences:
+                    self.assertEqual(comparer.compare_int(c1, c2) < 0, key(c1) < key(c2))
+
+            self.assertListEqual(sorted(confidences, key=cmp_to_key(comparer.compare_int)),
+                                 sorted(confidences, key=comparer.get_key_sorter(lambda c: c)))
+
+        self.assertIsNone(ConfidenceComparer(0.05).get_scalar_key())
+
+    def test_min_accepted_conformity(self):
+        threshold = Confidence(0.65, 1.0)
+        for param in [0.0, 0.01, 0.05]:
+            comparer = ConfidenceComparer(param)
+            min_conformity = comparer.min_accepted_conformity(threshold)
+            # No confidence less conform than the bound is accepted, however long
+            for denom in [1.0, 10.0, 200.0, 1e9]:
+                self.assertLess(comparer.compare_int(Confidence((min_conformity - 1e-6) * denom, denom), threshold), 0)
+            # Long enough confidences approach the bound
+            self.assertGreaterEqual(comparer.compare_int(Confidence((min_conformity + 1e-6) * 1e9, 1e9), threshold), 0)
+
+        self.assertAlmostEqual(0.65 - 0.01 / 0.99, ConfidenceComparer.ConformityBased().min_accepted_conformity(threshold))
+        self.assertEqual(float('-inf'), ConfidenceComparer(1.0).min_accepted_conformity(threshold))
+
     def test_mixed_comparer(self):
         mixed_comparer = ConfidenceComparer(0.5)
         self.use_conf_comparer(mixed_comparer)
@@ -211,5 +259,50 @@ class ConfidenceTest(unittest.TestCase):
         self.assertConfidenceLess(Confidence.impartial(), Confidence.absolute())
 
 
+class ConfidenceArrayTest(unittest.TestCase):
+    confidences = [Confidence(1.0, 2.0), Confidence.impartial(), Confidence(1.0, float("inf")),
+                   Confidence.impossible(), Confidence.absolute(), Confidence(0.0, 3.0), Confidence.certain(4.0)]
+
+    def test_conversion(self):
+        array = ConfidenceArray.from_confidences(self.confidences)
+
+        self.assertEqual(len(self.confidences), len(array))
+        self.assertListEqual(self.confidences, array.to_confidences())
+        self.assertListEqual(self.confidences, list(array))
+        self.assertEqual(Confidence(1.0, 2.0), array[0])
+        self.assertListEqual(self.confidences[2:4], array[2:4].to_confidences())
+
+    def test_operations(self):
+        array = ConfidenceArray.from_confidences(self.confidences)
+        other = Confidence(1.0, 2.0)
+
+        self.assertListEqual([c + c for c in self.confidences], (array + array).to_confidences())
+        self.assertListEqual([c + other for c in self.confidences], (array + other).to_confidences())
+        self.assertListEqual([c * 2 for c in self.confidences], (array * 2).to_confidences())
+        # Complement of absolute confidence is undefined (inf - inf)
+        finite = ConfidenceArray.from_confidences([c for c in self.confidences if c != Confidence.absolute()])
+        self.assertListEqual([Confidence(c.denom - c.nom, c.denom) for c in finite],
+                             finite.complement().to_confidences())
+
+    def test_conformities(self):
+        array = ConfidenceArray.from_confidences(self.confidences)
+
+        conformities = array.conformities()
+        for confidence, conformity in zip(self.confidences, conformities):
+            if confidence == Confidence.impartial():
+                self.assertTrue(np.isnan(conformity))
+            else:
+                self.assertEqual(float(confidence), conformity)
+
+    def test_categories(self):
+        array = ConfidenceArray.from_confidences(self.confidences)
+
+        self.assertListEqual([ConfidenceCategory.UNCERTAIN, ConfidenceCategory.IMPARTIAL, ConfidenceCategory.UNCERTAIN,
+                              ConfidenceCategory.IMPOSSIBLE, ConfidenceCategory.ABSOLUTE,
+                              ConfidenceCategory.IMPROBABLE, ConfidenceCategory.CERTAIN],
+                             [c.category for c in self.confidences])
+        self.assertListEqual([c.category.value for c in self.confidences], array.categories().tolist())
+
+
 if __name__ == "__main__":
     unittest.main()
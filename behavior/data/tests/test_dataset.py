@@ -0,0 +1,128 @@
+import pickle
+import unittest
+from datetime import timedelta
+
+import numpy as np
+
+from .data_utils import reference_date, simple_block
+
+from ..agent import Agent, AgentTuple
+from ..dataset import BlockDataset
+from ..features import Speed, Direction, DistanceChange, MutualDirection, Distance
+from ..time_frame import TimeFrame
+from ..tuple_block import TupleBlock
+
+
+class BlockDatasetTest(unittest.TestCase):
+
+    @staticmethod
+    def create_agents() -> tuple[dict[int, Agent], dict[(int, int), AgentTuple]]:
+        anna = Agent(3, [simple_block(0, 1.5, Speed.WALK, Direction.STRAIGHT),
+                         simple_block(1.5, 4.25, Speed.RUN, Direction.LEFT)])
+        bob = Agent(7, [simple_block(2, 3, Speed.STAND, Direction.NOT_MOVING)])
+        cyril = Agent(1, [])
+        agent_tuple = AgentTuple(anna, bob, [
+            TupleBlock(reference_date + timedelta(seconds=2), reference_date + timedelta(seconds=2.5),
+                       DistanceChange.INCREASING, DistanceChange.CONSTANT, Direction.RIGHT, MutualDirection.PARALLEL,
+                       Distance.NEAR),
+            TupleBlock(reference_date + timedelta(seconds=2.5), reference_date + timedelta(seconds=3),
+                       DistanceChange.DECREASING, DistanceChange.INCREASING, Direction.OPPOSITE,
+                       MutualDirection.OPPOSITE, Distance.ADJACENT),
+        ])
+        return {3: anna, 7: bob, 1: cyril}, {(3, 7): agent_tuple}
+
+    def assert_agents_equal(self, agents: dict[int, Agent], agent_tuples: dict[(int, int), AgentTuple],
+                            other_agents: dict[int, Agent], other_agent_tuples: dict[(int, int), AgentTuple]):
+        self.assertListEqual(list(agents.keys()), list(other_agents.keys()))
+        for agent_id, agent in agents.items():
+            self.assertEqual(agent_id, other_agents[agent_id].agent_id)
+            self.assertListEqual(agent.blocks, other_agents[agent_id].blocks)
+
+        self.assertListEqual(list(agent_tuples.keys()), list(other_agent_tuples.keys()))
+        for key, agent_tuple in agent_tuples.items():
+            other_agent_tuple = other_agent_tuples[key]
+            self.assertIs(other_agents[key[0]], other_agent_tuple.actor)
+            self.assertIs(other_agents[key[1]], other_agent_tuple.target)
+            self.assertListEqual([vars(block) for block in agent_tuple.blocks],
+                                 [vars(block) for block in other_agent_tuple.blocks])
+
+    def test_to_agents(self):
+        agents, agent_tuples = self.create_agents()
+
+        dataset = BlockDataset.from_agents(agents, agent_tuples)
+        self.assertListEqual([0, 2, 3, 3], dataset.arrays['agent_offsets'].tolist())
+        self.assertListEqual([0, 1_500_000, 2_000_000], dataset.arrays['block_starts'].tolist())
+
+        dataset_agents, dataset_agent_tuples = dataset.to_agents()
+        self.assert_agents_equal(agents, agent_tuples, dataset_agents, dataset_agent_tuples)
+
+        # Views behave as agents
+        during = dataset_agents[3].during_time(TimeFrame(reference_date + timedelta(seconds=1),
+                                                         reference_date + timedelta(seconds=2)))
+        self.assertListEqual([simple_block(1, 1.5, Speed.WALK, Direction.STRAIGHT),
+                              simple_block(1.5, 2, Speed.RUN, Direction.LEFT)], during.blocks)
+
+    def test_views(self):
+        agents, agent_tuples = self.create_agents()
+        dataset_agents, dataset_agent_tuples = BlockDataset.from_agents(agents, agent_tuples).to_agents()
+
+        def at(seconds: float):
+            return reference_date + timedelta(seconds=seconds)
+
+        block_lists = [(agents[3], dataset_agents[3]), (agents[7], dataset_agents[7]),
+                       (agent_tuples[3, 7], dataset_agent_tuples[3, 7])]
+        for block_list, view in block_lists:
+            self.assertEqual(block_list.duration, view.duration)
+            for seconds in [-1, 0, 0.5, 1.5, 2, 2.75, 3, 4.25, 5]:
+                block, view_block = block_list.at_time(at(seconds)), view.at_time(at(seconds))
+                self.assertEqual(vars(block) if block else None, vars(view_block) if view_block else None)
+
+            for start, end in [(-1, 0), (-1, 1), (0.5, 1), (1, 2), (1.5, 2.5), (2.5, 3), (2.2, 2.7), (3, 5), (4.25, 5)]:
+                time_frame = TimeFrame(at(start), at(end))
+                during = view.during_time(time_frame)
+                self.assertIs(view.dataset.arrays, during.dataset.arrays)
+                self.assertListEqual([vars(block) for block in block_list.during_time(time_frame).blocks],
+                                     [vars(block) for block in during.blocks])
+
+        # Views of views are cut to both time frames
+        during = dataset_agents[3].during_time(TimeFrame(at(1), at(4))).during_time(TimeFrame(at(0), at(2)))
+        self.assertListEqual([1_000_000, 1_500_000], during.starts.tolist())
+        self.assertListEqual([1_500_000, 2_000_000], during.ends.tolist())
+        self.assertListEqual([Speed.WALK, Speed.RUN], [block.speed for block in during.blocks])
+        self.assertEqual(timedelta(seconds=1), during.duration)
+        self.assertEqual(simple_block(1.5, 2, Speed.RUN, Direction.LEFT), during.at_time(at(2)))
+        self.assertIsNone(during.at_time(at(0.5)))
+
+        # Time frames outside of a cut view yield no blocks, as they do for agents
+        outside = dataset_agents[3].during_time(TimeFrame(at(1), at(3))).during_time(TimeFrame(at(3.5), at(4)))
+        self.assertListEqual([], outside.blocks)
+        self.assertListEqual([], outside.starts.tolist())
+        self.assertListEqual([], agents[3].during_time(TimeFrame(at(1), at(3))).during_time(
+            TimeFrame(at(3.5), at(4))).blocks)
+
+        # Feature codes are views of columns of the dataset
+        self.assertListEqual([list(Speed).index(Speed.WALK), list(Speed).index(Speed.RUN)],
+                             during.column('speeds').tolist())
+        self.assertTrue(np.shares_memory(dataset_agents[3].column('speeds'), during.column('speeds')))
+
+    def test_share(self):
+        agents, agent_tuples = self.create_agents()
+
+        dataset = BlockDataset.from_agents(agents, agent_tuples).share()
+        try:
+            # Shared dataset is pickled as a reference to its shared memory
+            pickled = pickle.dumps(dataset)
+            self.assertLess(len(pickled), 2048)
+
+            attached_dataset = pickle.loads(pickled)
+            self.assertEqual(dataset.shared_memory.name, attached_dataset.shared_memory.name)
+            self.assert_agents_equal(agents, agent_tuples, *attached_dataset.to_agents())
+            attached_dataset.close()
+        finally:
+            dataset.close()
+
+        self.assertIsNone(dataset.shared_memory)
+
+
+if __name__ == "__main__":
+    unittest.main()
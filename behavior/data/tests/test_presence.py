@@ -0,0 +1,73 @@
+import itertools
+import unittest
+from datetime import timedelta
+
+import numpy as np
+
+from .data_utils import simple_block
+
+from ..agent import Agent
+from ..features import Speed, Direction
+from ..presence import PresenceIndex
+
+
+class PresenceIndexTest(unittest.TestCase):
+
+    @staticmethod
+    def create_agents() -> list[Agent]:
+        return [
+            Agent(0, [simple_block(0, 10, Speed.WALK, Direction.STRAIGHT)]),
+            Agent(1, [simple_block(5, 8, Speed.WALK, Direction.STRAIGHT),
+                      simple_block(8, 20, Speed.STAND, Direction.NOT_MOVING)]),
+            Agent(2, [simple_block(10, 30, Speed.WALK, Direction.STRAIGHT)]),
+            Agent(3, []),
+            Agent(4, [simple_block(0, 30, Speed.RUN, Direction.STRAIGHT)]),
+        ]
+
+    def test_co_present(self):
+        index = PresenceIndex(self.create_agents())
+
+        self.assertListEqual([True, True, False, False, True],
+                             index.co_present(0, 10_000_000, 5_000_000).tolist())
+        # Touching lifetimes are not present together
+        self.assertListEqual([False, True, True, False, True],
+                             index.co_present(10_000_000, 15_000_000, 0).tolist())
+
+    def test_join(self):
+        index = PresenceIndex(self.create_agents())
+
+        # First variable alone for 10 seconds, then both variables together for 5 seconds
+        selections = list(index.join([[0], [0, 1]], [timedelta(seconds=10), timedelta(seconds=5)], False))
+        self.assertListEqual([(0, 1), (0, 4), (1, 0), (1, 2), (1, 4), (2, 1), (2, 4), (4, 0), (4, 1), (4, 2)],
+                             selections)
+
+        symmetrical_selections = list(index.join([[0, 1]], [timedelta(seconds=5)], True))
+        self.assertListEqual([(0, 1), (0, 4), (1, 2), (1, 4), (2, 4)], symmetrical_selections)
+
+    def test_join_pair_candidates(self):
+        index = PresenceIndex(self.create_agents())
+
+        pair_candidates = np.zeros((5, 5), dtype=bool)
+        pair_candidates[1, [0, 4]] = True
+        pair_candidates[4, 2] = True
+        selections = list(index.join([[0, 1]], [timedelta(seconds=5)], False,
+                                     pair_candidates={(0, 1): pair_candidates}))
+        self.assertListEqual([(1, 0), (1, 4), (4, 2)], selections)
+
+    def test_join_partitions(self):
+        index = PresenceIndex(self.create_agents())
+        groups, durations = [[0, 1], [1, 2]], [timedelta(seconds=2), timedelta(seconds=1)]
+
+        selections = list(index.join(groups, durations, False))
+        partitioned_selections = [selection
+                                  for first_agent_idx in range(len(index))
+                                  for selection in index.join(groups, durations, False, first_agent_idx)]
+        self.assertListEqual(selections, partitioned_selections)
+
+        # Selections are enumerated in the order of permutations
+        self.assertListEqual([selection for selection in itertools.permutations(range(len(index)), 3)
+                              if selection in selections], selections)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+from datetime import timedelta
+
+from .data_utils import reference_date
+
+from ..agent import Agent, AgentTuple
+from ..features import Direction, DistanceChange, MutualDirection, Distance
+from ..relation import RelationIndex
+from ..tuple_block import TupleBlock
+
+
+def tuple_block(start_time_offset_seconds: float, end_time_offset_seconds: float, distance: Distance) -> TupleBlock:
+    return TupleBlock(reference_date + timedelta(seconds=start_time_offset_seconds),
+                      reference_date + timedelta(seconds=end_time_offset_seconds),
+                      DistanceChange.CONSTANT, DistanceChange.CONSTANT, Direction.STRAIGHT,
+                      MutualDirection.INDEPENDENT, distance)
+
+
+class RelationIndexTest(unittest.TestCase):
+
+    def test_durations(self):
+        anna, bob = Agent(0), Agent(1)
+        index = RelationIndex({(0, 1): AgentTuple(anna, bob, [
+            tuple_block(0, 2, Distance.ADJACENT),
+            tuple_block(2, 3, Distance.ADJACENT),
+            tuple_block(3, 7, Distance.NEAR),
+            tuple_block(7, 9, Distance.ADJACENT),
+            tuple_block(10, 12, Distance.ADJACENT),
+        ])})
+
+        self.assertEqual(7.0, index.duration(0, 1, 'distance', Distance.ADJACENT))
+        self.assertEqual(4.0, index.duration(0, 1, 'distance', Distance.NEAR))
+        self.assertEqual(11.0, index.duration(0, 1, 'mutual_direction', MutualDirection.INDEPENDENT))
+
+        self.assertEqual(0.0, index.duration(0, 1, 'distance', Distance.FAR))
+        # Agent tuples are ordered
+        self.assertEqual(0.0, index.duration(1, 0, 'distance', Distance.ADJACENT))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,7 @@
 import unittest
 from datetime import timedelta
 
-from ..time_frame import RelativeTimeFrame
+from ..time_frame import RelativeTimeFrame, to_micros, from_micros
 
 
 class RelativeTimeFrameTest(unittest.TestCase):
@@ -126,5 +126,17 @@ class RelativeTimeFrameTest(unittest.TestCase):
         )
 
 
+class TimebaseTest(unittest.TestCase):
+
+    def test_micros(self):
+        self.assertEqual(1_500_000, to_micros(timedelta(seconds=1.5)))
+        self.assertEqual(-1, to_micros(timedelta(microseconds=-1)))
+        self.assertEqual(timedelta(seconds=1.5), from_micros(1_500_000))
+
+        # Conversion is exact, unlike through seconds as floats
+        duration = timedelta.max - timedelta(microseconds=1)
+        self.assertEqual(duration, from_micros(to_micros(duration)))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+from datetime import timedelta
+
+from .data_utils import reference_date, simple_block
+
+from ..agent import Agent, AgentTuple, BlockWindow, cut_to_windows
+from ..block import Block
+from ..features import Speed, Direction, DistanceChange, MutualDirection, Distance
+from ..time_frame import TimeFrame
+from ..tuple_block import TupleBlock
+from ..window_cache import WindowCache
+
+
+class WindowCacheTest(unittest.TestCase):
+
+    @staticmethod
+    def create_agents() -> tuple[list[Agent], dict[(int, int), AgentTuple]]:
+        anna = Agent(5, [simple_block(0, 2.5, Speed.WALK, Direction.STRAIGHT),
+                         simple_block(2.5, 6, Speed.RUN, Direction.LEFT)])
+        bob = Agent(2, [simple_block(1, 4, Speed.STAND, Direction.NOT_MOVING)])
+        cyril = Agent(9, [simple_block(3, 8, Speed.WALK, Direction.RIGHT)])
+        agent_tuple = AgentTuple(anna, bob, [
+            TupleBlock(reference_date + timedelta(seconds=1), reference_date + timedelta(seconds=3.5),
+                       DistanceChange.DECREASING, DistanceChange.CONSTANT, Direction.RIGHT, MutualDirection.PARALLEL,
+                       Distance.NEAR),
+        ])
+        return [anna, bob, cyril], {(5, 2): agent_tuple}
+
+    @staticmethod
+    def to_values(windows: list[BlockWindow]) -> list:
+        def block_values(block: Block | None):
+            return vars(block) if block is not None else None
+
+        return [([block_values(block) for block in block_section],
+                 [[block_values(block) for block in row] for row in tuple_block_section],
+                 duration)
+                for block_section, tuple_block_section, duration in windows]
+
+    def test_windows(self):
+        agents, agent_tuples = self.create_agents()
+        anna, bob, cyril = agents
+        window_cache = WindowCache()
+
+        # Time frames are bounded by lifetimes of agents
+        for selection, start, end in [([anna, bob, cyril], 1, 6), ([cyril, anna, bob], 0, 8),
+                                      ([bob, cyril, anna], 3, 4)]:
+            time_frame = TimeFrame(reference_date + timedelta(seconds=start), reference_date + timedelta(seconds=end))
+            windows = cut_to_windows([agent.during_time(time_frame) for agent in selection],
+                                     [agent_tuple.during_time(time_frame) for agent_tuple in agent_tuples.values()])
+            cached_windows = window_cache.windows(selection, agent_tuples, time_frame)
+            self.assertListEqual(self.to_values(windows), self.to_values(cached_windows))
+            self.assertListEqual([window_start.item() for window_start in windows.start_times],
+                                 [window_start.item() for window_start in cached_windows.start_times])
+
+        # Windows are cut once for all orders of agents and their time frames
+        self.assertEqual(1, window_cache.misses)
+        self.assertEqual(2, window_cache.hits)
+        self.assertEqual(1, len(window_cache.entries))
+
+    def test_windows_of_unaligned_time_frame(self):
+        agents, agent_tuples = self.create_agents()
+        anna, bob, cyril = agents
+        time_frame = TimeFrame(reference_date + timedelta(seconds=0.5), reference_date + timedelta(seconds=7))
+        window_cache = WindowCache()
+
+        for selection in [[anna, bob, cyril], [cyril, anna, bob]]:
+            windows = cut_to_windows([agent.during_time(time_frame) for agent in selection],
+                                     [agent_tuple.during_time(time_frame) for agent_tuple in agent_tuples.values()])
+            self.assertListEqual(self.to_values(windows),
+                                 self.to_values(window_cache.windows(selection, agent_tuples, time_frame)))
+
+        # Windows overlapping bounds of the time frame are cut separately
+        self.assertEqual(2, window_cache.misses)
+        self.assertEqual(0, window_cache.hits)
+
+    def test_lifetime_windows(self):
+        agents, _ = self.create_agents()
+        anna, bob, cyril = agents
+        window_cache = WindowCache(max_size=1)
+
+        windows = window_cache.lifetime_windows([cyril, bob])
+        self.assertListEqual([[-1, 0], [0, 0], [0, -1]], windows.block_idxs.tolist())
+        self.assertListEqual([(1, 3), (3, 4), (4, 8)],
+                             [((start - reference_date).seconds, (end - reference_date).seconds)
+                              for start, end in map(windows.time_frame, range(len(windows)))])
+
+        # Least recently used set of agents is evicted
+        window_cache.lifetime_windows([anna, bob])
+        window_cache.lifetime_windows([bob, cyril])
+        self.assertEqual(3, window_cache.misses)
+
+
+if __name__ == "__main__":
+    unittest.main()
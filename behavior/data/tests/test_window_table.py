@@ -0,0 +1,102 @@
+import unittest
+from datetime import timedelta
+
+import numpy as np
+
+from .data_utils import reference_date
+
+from ..agent import Agent, AgentTuple, cut_to_windows
+from ..features import Speed, Direction, DistanceChange, MutualDirection, Distance
+from ..single_block import SingleBlock
+from ..tuple_block import TupleBlock
+from ..window_table import WindowTable, MISSING
+
+
+def create_windows() -> tuple[list[Agent], WindowTable]:
+    agents = [
+        Agent(0, [
+            SingleBlock(reference_date + timedelta(seconds=0), reference_date + timedelta(seconds=2),
+                        Speed.WALK, Direction.STRAIGHT),
+            SingleBlock(reference_date + timedelta(seconds=2), reference_date + timedelta(seconds=4),
+                        Speed.RUN, Direction.LEFT),
+        ]),
+        Agent(1, [
+            SingleBlock(reference_date + timedelta(seconds=1), reference_date + timedelta(seconds=4),
+                        Speed.STAND, Direction.NOT_MOVING),
+        ]),
+    ]
+    agent_tuples = [
+        AgentTuple(agents[0], agents[1], [
+            TupleBlock(reference_date + timedelta(seconds=1), reference_date + timedelta(seconds=3),
+                       DistanceChange.DECREASING, DistanceChange.INCREASING,
+                       Direction.RIGHT, MutualDirection.OPPOSITE, Distance.NEAR),
+        ]),
+    ]
+    return agents, cut_to_windows(agents, agent_tuples)
+
+
+class WindowTableTest(unittest.TestCase):
+
+    def test_codes(self):
+        _, windows = create_windows()
+
+        # Windows are bounded by edges of all blocks
+        self.assertEqual(4, len(windows))
+        self.assertEqual(reference_date, windows.reference_time)
+        self.assertEqual([0, 1_000_000, 2_000_000, 3_000_000], windows.starts.tolist())
+        self.assertEqual([1.0, 1.0, 1.0, 1.0], windows.seconds.tolist())
+
+        self.assertEqual([[1, 1, 2, 2], [MISSING, 0, 0, 0]], windows.codes['speed'].tolist())
+        self.assertEqual([[2, 2, 1, 1], [MISSING, 0, 0, 0]], windows.codes['direction'].tolist())
+        self.assertEqual([MISSING, 0, 0, MISSING], windows.codes['intended_distance_change'][0, 1].tolist())
+        self.assertEqual([MISSING, 1, 1, MISSING], windows.codes['distance'][0, 1].tolist())
+        self.assertTrue((windows.codes['distance'][1, 0] == MISSING).all())
+        self.assertTrue((windows.codes['distance'][0, 0] == MISSING).all())
+
+    def test_getitem(self):
+        _, windows = create_windows()
+
+        block_section, tuple_block_section, duration = windows[2]
+        self.assertEqual(timedelta(seconds=1), duration)
+        self.assertEqual(Speed.RUN, block_section[0].speed)
+        self.assertEqual(reference_date + timedelta(seconds=2), block_section[0].start_time)
+        self.assertEqual(reference_date + timedelta(seconds=3), block_section[1].end_time)
+        self.assertEqual(Distance.NEAR, tuple_block_section[0][1].distance)
+        self.assertIsNone(tuple_block_section[1][0])
+
+        block_section, _, _ = windows[0]
+        self.assertIsNone(block_section[1])
+        _, tuple_block_section, _ = windows[-1]
+        self.assertIsNone(tuple_block_section[0][1])
+        self.assertEqual(4, len(list(windows)))
+        with self.assertRaises(IndexError):
+            _ = windows[4]
+
+    def test_select(self):
+        agents, windows = create_windows()
+
+        selected = windows.select([1, 0])
+        self.assertEqual([agents[1], agents[0]], selected.block_lists)
+        self.assertEqual([[MISSING, 0, 0, 0], [1, 1, 2, 2]], selected.codes['speed'].tolist())
+        self.assertEqual([MISSING, 1, 1, MISSING], selected.codes['distance'][1, 0].tolist())
+        self.assertTrue((selected.codes['distance'][0, 1] == MISSING).all())
+
+        _, tuple_block_section, _ = selected[1]
+        self.assertEqual(Distance.NEAR, tuple_block_section[1][0].distance)
+
+    def test_add(self):
+        _, windows = create_windows()
+
+        joined = windows[:2] + windows[2:]
+        self.assertEqual(windows.starts.tolist(), joined.starts.tolist())
+        self.assertEqual(windows.ends.tolist(), joined.ends.tolist())
+        for feature, codes in windows.codes.items():
+            self.assertTrue(np.array_equal(codes, joined.codes[feature]), feature)
+
+        for (block_section, tuple_block_section, duration), (joined_section, joined_tuple_section, joined_duration) \
+                in zip(windows, joined):
+            self.assertEqual(duration, joined_duration)
+            self.assertEqual([vars(block) if block is not None else None for block in block_section],
+                             [vars(block) if block is not None else None for block in joined_section])
+            self.assertEqual(vars(tuple_block_section[0][1]) if tuple_block_section[0][1] is not None else None,
+                             vars(joined_tuple_section[0][1]) if joined_tuple_section[0][1] is not None else None)
@@ -3,6 +3,23 @@ from __future__ import annotations
 from datetime import datetime, timedelta
 
 
+MICROSECOND = timedelta(microseconds=1)
+
+
+def to_micros(duration: timedelta) -> int:
+    """
+    Convert duration to whole microseconds, the integer timebase used internally by blocks, windows and graphs.
+    """
+    return duration // MICROSECOND
+
+
+def from_micros(micros: int) -> timedelta:
+    """
+    Convert whole microseconds of the integer timebase back to duration.
+    """
+    return timedelta(microseconds=micros)
+
+
 class TimeFrame:
     start: datetime
     end: datetime
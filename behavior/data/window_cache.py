@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import itertools
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+
+from .agent import Agent, AgentTuple, cut_to_windows
+from .block import Block, GranulatedWindows
+from .time_frame import TimeFrame, to_micros
+from .window_table import WindowTable
+
+
+class WindowCache:
+    """
+    Cache of windows of sets of agents, shared by all selections (orders) of the same agents. Windows are cut once for
+    agents ordered by their IDs, windows of other orders (and of their time frames) are then selected from them by
+    indexes of agents. Least recently used sets of agents are evicted once there are more than max_size of them, each
+    set of agents holds a single table of windows.
+    """
+
+    max_size: int
+    """Maximal number of cached sets of agents"""
+    entries: OrderedDict[tuple[int, ...], WindowCacheEntry]
+    """Cached windows by sorted IDs of agents, from the least recently used"""
+
+    hits: int
+    misses: int
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __entry(self, agents: list[Agent]) -> tuple[WindowCacheEntry, list[int]]:
+        """
+        Get entry of a set of agents, along with positions of provided agents among agents ordered by IDs.
+        """
+        agent_ids = tuple(sorted(agent.agent_id for agent in agents))
+        order = [agent_ids.index(agent.agent_id) for agent in agents]
+
+        entry = self.entries.get(agent_ids)
+        if entry is None:
+            entry = WindowCacheEntry(sorted(agents, key=lambda agent: agent.agent_id))
+            self.entries[agent_ids] = entry
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(agent_ids)
+        return entry, order
+
+    def lifetime_windows(self, agents: list[Agent]) -> GranulatedWindows:
+        """
+        Get windows of lifetimes of agents (from the start of their first block to the end of their last block), as
+        granulated by Block.granulate_indexes with no limit on size of windows.
+        :param agents: Agents in the order of windows' block groups.
+        """
+        entry, order = self.__entry(agents)
+        if entry.lifetime_windows is None:
+            self.misses += 1
+            entry.lifetime_windows = Block.granulate_indexes(
+                *[[Block(agent.blocks[0].start_time, agent.blocks[-1].end_time)] for agent in entry.agents],
+                strip_incomplete=False, max_window_size=timedelta.max)
+        else:
+            self.hits += 1
+        return entry.lifetime_windows.select(order)
+
+    def windows(self, agents: list[Agent], agent_tuples: dict[(int, int), AgentTuple], time_frame: TimeFrame) \
+            -> WindowTable:
+        """
+        Get windows of agents and their agent tuples cut to a time frame, as cut by cut_to_windows. Windows are cut
+        once over lifetimes of agents, windows of the time frame are then sliced from them. Only time frames bounded by
+        bounds of windows (e.g., by lifetimes of agents, as viability time frames are) can be sliced, windows of other
+        time frames are cut separately and are not cached.
+        :param agents: Agents in the order of windows' sections.
+        :param agent_tuples: Dictionary of all AgentTuples.
+        :param time_frame: Time frame agents and agent tuples are cut to.
+        """
+        entry, order = self.__entry(agents)
+        is_cached = entry.windows is not None
+        if not is_cached:
+            entry.windows = cut_to_windows(entry.agents,
+                                           [agent_tuples[actor.agent_id, target.agent_id]
+                                            for actor, target in itertools.permutations(entry.agents, 2)
+                                            if (actor.agent_id, target.agent_id) in agent_tuples])
+
+        windows = entry.windows
+        start = to_micros(time_frame.start - windows.reference_time)
+        end = to_micros(time_frame.end - windows.reference_time)
+        first_idx = int(np.searchsorted(windows.starts, start, side='left'))
+        last_idx = int(np.searchsorted(windows.ends, end, side='right'))
+        if (first_idx > 0 and windows.ends[first_idx - 1] > start) \
+                or (last_idx < len(windows) and windows.starts[last_idx] < end):
+            # Windows overlapping bounds of the time frame would be cut at them
+            self.misses += 1
+            return cut_to_windows([agent.during_time(time_frame) for agent in agents],
+                                  [agent_tuples[actor.agent_id, target.agent_id].during_time(time_frame)
+                                   for actor, target in itertools.permutations(agents, 2)
+                                   if (actor.agent_id, target.agent_id) in agent_tuples])
+
+        if is_cached:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return windows[first_idx:max(first_idx, last_idx)].select(order)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class WindowCacheEntry:
+    """
+    Windows of a set of agents, ordered by their IDs.
+    """
+
+    agents: list[Agent]
+    lifetime_windows: GranulatedWindows | None
+    windows: WindowTable | None
+    """Windows of agents and their agent tuples over their lifetimes, time frames are sliced from them"""
+
+    def __init__(self, agents: list[Agent]):
+        self.agents = agents
+        self.lifetime_windows = None
+        self.windows = None
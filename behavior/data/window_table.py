@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Iterator, TypeAlias, TYPE_CHECKING
+
+import numpy as np
+
+from .block import Block, GranulatedWindows
+from .features import SINGLE_FEATURE_VALUES, TUPLE_FEATURE_VALUES
+from .single_block import SingleBlock
+from .time_frame import to_micros, from_micros
+from .tuple_block import TupleBlock
+
+if TYPE_CHECKING:
+    from .agent import BlockList, Agent, AgentTuple
+
+
+BlockSection: TypeAlias = list[SingleBlock | None]
+TupleBlockSection: TypeAlias = list[list[TupleBlock | None]]
+BlockWindow: TypeAlias = tuple[BlockSection, TupleBlockSection, timedelta]
+
+MISSING = 255
+"""Feature code of windows with no spanning block"""
+
+
+class WindowTable:
+    """
+    Columnar windows of agents and their agent tuples (see cut_to_windows). Holds bounds of windows and codes of
+    features of blocks spanning each window (see features), MISSING where an agent (or agent tuple) has no block
+    spanning the window.
+    Table is also a sequence of windows as BlockWindow, whose sections of blocks are created once they are accessed.
+    """
+
+    reference_time: datetime
+    starts: np.ndarray
+    """Start of each window, in microseconds since reference time"""
+    ends: np.ndarray
+    """End of each window, in microseconds since reference time"""
+    codes: dict[str, np.ndarray]
+    """
+    Feature codes by attribute names of features, uint8 arrays of shape:
+    - agents x windows for features of single blocks (speed, direction)
+    - agents (actors) x agents (targets) x windows for features of tuple blocks
+    """
+
+    block_lists: list[BlockList]
+    """Blocks of each agent the windows were cut from"""
+    block_idxs: np.ndarray
+    """Index of the block spanning each window (of shape agents x windows), -1 if none does"""
+    tuple_block_lists: list[list[BlockList | None]]
+    """Blocks of each agent tuple (by indexes of actor and target) the windows were cut from, None if there is none"""
+    tuple_block_idxs: np.ndarray
+    """Index of the tuple block spanning each window (of shape agents x agents x windows), -1 if none does"""
+
+    def __init__(self, reference_time: datetime, starts: np.ndarray, ends: np.ndarray,
+                 block_lists: list[BlockList], block_idxs: np.ndarray,
+                 tuple_block_lists: list[list[BlockList | None]], tuple_block_idxs: np.ndarray,
+                 codes: dict[str, np.ndarray] | None = None):
+        self.reference_time = reference_time
+        self.starts = starts
+        self.ends = ends
+        self.block_lists = block_lists
+        self.block_idxs = block_idxs
+        self.tuple_block_lists = tuple_block_lists
+        self.tuple_block_idxs = tuple_block_idxs
+        self.codes = codes if codes is not None else self.__gather_codes()
+
+    @staticmethod
+    def from_granulated(granulated: GranulatedWindows, agents: list[Agent], agent_tuples: list[AgentTuple]) \
+            -> WindowTable:
+        """
+        Create table of windows granulated from blocks of agents followed by blocks of agent tuples.
+        """
+        agent_idxs = {agent.agent_id: idx for idx, agent in enumerate(agents)}
+        block_idxs = np.ascontiguousarray(granulated.block_idxs[:, :len(agents)].T)
+
+        tuple_block_lists: list[list[BlockList | None]] = [[None for _ in agents] for _ in agents]
+        tuple_block_idxs = np.full((len(agents), len(agents), len(granulated)), -1, dtype=np.int64)
+        for group_idx, agent_tuple in enumerate(agent_tuples, start=len(agents)):
+            actor_idx = agent_idxs[agent_tuple.actor.agent_id]
+            target_idx = agent_idxs[agent_tuple.target.agent_id]
+            tuple_block_lists[actor_idx][target_idx] = agent_tuple
+            tuple_block_idxs[actor_idx, target_idx] = granulated.block_idxs[:, group_idx]
+
+        return WindowTable(granulated.reference_time, granulated.starts, granulated.ends,
+                           list(agents), block_idxs, tuple_block_lists, tuple_block_idxs)
+
+    def __gather_codes(self) -> dict[str, np.ndarray]:
+        def gather(block_list: BlockList | None, feature: str, idxs: np.ndarray) -> np.ndarray:
+            if block_list is None or not (idxs >= 0).any():
+                return np.full(len(idxs), MISSING, dtype=np.uint8)
+            block_codes = block_list.feature_codes(feature)
+            return np.where(idxs >= 0, block_codes[np.maximum(idxs, 0)], MISSING).astype(np.uint8)
+
+        agent_count = len(self.block_lists)
+        codes = {}
+        for feature in SINGLE_FEATURE_VALUES:
+            codes[feature] = np.full((agent_count, len(self)), MISSING, dtype=np.uint8)
+            for agent_idx, block_list in enumerate(self.block_lists):
+                codes[feature][agent_idx] = gather(block_list, feature, self.block_idxs[agent_idx])
+        for feature in TUPLE_FEATURE_VALUES:
+            codes[feature] = np.full((agent_count, agent_count, len(self)), MISSING, dtype=np.uint8)
+            for actor_idx, row in enumerate(self.tuple_block_lists):
+                for target_idx, block_list in enumerate(row):
+                    if block_list is not None:
+                        codes[feature][actor_idx, target_idx] = gather(block_list, feature,
+                                                                        self.tuple_block_idxs[actor_idx, target_idx])
+        return codes
+
+    @property
+    def agent_count(self) -> int:
+        return len(self.block_lists)
+
+    @property
+    def durations(self) -> np.ndarray:
+        """
+        Duration of each window in microseconds.
+        """
+        return self.ends - self.starts
+
+    @property
+    def seconds(self) -> np.ndarray:
+        """
+        Duration of each window in seconds (as timedelta.total_seconds).
+        """
+        return self.durations / 1e6
+
+    @property
+    def start_times(self) -> np.ndarray:
+        """
+        Start of each window as datetime64.
+        """
+        return np.datetime64(self.reference_time, 'us') + self.starts.astype('timedelta64[us]')
+
+    def time_frame(self, idx: int) -> tuple[datetime, datetime]:
+        return (self.reference_time + from_micros(int(self.starts[idx])),
+                self.reference_time + from_micros(int(self.ends[idx])))
+
+    def select(self, agent_idxs: list[int]) -> WindowTable:
+        """
+        Table with agents selected (and ordered) by their indexes.
+        """
+        return WindowTable(self.reference_time, self.starts, self.ends,
+                           [self.block_lists[idx] for idx in agent_idxs], self.block_idxs[agent_idxs],
+                           [[self.tuple_block_lists[actor_idx][target_idx] for target_idx in agent_idxs]
+                            for actor_idx in agent_idxs],
+                           self.tuple_block_idxs[np.ix_(agent_idxs, agent_idxs)],
+                           {feature: codes[np.ix_(agent_idxs, agent_idxs)] if codes.ndim == 3 else codes[agent_idxs]
+                            for feature, codes in self.codes.items()})
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, key: int | slice) -> BlockWindow | WindowTable:
+        if isinstance(key, slice):
+            return WindowTable(self.reference_time, self.starts[key], self.ends[key],
+                               self.block_lists, self.block_idxs[:, key],
+                               self.tuple_block_lists, self.tuple_block_idxs[:, :, key],
+                               {feature: codes[..., key] for feature, codes in self.codes.items()})
+
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("window index out of range")
+
+        start_time, end_time = self.time_frame(key)
+
+        def section(block_list: BlockList | None, block_idx: int) -> Block | None:
+            if block_list is None or block_idx < 0:
+                return None
+            return block_list.blocks[block_idx].during_time(start_time, end_time)
+
+        block_section = [section(block_list, int(block_idxs[key]))
+                         for block_list, block_idxs in zip(self.block_lists, self.block_idxs)]
+        tuple_block_section = [[section(block_list, int(block_idxs[key]))
+                                for block_list, block_idxs in zip(row, idxs_row)]
+                               for row, idxs_row in zip(self.tuple_block_lists, self.tuple_block_idxs)]
+        return block_section, tuple_block_section, end_time - start_time
+
+    def __iter__(self) -> Iterator[BlockWindow]:
+        return (self[idx] for idx in range(len(self)))
+
+    def __add__(self, other: WindowTable) -> WindowTable:
+        """
+        Table of windows of both tables, of the same agents. Blocks of agents (and agent tuples) the windows were cut
+        from are concatenated.
+        """
+        from .agent import BlockList
+
+        def concatenate(block_list: BlockList | None, other_block_list: BlockList | None) -> BlockList:
+            blocks = block_list.blocks if block_list is not None else []
+            other_blocks = other_block_list.blocks if other_block_list is not None else []
+            return BlockList(blocks + other_blocks)
+
+        def offset_idxs(idxs: np.ndarray, other_idxs: np.ndarray, block_list: BlockList | None) -> np.ndarray:
+            offset = len(block_list.blocks) if block_list is not None else 0
+            return np.concatenate([idxs, np.where(other_idxs >= 0, other_idxs + offset, -1)], axis=-1)
+
+        offset = to_micros(other.reference_time - self.reference_time)
+        agent_count = self.agent_count
+        return WindowTable(
+            self.reference_time,
+            np.concatenate([self.starts, other.starts + offset]),
+            np.concatenate([self.ends, other.ends + offset]),
+            [concatenate(self.block_lists[idx], other.block_lists[idx]) for idx in range(agent_count)],
+            np.stack([offset_idxs(self.block_idxs[idx], other.block_idxs[idx], self.block_lists[idx])
+                      for idx in range(agent_count)]).reshape(agent_count, -1),
+            [[concatenate(self.tuple_block_lists[actor_idx][target_idx],
+                          other.tuple_block_lists[actor_idx][target_idx])
+              if (self.tuple_block_lists[actor_idx][target_idx] is not None or
+                  other.tuple_block_lists[actor_idx][target_idx] is not None) else None
+              for target_idx in range(agent_count)]
+             for actor_idx in range(agent_count)],
+            np.stack([offset_idxs(self.tuple_block_idxs[actor_idx, target_idx],
+                                  other.tuple_block_idxs[actor_idx, target_idx],
+                                  self.tuple_block_lists[actor_idx][target_idx])
+                      for actor_idx in range(agent_count) for target_idx in range(agent_count)])
+            .reshape(agent_count, agent_count, -1),
+            {feature: np.concatenate([codes, other.codes[feature]], axis=-1) for feature, codes in self.codes.items()})
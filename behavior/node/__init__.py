@@ -1,4 +1,5 @@
 from .base import BehaviorNode
+from .cache import LayerCache
 from .elementary import StateNode, MutualStateNode, ActorTargetStateNode
 from .factory import Factory
 from .logic import ConjunctionNode, DisjunctionNode, NegationNode
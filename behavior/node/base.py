@@ -3,8 +3,9 @@ from __future__ import annotations
 from abc import ABC
 from datetime import timedelta
 
-from ..data import BehaviorVariable, RelativeTimeFrame
-from ..data.agent import BlockWindow
+from .cache import LayerCache
+
+from ..data import BehaviorVariable, RelativeTimeFrame, WindowTable
 
 from ..time_graph import TimeGraphLayer
 
@@ -21,15 +22,31 @@ class BehaviorNode(ABC):
         self.children = []
         self.name = name
 
-    def compute_graph_layer(self, variables: list[BehaviorVariable], windows: list[BlockWindow]) -> TimeGraphLayer:
+    def compute_graph_layer(self, variables: list[BehaviorVariable], windows: WindowTable,
+                            layer_cache: LayerCache | None = None) -> TimeGraphLayer:
         """
         Compute graph layer - a representation of this node's confidence matrix.
         :param variables: Behavior variables of the whole template.
         :param windows: Sliding windows for which to compute confidences.
+        :param layer_cache: Cache of elementary layers, bound to agents the windows were cut from. Layers are computed
+        from windows alone if not set.
         :return: A computed time graph layer.
         """
         raise NotImplementedError("Abstract method")
 
+    def extend_graph_layer(self, variables: list[BehaviorVariable], windows: WindowTable, appended: int,
+                           discarded: int) -> TimeGraphLayer:
+        """
+        Extend the layer computed last (see compute_graph_layer) by newly appended windows, as extended graphs of
+        sequential nodes require (see SequentialNode.extend_graph). Nodes unable to reuse their layer recompute it.
+        :param variables: Behavior variables of the whole template.
+        :param windows: Windows the layer was computed over, without the discarded ones, followed by appended ones.
+        :param appended: Number of windows appended at the end of windows.
+        :param discarded: Number of windows discarded from the start of windows the layer was computed over.
+        :return: A time graph layer computed over windows.
+        """
+        return self.compute_graph_layer(variables, windows)
+
     def get_sequence_info(self, default_min: timedelta | None = None) -> list[tuple[set[BehaviorVariable], timedelta]]:
         """
         Compute actor-temporal constraints for this node.
@@ -64,6 +81,17 @@ class BehaviorNode(ABC):
         """
         raise NotImplementedError("Abstract method")
 
+    def get_state_requirements(self, min_conformity: float, min_duration: timedelta) \
+            -> list[tuple[BehaviorNode, float, timedelta]]:
+        """
+        Find elementary nodes of one or two variables which necessarily hold to some degree whenever this node holds,
+        i.e., whenever confidence of this node over a time frame of at least min_duration has at least min_conformity
+        conformity. Such nodes allow excluding agents (or agent pairs) before processing them.
+        :return: List of tuples of elementary node, its minimal conformity and minimal duration of time frame it must
+        hold for. Empty if no such nodes can be derived.
+        """
+        return []
+
     def is_subset(self, other_node: BehaviorNode) -> bool:
         """
         Check whether this node is a subset of another in terms of information.
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+import numpy as np
+
+from ..configuration import Configuration
+from ..data import Agent, AgentTuple, Block, Confidence, ConfidenceArray
+
+
+class ConformityTimeline:
+    """
+    Confidences of an elementary node over blocks of an agent (or of an agent tuple), each as if for 1 second.
+    Confidence of any window of a single block is then its confidence scaled by the duration of the window.
+    """
+
+    starts: np.ndarray
+    """Start times of blocks"""
+    noms: np.ndarray
+    """Nominators of confidences of blocks, followed by that of a window with no block"""
+    denoms: np.ndarray
+    """Denominators of confidences of blocks, followed by that of a window with no block"""
+
+    def __init__(self, blocks: list[Block], confidences: list[Confidence], missing_confidence: Confidence):
+        self.starts = np.array([block.start_time for block in blocks], dtype='datetime64[us]')
+        self.noms = np.array([nom for nom, _ in confidences] + [missing_confidence.nom], dtype=np.float64)
+        self.denoms = np.array([denom for _, denom in confidences] + [missing_confidence.denom], dtype=np.float64)
+
+    @property
+    def nbytes(self) -> int:
+        return self.starts.nbytes + self.noms.nbytes + self.denoms.nbytes
+
+    def resample(self, is_present: np.ndarray, window_starts: np.ndarray, seconds: np.ndarray) -> ConfidenceArray:
+        """
+        Compute confidences of windows, each spanned by a block of the timeline unless it is not present.
+        :param is_present: Whether each window is spanned by a block.
+        :param window_starts: Start of each window as datetime64.
+        :param seconds: Duration of each window in seconds.
+        """
+        block_idxs = np.full(len(is_present), len(self.starts), dtype=np.int64)
+        block_idxs[is_present] = np.searchsorted(self.starts, window_starts[is_present], side='right') - 1
+        return ConfidenceArray(self.noms[block_idxs] * seconds, self.denoms[block_idxs] * seconds)
+
+
+class LayerCache:
+    """
+    Cache of conformity timelines of elementary nodes over single agents and agent tuples, shared by all processed
+    selections of agents. Layers of nodes depending on a single agent (or a single agent tuple) are then resampled
+    from its timeline onto windows of each selection, instead of being computed anew. Least recently used timelines
+    are evicted once their total size exceeds memory budget.
+    Timelines are keyed by agent IDs, so a cache must only be used with a single set of agents (e.g., in one search).
+    """
+
+    memory_budget: int
+    """Maximal total size of cached timelines in bytes"""
+    timelines: OrderedDict[Hashable, ConformityTimeline]
+    """Cached timelines, from the least recently used"""
+    memory: int
+    """Total size of cached timelines in bytes"""
+
+    agents: list[Agent]
+    """Agents of the processed selection, mapped to template's variables in the order they are defined"""
+    agent_tuples: dict[tuple[int, int], AgentTuple]
+    """Agent tuples of the processed selection by actor and target IDs"""
+
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(self, memory_budget: int | None = None):
+        self.memory_budget = memory_budget if memory_budget is not None else Configuration.layer_cache_memory
+        self.timelines = OrderedDict()
+        self.memory = 0
+        self.agents = []
+        self.agent_tuples = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def bind(self, agents: list[Agent], agent_tuples: list[AgentTuple]):
+        """
+        Bind agents of the processed selection. Timelines are computed over all blocks of bound agents, so they should
+        not be cut to a time frame of the selection.
+        :param agents: Selected agents, mapped to template's variables in the order they are defined.
+        :param agent_tuples: Agent tuples of selected agents.
+        """
+        self.agents = agents
+        self.agent_tuples = {(agent_tuple.actor.agent_id, agent_tuple.target.agent_id): agent_tuple
+                             for agent_tuple in agent_tuples}
+
+    def get(self, key: Hashable, compute: Callable[[], ConformityTimeline]) -> ConformityTimeline:
+        """
+        Get a cached timeline, computing (and caching) it on a miss.
+        """
+        timeline = self.timelines.get(key)
+        if timeline is not None:
+            self.hits += 1
+            self.timelines.move_to_end(key)
+            return timeline
+
+        self.misses += 1
+        timeline = compute()
+        self.timelines[key] = timeline
+        self.memory += timeline.nbytes
+        while self.memory > self.memory_budget and self.timelines:
+            _, evicted = self.timelines.popitem(last=False)
+            self.memory -= evicted.nbytes
+            self.evictions += 1
+        return timeline
+
+    def clear(self):
+        self.timelines.clear()
+        self.memory = 0
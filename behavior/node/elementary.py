@@ -1,12 +1,16 @@
 from datetime import timedelta
 from typing import TypeVar
 
+import numpy as np
+
 from .base import BehaviorNode
+from .cache import LayerCache, ConformityTimeline
 
 from ..configuration import Configuration, ConfidenceConjunctionStrategy
-from ..data.agent import BlockWindow
-from ..data import (SingleBlock, TupleBlock, Confidence, RelativeTimeFrame, BehaviorVariable, Speed, Direction,
-                    DistanceChange, MutualDirection, Distance)
+from ..data import (Agent, Block, SingleBlock, TupleBlock, Confidence, ConfidenceArray, RelativeTimeFrame,
+                    BehaviorVariable, Speed, Direction, DistanceChange, MutualDirection, Distance, RelationIndex,
+                    WindowTable, MISSING)
+from ..data.features import FEATURE_CODES
 from ..time_graph import TimeGraphLayer, DenseTimeGraphLayer
 
 
@@ -24,18 +28,53 @@ class ElementaryNode(BehaviorNode):
 
     variables: list[BehaviorVariable]
     """ List of behavioral variables that should be matched. """
+    features: list[str] = []
+    """ Attribute names of matched features, in the order of expected values (see _get_expected_values). """
+    windows: WindowTable | None = None
+    """ Windows the layer was computed over last. """
+    layer: DenseTimeGraphLayer | None = None
+    """ Layer computed last, reused when extended (see extend_graph_layer). """
 
     def __init__(self, variables: list[BehaviorVariable], name: str | None = None):
         super().__init__(name)
         self.variables = variables
 
-    def compute_graph_layer(self, variables: list[BehaviorVariable], windows: list[BlockWindow]) -> TimeGraphLayer:
-        conformities = []
-        for window in windows:
-            conformities.append(self.get_confidence(variables, *window))
-
-        layer = DenseTimeGraphLayer(conformities, name=str(self))
-        return layer
+    def compute_graph_layer(self, variables: list[BehaviorVariable], windows: WindowTable,
+                            layer_cache: LayerCache | None = None) -> TimeGraphLayer:
+        codes = self._get_window_codes(variables, windows)
+        source = self._get_cache_source(variables, layer_cache) if layer_cache is not None else None
+        if source is not None:
+            source_key, blocks = source
+            key = (type(self), self._get_expected_values(), Configuration.confidence_conjunction_strategy, source_key)
+            timeline = layer_cache.get(key, lambda: ConformityTimeline(
+                blocks,
+                [self._get_block_confidence(block) for block in blocks],
+                self._get_block_confidence(None)
+            ))
+            is_present = codes[self.features[0]][0] != MISSING
+            conformities = timeline.resample(is_present, windows.start_times, windows.seconds)
+        else:
+            conformities = self._get_code_confidences(codes, len(windows)) * windows.seconds
+
+        self.windows = windows
+        self.layer = DenseTimeGraphLayer(conformities.to_confidences(), name=str(self))
+        return self.layer
+
+    def extend_graph_layer(self, variables: list[BehaviorVariable], windows: WindowTable, appended: int,
+                           discarded: int) -> TimeGraphLayer:
+        if self.windows is windows:
+            # Node is shared by more parents, its layer was already extended
+            return self.layer
+        if self.layer is None or len(self.windows) - discarded + appended != len(windows):
+            return self.compute_graph_layer(variables, windows)
+
+        appended_windows = windows[len(windows) - appended:]
+        conformities = self._get_code_confidences(self._get_window_codes(variables, appended_windows), appended) \
+            * appended_windows.seconds
+
+        self.windows = windows
+        self.layer = self.layer.extended(conformities.to_confidences(), discarded)
+        return self.layer
 
     def get_confidence(self, variables: list[BehaviorVariable], block_section: list[SingleBlock],
                        tuple_block_section: list[list[TupleBlock]], duration: timedelta) -> Confidence:
@@ -49,6 +88,57 @@ class ElementaryNode(BehaviorNode):
         """
         raise NotImplementedError("Abstract method")
 
+    def _get_cache_source(self, variables: list[BehaviorVariable], layer_cache: LayerCache) \
+            -> tuple[tuple[int, ...], list[Block]] | None:
+        """
+        Find the single agent (or agent tuple) confidence of this node depends on, if there is one.
+        :param variables: All variables of a template, mapped to agents bound to layer cache in order.
+        :param layer_cache: Layer cache bound to agents being processed.
+        :return: Tuple of IDs of the agent (or of the actor and target of the agent tuple) and all of its blocks, or
+        None if confidence depends on more agents and its layer cannot be cached.
+        """
+        return None
+
+    def _get_expected_values(self) -> tuple:
+        """
+        Feature values expected by this node, which (along with its type) determine its confidence of any block.
+        """
+        raise NotImplementedError("Abstract method")
+
+    def _get_window_codes(self, variables: list[BehaviorVariable], windows: WindowTable) -> dict[str, np.ndarray]:
+        """
+        Get codes of matched features of windows (see WindowTable.codes) this node's confidence depends on.
+        :param variables: All variables of a template, mapped to agents of windows in order.
+        :param windows: Windows to get the codes of.
+        :return: Codes by attribute names of features, each of shape values x windows (e.g., one value for each of
+        matched agents). If layer of this node can be cached (see _get_cache_source), there is a single value of its
+        source.
+        """
+        raise NotImplementedError("Abstract method")
+
+    def _get_code_confidences(self, codes: dict[str, np.ndarray], window_count: int) -> ConfidenceArray:
+        """
+        Vectorized counterpart of get_confidence, computing confidences of windows from codes of their features (see
+        _get_window_codes), each as if for 1 second.
+        """
+        conformities = [ElementaryNode._get_partial_conformities(codes[feature], FEATURE_CODES[feature][expected])
+                        for feature, expected in zip(self.features, self._get_expected_values())
+                        if expected is not None]
+        if not conformities:
+            return ConfidenceArray.impartial(window_count)
+
+        if Configuration.confidence_conjunction_strategy == ConfidenceConjunctionStrategy.MIN:
+            noms = np.minimum.reduce(conformities)
+        elif Configuration.confidence_conjunction_strategy == ConfidenceConjunctionStrategy.AVG:
+            noms = sum(conformities) / len(conformities)
+        return ConfidenceArray(noms, np.ones(window_count))
+
+    def _get_block_confidence(self, block: Block | None) -> Confidence:
+        """
+        Get confidence of a block this node's confidence depends on (see _get_cache_source), as if for 1 second.
+        """
+        raise NotImplementedError("Abstract method")
+
     @staticmethod
     def _get_partial_confidence(values: list, expected: object | None) -> Confidence:
         """
@@ -66,6 +156,19 @@ class ElementaryNode(BehaviorNode):
         elif Configuration.confidence_conjunction_strategy == ConfidenceConjunctionStrategy.AVG:
             return Confidence(accuracy(expected, values), 1.0)
 
+    @staticmethod
+    def _get_partial_conformities(codes: np.ndarray, expected_code: int) -> np.ndarray:
+        """
+        Vectorized counterpart of _get_partial_confidence over codes of a feature of shape values x windows, with
+        MISSING codes (i.e., no block) never matching.
+        :return: Nominators of confidences of windows as if for 1 second, all of which have denominator of 1.
+        """
+        matches = codes == expected_code
+        if Configuration.confidence_conjunction_strategy == ConfidenceConjunctionStrategy.MIN:
+            return matches.all(axis=0).astype(np.float64)
+        elif Configuration.confidence_conjunction_strategy == ConfidenceConjunctionStrategy.AVG:
+            return matches.sum(axis=0) / len(codes)
+
     def get_sequence_info(self, default_min: timedelta | None = None) -> list[tuple[set[BehaviorVariable], timedelta]]:
         return [(self.get_variables()[0], self.get_time_requirement(default_min).minimal)]
 
@@ -82,6 +185,8 @@ class StateNode(ElementaryNode):
     Elementary node responsible for checking feature values for single blocks - Speed and Direction.
     """
 
+    features = ['speed', 'direction']
+
     def __init__(self,
                  variables: list[BehaviorVariable],
                  speed: Speed | None = None,
@@ -126,6 +231,62 @@ class StateNode(ElementaryNode):
     def is_symmetrical(self, agent_variables: set[BehaviorVariable]) -> bool:
         return set(self.variables) == agent_variables
 
+    def get_state_requirements(self, min_conformity: float, min_duration: timedelta) \
+            -> list[tuple[BehaviorNode, float, timedelta]]:
+        if len(self.variables) != 1 or min_conformity <= 0:
+            return []
+        if self.expected_speed is None and self.expected_direction is None:
+            return []
+        return [(self, min_conformity, min_duration)]
+
+    def may_hold(self, agent: Agent, min_conformity: float, min_duration: timedelta) -> bool:
+        """
+        Check whether this single-variable node may hold for agent with at least min_conformity conformity over a time
+        frame of at least min_duration. Conformity over any time frame is an average of conformities of blocks within
+        it, so some block must be conform enough and conformities of all blocks must cover the minimal duration.
+        """
+        tolerance = 1e-9
+        conformities = self.__get_block_conformities(agent)
+        if not any(conformity >= min_conformity - tolerance for conformity in conformities):
+            return False
+
+        conform_seconds = sum([conformity * block.duration.total_seconds()
+                               for conformity, block in zip(conformities, agent.blocks)])
+        return conform_seconds >= min_conformity * min_duration.total_seconds() - tolerance
+
+    def coverage(self, agent: Agent) -> float:
+        """
+        Fraction of lifetime of agent (i.e., of total duration of its blocks) this single-variable node holds for,
+        with each block counted by its conformity. Agents with no blocks have no coverage.
+        """
+        total_seconds = sum([block.duration.total_seconds() for block in agent.blocks])
+        if total_seconds <= 0:
+            return 0.0
+        conform_seconds = sum([conformity * block.duration.total_seconds()
+                               for conformity, block in zip(self.__get_block_conformities(agent), agent.blocks)])
+        return conform_seconds / total_seconds
+
+    def __get_block_conformities(self, agent: Agent) -> list[float]:
+        return [float(self.get_confidence(self.variables, [block], [[None]], timedelta(seconds=1)))
+                for block in agent.blocks]
+
+    def _get_cache_source(self, variables: list[BehaviorVariable], layer_cache: LayerCache) \
+            -> tuple[tuple[int, ...], list[Block]] | None:
+        if len(self.variables) != 1:
+            return None
+        agent = layer_cache.agents[variables.index(self.variables[0])]
+        return (agent.agent_id,), agent.blocks
+
+    def _get_expected_values(self) -> tuple:
+        return self.expected_speed, self.expected_direction
+
+    def _get_window_codes(self, variables: list[BehaviorVariable], windows: WindowTable) -> dict[str, np.ndarray]:
+        agent_idxs = [idx for idx, variable in enumerate(variables) if variable in self.variables]
+        return {feature: windows.codes[feature][agent_idxs] for feature in self.features}
+
+    def _get_block_confidence(self, block: SingleBlock | None) -> Confidence:
+        return self.get_confidence(self.variables, [block], [[None]], timedelta(seconds=1))
+
     def is_subset(self, other: BehaviorNode) -> bool:
         if not isinstance(other, StateNode):
             return False
@@ -154,6 +315,8 @@ class ActorTargetStateNode(ElementaryNode):
     for tuple blocks - IntendedDistanceChange and RelativeDirection.
     """
 
+    features = ['intended_distance_change', 'relative_direction']
+
     def __init__(self,
                  variables: list[BehaviorVariable],
                  intended_distance_change: DistanceChange | None = None,
@@ -208,6 +371,53 @@ class ActorTargetStateNode(ElementaryNode):
     def is_symmetrical(self, agent_variables: set[BehaviorVariable]) -> bool:
         return False
 
+    def get_state_requirements(self, min_conformity: float, min_duration: timedelta) \
+            -> list[tuple[BehaviorNode, float, timedelta]]:
+        if min_conformity <= 0:
+            return []
+        if self.expected_intended_distance is None and self.expected_relative_direction is None:
+            return []
+        return [(self, min_conformity, min_duration)]
+
+    def may_hold(self, relation_index: RelationIndex, actor_id: int, target_id: int,
+                 min_conformity: float, min_duration: timedelta) -> bool:
+        """
+        Check whether this node may hold for actor and target with at least min_conformity conformity over a time frame
+        of at least min_duration. Windows with no tuple block are impartial, so any conformity of expected features
+        within the time frame suffices - and is required, since impartial confidence is never conform.
+        """
+        durations = [relation_index.duration(actor_id, target_id, feature, expected)
+                     for feature, expected in [('intended_distance_change', self.expected_intended_distance),
+                                               ('relative_direction', self.expected_relative_direction)]
+                     if expected is not None]
+
+        if Configuration.confidence_conjunction_strategy == ConfidenceConjunctionStrategy.MIN:
+            return min(durations) > 0
+        return sum(durations) > 0
+
+    def _get_cache_source(self, variables: list[BehaviorVariable], layer_cache: LayerCache) \
+            -> tuple[tuple[int, ...], list[Block]] | None:
+        actor = layer_cache.agents[variables.index(self.variables[0])]
+        target = layer_cache.agents[variables.index(self.variables[1])]
+        agent_tuple = layer_cache.agent_tuples.get((actor.agent_id, target.agent_id))
+        return (actor.agent_id, target.agent_id), agent_tuple.blocks if agent_tuple is not None else []
+
+    def _get_expected_values(self) -> tuple:
+        return self.expected_intended_distance, self.expected_relative_direction
+
+    def _get_window_codes(self, variables: list[BehaviorVariable], windows: WindowTable) -> dict[str, np.ndarray]:
+        actor_idx = variables.index(self.variables[0])
+        target_idx = variables.index(self.variables[1])
+        return {feature: windows.codes[feature][actor_idx, target_idx][np.newaxis] for feature in self.features}
+
+    def _get_code_confidences(self, codes: dict[str, np.ndarray], window_count: int) -> ConfidenceArray:
+        # Windows with no tuple block are impartial
+        is_present = codes[self.features[0]][0] != MISSING
+        return super()._get_code_confidences(codes, window_count).where(is_present, Confidence.impartial())
+
+    def _get_block_confidence(self, block: TupleBlock | None) -> Confidence:
+        return self.get_confidence(self.variables, [None, None], [[None, block], [None, None]], timedelta(seconds=1))
+
     def is_subset(self, other: BehaviorNode) -> bool:
         if not isinstance(other, ActorTargetStateNode):
             return False
@@ -239,6 +449,8 @@ class MutualStateNode(ElementaryNode):
     for tuple blocks  - ActualDistanceChange, MutualDirection and Distance.
     """
 
+    features = ['actual_distance_change', 'mutual_direction', 'distance']
+
     def __init__(self,
                  variables: list[BehaviorVariable],
                  distance_change: DistanceChange | None = None,
@@ -255,10 +467,10 @@ class MutualStateNode(ElementaryNode):
                        _: list[SingleBlock],
                        tuple_block_section: list[list[TupleBlock]],
                        duration: timedelta) -> Confidence:
-        used_indices = {i for i, var in enumerate(variables) if var in self.variables}
+        used_indices = [i for i, var in enumerate(variables) if var in self.variables]
         tuple_blocks = []
-        for i in range(len(tuple_block_section)):
-            for j in range(len(tuple_block_section[i])):
+        for i in used_indices:
+            for j in used_indices:
                 if i == j:
                     continue
                 tuple_blocks.append(tuple_block_section[i][j] or tuple_block_section[j][i])
@@ -306,6 +518,54 @@ class MutualStateNode(ElementaryNode):
     def is_symmetrical(self, agent_variables: set[BehaviorVariable]) -> bool:
         return set(self.variables) == agent_variables
 
+    def get_state_requirements(self, min_conformity: float, min_duration: timedelta) \
+            -> list[tuple[BehaviorNode, float, timedelta]]:
+        if len(self.variables) != 2 or min_conformity <= 0:
+            return []
+        if (self.expected_distance_change is None and self.expected_mutual_direction is None and
+                self.expected_distance is None):
+            return []
+        return [(self, min_conformity, min_duration)]
+
+    def may_hold(self, relation_index: RelationIndex, first_id: int, second_id: int,
+                 min_conformity: float, min_duration: timedelta) -> bool:
+        """
+        Check whether this two-variable node may hold for a pair of agents with at least min_conformity conformity over
+        a time frame of at least min_duration. Confidence is averaged over both tuples of the pair (one for each order),
+        whose feature values are matched by blocks of either order.
+        """
+        tolerance = 1e-9
+
+        durations = [relation_index.duration(first_id, second_id, feature, expected) +
+                     relation_index.duration(second_id, first_id, feature, expected)
+                     for feature, expected in [('actual_distance_change', self.expected_distance_change),
+                                               ('mutual_direction', self.expected_mutual_direction),
+                                               ('distance', self.expected_distance)]
+                     if expected is not None]
+
+        if Configuration.confidence_conjunction_strategy == ConfidenceConjunctionStrategy.MIN:
+            conform_seconds = min(durations)
+        else:
+            conform_seconds = sum(durations) / len(durations)
+        return (conform_seconds > 0 and
+                conform_seconds >= min_conformity * min_duration.total_seconds() - tolerance)
+
+    def _get_expected_values(self) -> tuple:
+        return self.expected_distance_change, self.expected_mutual_direction, self.expected_distance
+
+    def _get_window_codes(self, variables: list[BehaviorVariable], windows: WindowTable) -> dict[str, np.ndarray]:
+        agent_idxs = [idx for idx, variable in enumerate(variables) if variable in self.variables]
+        pairs = [(i, j) for i in agent_idxs for j in agent_idxs if i != j]
+        first_idxs = [i for i, _ in pairs]
+        second_idxs = [j for _, j in pairs]
+
+        # Pair is matched by tuple block of either order, preferably of the first agent as actor
+        codes = {}
+        for feature in self.features:
+            forward = windows.codes[feature][first_idxs, second_idxs]
+            codes[feature] = np.where(forward != MISSING, forward, windows.codes[feature][second_idxs, first_idxs])
+        return codes
+
     def is_subset(self, other: BehaviorNode) -> bool:
         if not isinstance(other, MutualStateNode):
             return False
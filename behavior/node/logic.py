@@ -1,11 +1,14 @@
 from datetime import timedelta
 
+import numpy as np
+
 from .base import BehaviorNode
+from .cache import LayerCache
+from .elementary import ActorTargetStateNode
 
 from ..configuration import Configuration, ConfidenceConjunctionStrategy
-from ..data import BehaviorVariable, Confidence, RelativeTimeFrame
-from ..data.agent import BlockWindow
-from ..time_graph import LambdaTimeGraphLayer
+from ..data import BehaviorVariable, Confidence, ConfidenceArray, RelativeTimeFrame, WindowTable
+from ..time_graph import LambdaTimeGraphLayer, TimeGraphLayer, WindowBounds, max_window_bounds
 
 
 class LogicalNode(BehaviorNode):
@@ -93,9 +96,17 @@ class ConjunctionNode(LogicalNode):
         super().__init__(name)
         self.children = children
 
-    def compute_graph_layer(self, variables: list[BehaviorVariable], windows: list[BlockWindow]) \
-            -> LambdaTimeGraphLayer:
-        child_layers = [action.compute_graph_layer(variables, windows) for action in self.children]
+    def compute_graph_layer(self, variables: list[BehaviorVariable], windows: WindowTable,
+                            layer_cache: LayerCache | None = None) -> LambdaTimeGraphLayer:
+        child_layers = [action.compute_graph_layer(variables, windows, layer_cache) for action in self.children]
+        return self.__create_layer(child_layers, windows)
+
+    def extend_graph_layer(self, variables: list[BehaviorVariable], windows: WindowTable, appended: int,
+                           discarded: int) -> LambdaTimeGraphLayer:
+        child_layers = [action.extend_graph_layer(variables, windows, appended, discarded) for action in self.children]
+        return self.__create_layer(child_layers, windows)
+
+    def __create_layer(self, child_layers: list[TimeGraphLayer], windows: WindowTable) -> LambdaTimeGraphLayer:
 
         comparer_as_key_selector = Configuration.comparer.get_key_sorter()
 
@@ -103,8 +114,21 @@ class ConjunctionNode(LogicalNode):
             def get_weight(start: int, stop: int) -> Confidence:
                 return min([child_layer(start, stop) for child_layer in child_layers], key=comparer_as_key_selector)
 
+            def get_row(start: int, stop_from: int, stop_to: int) -> ConfidenceArray:
+                return _select_rows([child_layer.row(start, stop_from, stop_to) for child_layer in child_layers],
+                                    np.less)
+
+            def get_range(start: int, width: int) -> tuple[int, int]:
+                # Minimum of confidences has zero nominator if any of them has
+                return _intersect_ranges([child_layer.end_range(start, width) for child_layer in child_layers])
+
+            def get_bounds() -> WindowBounds | None:
+                # Minimum is one of confidences of children
+                return max_window_bounds([child_layer.window_bounds() for child_layer in child_layers])
+
             layer = LambdaTimeGraphLayer(get_weight, len(windows), name=str(self),
-                                         sublayers=child_layers if Configuration.debug else None)
+                                         sublayers=child_layers if Configuration.debug else None,
+                                         rowing=get_row, ranging=get_range, bounding=get_bounds)
             return layer
 
         elif Configuration.confidence_conjunction_strategy == ConfidenceConjunctionStrategy.AVG:
@@ -113,10 +137,49 @@ class ConjunctionNode(LogicalNode):
                 return Confidence(sum([c.nom for c in sub_confs]) / len(self.children),
                                   sum([c.denom for c in sub_confs]) / len(self.children))
 
+            def get_row(start: int, stop_from: int, stop_to: int) -> ConfidenceArray:
+                sub_confs = ConfidenceArray.impartial(stop_to - stop_from)
+                for child_layer in child_layers:
+                    sub_confs = sub_confs + child_layer.row(start, stop_from, stop_to)
+                return sub_confs / len(self.children)
+
+            def get_range(start: int, width: int) -> tuple[int, int]:
+                # Average of confidences has zero nominator only if all of them have
+                return _span_ranges([child_layer.end_range(start, width) for child_layer in child_layers])
+
+            def get_bounds() -> WindowBounds | None:
+                # Average is bounded by averages of bounds, its conformity by that of the most conform child
+                bounds = [child_layer.window_bounds() for child_layer in child_layers]
+                if any(bound is None for bound in bounds):
+                    return None
+                return (sum(noms for noms, _, _ in bounds) / len(self.children),
+                        sum(denoms for _, denoms, _ in bounds) / len(self.children),
+                        max(conformity for _, _, conformity in bounds))
+
             layer = LambdaTimeGraphLayer(get_weight, len(windows), name=str(self),
-                                         sublayers=child_layers if Configuration.debug else None)
+                                         sublayers=child_layers if Configuration.debug else None,
+                                         rowing=get_row, ranging=get_range, bounding=get_bounds)
             return layer
 
+    def get_state_requirements(self, min_conformity: float, min_duration: timedelta) \
+            -> list[tuple[BehaviorNode, float, timedelta]]:
+        if Configuration.confidence_conjunction_strategy != ConfidenceConjunctionStrategy.AVG:
+            # Minimum is selected by comparer, which does not bound conformities of other children
+            return []
+        if any(_contains_negation(child) for child in self.children):
+            # Negation of an impossible confidence is absolute, which may outweigh any other child
+            return []
+
+        # Each child has nominator at most equal to its denominator, which is at most the duration. Average of
+        # children is thus at least min_conformity conform only if each child is at least
+        # 1 - (1 - min_conformity) * children count conform. Impossible children make the average impossible.
+        child_min_conformity = 1.0 - (1.0 - min_conformity) * len(self.children)
+        requirements = []
+        for child in self.children:
+            requirements += child.get_state_requirements(child_min_conformity, min_duration)
+        # Actor-target nodes are impartial with no tuple block, in which case other children alone determine confidence
+        return [requirement for requirement in requirements if not isinstance(requirement[0], ActorTargetStateNode)]
+
     def __str__(self):
         return self.name or f"({") AND (".join(map(str, self.children))})"
 
@@ -140,17 +203,38 @@ class DisjunctionNode(LogicalNode):
         super().__init__(name)
         self.children = children
 
-    def compute_graph_layer(self, variables: list[BehaviorVariable], windows: list[BlockWindow]) \
-            -> LambdaTimeGraphLayer:
-        child_layers = [action.compute_graph_layer(variables, windows) for action in self.children]
+    def compute_graph_layer(self, variables: list[BehaviorVariable], windows: WindowTable,
+                            layer_cache: LayerCache | None = None) -> LambdaTimeGraphLayer:
+        child_layers = [action.compute_graph_layer(variables, windows, layer_cache) for action in self.children]
+        return self.__create_layer(child_layers, windows)
+
+    def extend_graph_layer(self, variables: list[BehaviorVariable], windows: WindowTable, appended: int,
+                           discarded: int) -> LambdaTimeGraphLayer:
+        child_layers = [action.extend_graph_layer(variables, windows, appended, discarded) for action in self.children]
+        return self.__create_layer(child_layers, windows)
+
+    def __create_layer(self, child_layers: list[TimeGraphLayer], windows: WindowTable) -> LambdaTimeGraphLayer:
 
         comparer_as_key_selector = Configuration.comparer.get_key_sorter()
 
         def get_weight(start: int, stop: int) -> Confidence:
             return max([child_layer(start, stop) for child_layer in child_layers], key=comparer_as_key_selector)
 
+        def get_row(start: int, stop_from: int, stop_to: int) -> ConfidenceArray:
+            return _select_rows([child_layer.row(start, stop_from, stop_to) for child_layer in child_layers],
+                                np.greater)
+
+        def get_range(start: int, width: int) -> tuple[int, int]:
+            # Maximum of confidences has zero nominator only if all of them have
+            return _span_ranges([child_layer.end_range(start, width) for child_layer in child_layers])
+
+        def get_bounds() -> WindowBounds | None:
+            # Maximum is one of confidences of children
+            return max_window_bounds([child_layer.window_bounds() for child_layer in child_layers])
+
         layer = LambdaTimeGraphLayer(get_weight, len(windows), name=str(self),
-                                     sublayers=child_layers if Configuration.debug else None)
+                                     sublayers=child_layers if Configuration.debug else None,
+                                     rowing=get_row, ranging=get_range, bounding=get_bounds)
         return layer
 
     def __str__(self):
@@ -176,16 +260,36 @@ class NegationNode(LogicalNode):
         super().__init__(name)
         self.children = [child]
 
-    def compute_graph_layer(self, variables: list[BehaviorVariable], windows: list[BlockWindow]) \
-            -> LambdaTimeGraphLayer:
-        child_layer = self.children[0].compute_graph_layer(variables, windows)
+    def compute_graph_layer(self, variables: list[BehaviorVariable], windows: WindowTable,
+                            layer_cache: LayerCache | None = None) -> LambdaTimeGraphLayer:
+        child_layer = self.children[0].compute_graph_layer(variables, windows, layer_cache)
+        return self.__create_layer(child_layer, windows)
+
+    def extend_graph_layer(self, variables: list[BehaviorVariable], windows: WindowTable, appended: int,
+                           discarded: int) -> LambdaTimeGraphLayer:
+        child_layer = self.children[0].extend_graph_layer(variables, windows, appended, discarded)
+        return self.__create_layer(child_layer, windows)
+
+    def __create_layer(self, child_layer: TimeGraphLayer, windows: WindowTable) -> LambdaTimeGraphLayer:
 
         def get_weight(start: int, stop: int) -> Confidence:
             child_confidence = child_layer(start, stop)
             return Confidence(child_confidence.denom - child_confidence.nom, child_confidence.denom)
 
+        def get_row(start: int, stop_from: int, stop_to: int) -> ConfidenceArray:
+            return child_layer.row(start, stop_from, stop_to).complement()
+
+        def get_bounds() -> WindowBounds | None:
+            # Complement has nominator at most the denominator of child, which is infinite for impossible children
+            bounds = child_layer.window_bounds()
+            if bounds is None:
+                return None
+            _, denoms, _ = bounds
+            return denoms, denoms, 1.0
+
         layer = LambdaTimeGraphLayer(get_weight, len(windows), name=str(self),
-                                     sublayers=[child_layer] if Configuration.debug else None)
+                                     sublayers=[child_layer] if Configuration.debug else None,
+                                     rowing=get_row, bounding=get_bounds)
         return layer
 
     def is_symmetrical(self, agent_variables: set[BehaviorVariable]) -> bool:
@@ -198,3 +302,38 @@ class NegationNode(LogicalNode):
         if not isinstance(other, NegationNode):
             return False
         return self.children[0] == other.children[0]
+
+
+def _contains_negation(node: BehaviorNode) -> bool:
+    return isinstance(node, NegationNode) or any(_contains_negation(child) for child in node.children)
+
+
+def _select_rows(rows: list[ConfidenceArray], is_preferred: np.ufunc) -> ConfidenceArray:
+    """
+    Vectorized counterpart of built-in min/max over confidences. As no key is used there, confidences are compared
+    as plain tuples, i.e., by nominators first and denominators second.
+    :param rows: Rows of confidences, one for each child layer.
+    :param is_preferred: Strict comparison (np.less for min, np.greater for max). On ties, earlier rows are kept.
+    :return: Row of selected confidences.
+    """
+    selected = rows[0]
+    for row in rows[1:]:
+        is_selected = (is_preferred(row.noms, selected.noms) |
+                       ((row.noms == selected.noms) & is_preferred(row.denoms, selected.denoms)))
+        selected = row.where(is_selected, selected)
+    return selected
+
+
+def _intersect_ranges(ranges: list[tuple[int, int]]) -> tuple[int, int]:
+    """
+    Intersection of ranges of ends (see TimeGraphLayer.end_range).
+    """
+    return max(j_from for j_from, _ in ranges), min(j_to for _, j_to in ranges)
+
+
+def _span_ranges(ranges: list[tuple[int, int]]) -> tuple[int, int]:
+    """
+    Smallest range of ends (see TimeGraphLayer.end_range) covering all provided ranges.
+    """
+    ranges = [(j_from, j_to) for j_from, j_to in ranges if j_from < j_to] or ranges[:1]
+    return min(j_from for j_from, _ in ranges), max(j_to for _, j_to in ranges)
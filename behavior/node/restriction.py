@@ -1,11 +1,14 @@
 from datetime import timedelta
 
+import numpy as np
+
 from .base import BehaviorNode
+from .cache import LayerCache
 
 from ..configuration import Configuration
-from ..data.agent import BlockWindow
-from ..data import BehaviorVariable, RelativeTimeFrame, Confidence, ConfidenceComparer
-from ..time_graph import LambdaTimeGraphLayer
+from ..data import (BehaviorVariable, RelativeTimeFrame, Confidence, ConfidenceArray, ConfidenceComparer, WindowTable,
+                    to_micros)
+from ..time_graph import LambdaTimeGraphLayer, TimeGraphLayer, WindowBounds
 
 
 class RestrictingNode(BehaviorNode):
@@ -29,21 +32,47 @@ class TimeRestrictingNode(RestrictingNode):
         self.children = [action]
         self.time_requirement = time_requirement
 
-    def compute_graph_layer(self, variables: list[BehaviorVariable],
-                            windows: list[BlockWindow]) -> LambdaTimeGraphLayer:
+    def compute_graph_layer(self, variables: list[BehaviorVariable], windows: WindowTable,
+                            layer_cache: LayerCache | None = None) -> LambdaTimeGraphLayer:
+        child_layer = self.children[0].compute_graph_layer(variables, windows, layer_cache)
+        return self.__create_layer(child_layer, windows)
+
+    def extend_graph_layer(self, variables: list[BehaviorVariable], windows: WindowTable, appended: int,
+                           discarded: int) -> LambdaTimeGraphLayer:
+        child_layer = self.children[0].extend_graph_layer(variables, windows, appended, discarded)
+        return self.__create_layer(child_layer, windows)
 
-        durations = [duration for _, _, duration in windows]
-        child_layer = self.children[0].compute_graph_layer(variables, windows)
+    def __create_layer(self, child_layer: TimeGraphLayer, windows: WindowTable) -> LambdaTimeGraphLayer:
+
+        # Durations are summed in whole microseconds (i.e., exactly, as timedelta does)
+        elapsed = np.concatenate([[0], np.cumsum(windows.durations)]).astype(np.int64)
+        # Limits are clamped to the total duration, as requirements may be unbounded (i.e., up to timedelta.max)
+        minimal = min(to_micros(self.time_requirement.minimal), int(elapsed[-1]) + 1)
+        maximal = min(to_micros(self.time_requirement.maximal), int(elapsed[-1]))
 
         def get_weight(start: int, stop: int) -> Confidence:
-            frame_duration = sum(durations[start:stop], start=timedelta(0))
+            frame_duration = max(int(elapsed[stop] - elapsed[start]), 0)
 
-            if frame_duration in self.time_requirement:
+            if minimal <= frame_duration <= maximal:
                 return child_layer(start, stop)
             return Confidence.impossible()
 
+        def get_row(start: int, stop_from: int, stop_to: int) -> ConfidenceArray:
+            frame_durations = np.maximum(elapsed[stop_from:stop_to] - elapsed[start], 0)
+            is_fitting = (minimal <= frame_durations) & (frame_durations <= maximal)
+            return child_layer.row(start, stop_from, stop_to).where(is_fitting, Confidence.impossible())
+
+        def get_range(start: int, width: int) -> tuple[int, int]:
+            # Elapsed time is non-decreasing, fitting frames therefore end in a continuous range
+            stop_from = int(np.searchsorted(elapsed, elapsed[start] + minimal, side='left'))
+            stop_to = int(np.searchsorted(elapsed, elapsed[start] + maximal, side='right'))
+            child_from, child_to = child_layer.end_range(start, width)
+            return max(stop_from, child_from), min(stop_to, child_to)
+
         layer = LambdaTimeGraphLayer(get_weight, len(windows), name=str(self),
-                                     sublayers=[child_layer] if Configuration.debug else None)
+                                     sublayers=[child_layer] if Configuration.debug else None,
+                                     rowing=get_row, ranging=get_range,
+                                     bounding=lambda: _restricted_bounds(child_layer.window_bounds()))
         return layer
 
     def get_sequence_info(self, default_min: timedelta | None = None) -> list[tuple[set[BehaviorVariable], timedelta]]:
@@ -52,6 +81,12 @@ class TimeRestrictingNode(RestrictingNode):
     def get_variables(self) -> list[set[BehaviorVariable]]:
         return self.children[0].get_variables()
 
+    def get_state_requirements(self, min_conformity: float, min_duration: timedelta) \
+            -> list[tuple[BehaviorNode, float, timedelta]]:
+        # Time frames not fitting the requirement are impossible
+        return self.children[0].get_state_requirements(min_conformity,
+                                                       max(min_duration, self.time_requirement.minimal))
+
     def get_time_requirement(self, default_min: timedelta | None = None,
                              default_max: timedelta | None = None) -> RelativeTimeFrame:
         child_time_req = self.children[0].get_time_requirement(default_min, default_max)
@@ -84,9 +119,17 @@ class ConfidenceRestrictingNode(RestrictingNode):
             Configuration.min_confidence + (1.0 - Configuration.min_confidence) / 2, 1.0)
         self.cmp = ConfidenceComparer.ConformityBased()
 
-    def compute_graph_layer(self, variables: list[BehaviorVariable],
-                            windows: list[BlockWindow]) -> LambdaTimeGraphLayer:
-        child_layer = self.children[0].compute_graph_layer(variables, windows)
+    def compute_graph_layer(self, variables: list[BehaviorVariable], windows: WindowTable,
+                            layer_cache: LayerCache | None = None) -> LambdaTimeGraphLayer:
+        child_layer = self.children[0].compute_graph_layer(variables, windows, layer_cache)
+        return self.__create_layer(child_layer, windows)
+
+    def extend_graph_layer(self, variables: list[BehaviorVariable], windows: WindowTable, appended: int,
+                           discarded: int) -> LambdaTimeGraphLayer:
+        child_layer = self.children[0].extend_graph_layer(variables, windows, appended, discarded)
+        return self.__create_layer(child_layer, windows)
+
+    def __create_layer(self, child_layer: TimeGraphLayer, windows: WindowTable) -> LambdaTimeGraphLayer:
 
         def get_weight(start: int, stop: int) -> Confidence:
             child_conf = child_layer(start, stop)
@@ -94,8 +137,16 @@ class ConfidenceRestrictingNode(RestrictingNode):
                 return Confidence.impossible()
             return child_conf
 
+        def get_row(start: int, stop_from: int, stop_to: int) -> ConfidenceArray:
+            child_confs = child_layer.row(start, stop_from, stop_to)
+            is_accepted = ~np.signbit(self.cmp.compare_arrays(child_confs.noms, child_confs.denoms,
+                                                              self.min_confidence.nom, self.min_confidence.denom))
+            return child_confs.where(is_accepted, Confidence.impossible())
+
         layer = LambdaTimeGraphLayer(get_weight, len(windows), name=str(self),
-                                     sublayers=[child_layer] if Configuration.debug else None)
+                                     sublayers=[child_layer] if Configuration.debug else None,
+                                     rowing=get_row, ranging=child_layer.end_range,
+                                     bounding=lambda: _restricted_bounds(child_layer.window_bounds()))
         return layer
 
     def get_sequence_info(self, default_min: timedelta | None = None) -> list[tuple[set[BehaviorVariable], timedelta]]:
@@ -104,6 +155,12 @@ class ConfidenceRestrictingNode(RestrictingNode):
     def get_variables(self) -> list[set[BehaviorVariable]]:
         return self.children[0].get_variables()
 
+    def get_state_requirements(self, min_conformity: float, min_duration: timedelta) \
+            -> list[tuple[BehaviorNode, float, timedelta]]:
+        # Confidences compared as less than min_confidence are impossible
+        return self.children[0].get_state_requirements(
+            max(min_conformity, self.cmp.min_accepted_conformity(self.min_confidence)), min_duration)
+
     def get_time_requirement(self, default_min: timedelta | None = None,
                              default_max: timedelta | None = None) -> RelativeTimeFrame:
         return self.children[0].get_time_requirement(default_min, default_max)
@@ -121,3 +178,14 @@ class ConfidenceRestrictingNode(RestrictingNode):
         if not isinstance(other, ConfidenceRestrictingNode):
             return False
         return self.children[0] == other.children[0] and self.min_confidence == other.min_confidence
+
+
+def _restricted_bounds(bounds: WindowBounds | None) -> WindowBounds | None:
+    """
+    Bounds of confidences of a restricting node (see TimeGraphLayer.window_bounds), given bounds of its child.
+    Rejected confidences are impossible, i.e., of zero nominator but of infinite denominator.
+    """
+    if bounds is None:
+        return None
+    noms, denoms, conformity = bounds
+    return noms, np.full_like(denoms, np.inf), conformity
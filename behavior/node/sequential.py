@@ -1,10 +1,9 @@
-import itertools
 from datetime import timedelta
 
 from .base import BehaviorNode
+from .cache import LayerCache
 
-from ..data.agent import BlockWindow
-from ..data import BehaviorVariable, RelativeTimeFrame
+from ..data import BehaviorVariable, RelativeTimeFrame, WindowTable, to_micros
 from ..time_graph import TimeGraph, ContractedTimeGraphLayer
 
 
@@ -14,6 +13,8 @@ class SequentialNode(BehaviorNode):
     """
 
     graph: TimeGraph | None
+    windows: WindowTable | None
+    """Windows retained by the graph, i.e., starting at graph's offset"""
 
     def __init__(self, *nodes: BehaviorNode, name: str | None = None):
         super().__init__(name)
@@ -41,31 +42,89 @@ class SequentialNode(BehaviorNode):
             new_max = sum([ctr.maximal for ctr in child_time_reqs], timedelta(0))
         return RelativeTimeFrame(sum([ctr.minimal for ctr in child_time_reqs], timedelta(0)), new_max)
 
-    def compute_graph(self, variables: list[BehaviorVariable], windows: list[BlockWindow]) -> TimeGraph:
-        self.__compute_sequence(variables, windows)
+    def compute_graph(self, variables: list[BehaviorVariable], windows: WindowTable,
+                      layer_cache: LayerCache | None = None, prune_dead_ends: bool | None = None) -> TimeGraph:
+        """
+        Compute the graph of the sequence over windows.
+        :param prune_dead_ends: Whether dead ends of the graph are pruned (see TimeGraph). Graphs which are to be
+        extended (see extend_graph) should not be pruned, as pruned graphs are recomputed once extended.
+        """
+        self.__compute_sequence(variables, windows, layer_cache, prune_dead_ends)
         return self.graph
 
-    def compute_graph_layer(self, variables: list[BehaviorVariable], windows: list[BlockWindow]) \
-            -> ContractedTimeGraphLayer:
-        layer = self.__compute_sequence(variables, windows)
+    def create_graph(self, variables: list[BehaviorVariable], windows: WindowTable,
+                     layer_cache: LayerCache | None = None) -> TimeGraph:
+        """
+        Create the graph as compute_graph does, but without computing it (see TimeGraph.compute), e.g., so that its
+        bounds are checked first (see TimeGraph.upper_bound). The graph is computed once its paths are requested.
+        """
+        self.__create_graph(variables, windows, layer_cache)
+        return self.graph
+
+    def extend_graph(self, variables: list[BehaviorVariable], windows: WindowTable,
+                     retention: timedelta | None = None) -> TimeGraph:
+        """
+        Extend the graph computed by compute_graph by newly appended windows, e.g., of footage still being recorded.
+        Only nodes of appended windows are computed. Layers of children are extended as well (see
+        BehaviorNode.extend_graph_layer), so are graphs of nested sequential nodes. Layers of elementary nodes reuse
+        sums of retained windows, only confidences of appended windows are computed.
+        :param variables: Variables in order matching the processed agents.
+        :param windows: Windows appended after all windows processed so far.
+        :param retention: Maximal duration of matched paths. If set, windows further than retention before the
+        appended ones are discarded, so that memory stays bounded on arbitrarily long streams.
+        :return: Extended graph.
+        """
+        discarded = 0
+        if retention is not None:
+            # Nodes further than retention before the last node cannot start a path ending in any appended node
+            timetable = self.graph.timetable
+            retention_micros = to_micros(retention)
+            retained_from = 0
+            while timetable[-1] - timetable[retained_from] > retention_micros:
+                retained_from += 1
+
+            offset = self.graph.offset
+            self.graph.discard_before(offset + retained_from)
+            discarded = self.graph.offset - offset
+
+        self.__extend_sequence(variables, self.windows[discarded:] + windows, len(windows), discarded)
+        return self.graph
+
+    def extend_graph_layer(self, variables: list[BehaviorVariable], windows: WindowTable, appended: int,
+                           discarded: int) -> ContractedTimeGraphLayer:
+        if self.windows is not windows:
+            # Nodes of discarded windows are discarded by the graph, which is thus indexed as other layers
+            self.graph.discard_before(self.graph.offset + discarded)
+            self.__extend_sequence(variables, windows, appended, discarded)
+        return self.graph.contracted
+
+    def compute_graph_layer(self, variables: list[BehaviorVariable], windows: WindowTable,
+                            layer_cache: LayerCache | None = None) -> ContractedTimeGraphLayer:
+        layer = self.__compute_sequence(variables, windows, layer_cache)
         return layer
 
-    def __compute_sequence(self, variables: list[BehaviorVariable], windows: list[BlockWindow]) \
+    def __compute_sequence(self, variables: list[BehaviorVariable], windows: WindowTable,
+                           layer_cache: LayerCache | None = None, prune_dead_ends: bool | None = None) \
             -> ContractedTimeGraphLayer:
-        window_count = len(windows)
-        time_layers = [action.compute_graph_layer(variables, windows) for action in self.children]
+        self.__create_graph(variables, windows, layer_cache, prune_dead_ends)
+        return self.graph.contracted
 
-        timetable = [duration for _, _, duration in windows]
+    def __extend_sequence(self, variables: list[BehaviorVariable], windows: WindowTable, appended: int,
+                          discarded: int):
+        self.windows = windows
+        time_layers = [action.extend_graph_layer(variables, windows, appended, discarded) for action in self.children]
+        self.graph.extend(time_layers, windows.durations[len(windows) - appended:].tolist())
 
-        ref_time = None
-        for block in itertools.chain(windows[0][0], *windows[0][1]):
-            if block is not None:
-                ref_time = block.start_time
-                break
+    def __create_graph(self, variables: list[BehaviorVariable], windows: WindowTable,
+                       layer_cache: LayerCache | None = None, prune_dead_ends: bool | None = None):
+        window_count = len(windows)
+        time_layers = [action.compute_graph_layer(variables, windows, layer_cache) for action in self.children]
 
-        self.graph = TimeGraph(time_layers, window_count + 1, timetable=timetable, reference_time=ref_time,
-                               name=self.name)
-        return self.graph.contracted
+        ref_time, _ = windows.time_frame(0)
+
+        self.windows = windows
+        self.graph = TimeGraph(time_layers, window_count + 1, timetable=windows.durations.tolist(),
+                               reference_time=ref_time, name=self.name, prune_dead_ends=prune_dead_ends)
 
     def is_symmetrical(self, agent_variables: set[BehaviorVariable]) -> bool:
         return all(child.is_symmetrical(agent_variables) for child in self.children)
@@ -1,8 +1,10 @@
+import unittest
 from datetime import datetime, timedelta
 from typing import TypeVar, cast
 
 from ...data import (Speed, Direction, MutualDirection, DistanceChange, Distance, SingleBlock, Agent, AgentTuple,
                      TupleBlock)
+from ...time_graph import TimeGraphLayer
 
 AgentHandle = TypeVar("AgentHandle")
 
@@ -116,3 +118,11 @@ class BlockBuilder:
 
     def build(self):
         return self.agents, self.agent_tuples
+
+
+def assert_rows_match_calls(test: unittest.TestCase, layer: TimeGraphLayer, width: int):
+    """
+    Assert that batch computation of layer's rows (TimeGraphLayer.row) matches computation of each separate edge.
+    """
+    for i in range(width):
+        test.assertListEqual([layer(i, j) for j in range(width + 1)], layer.row(i, 0, width + 1).to_confidences())
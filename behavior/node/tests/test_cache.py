@@ -0,0 +1,79 @@
+import unittest
+from datetime import timedelta
+
+from .behavior_utils import BlockBuilder, reference_date
+
+from ..cache import LayerCache
+from ..elementary import StateNode, ActorTargetStateNode, MutualStateNode
+
+from ...data import AgentVariable, Speed, Direction, DistanceChange, Distance, TimeFrame, cut_to_windows
+
+
+class LayerCacheTest(unittest.TestCase):
+
+    @staticmethod
+    def create_agents():
+        anna = AgentVariable("Anna")
+        bob = AgentVariable("Bob")
+        agents, agent_tuples = (BlockBuilder([anna, bob], granularity=None)
+                                .with_agent(anna, 4, Speed.RUN, Direction.STRAIGHT)
+                                .without_agent(anna, 2)
+                                .with_agent(anna, 6, Speed.WALK, Direction.LEFT)
+                                .with_agent(bob, 12, Speed.STAND, Direction.NOT_MOVING)
+                                .without_agents(anna, bob, 3)
+                                .with_agents(anna, bob, 5, intent_distance=DistanceChange.DECREASING,
+                                             distance=Distance.ADJACENT)
+                                .build())
+        return anna, bob, agents, agent_tuples
+
+    def test_compute_graph_layer(self):
+        anna, bob, agents, agent_tuples = self.create_agents()
+        agent_list = [agents[anna], agents[bob]]
+        agent_tuple_list = [agent_tuples[anna, bob]]
+
+        # Layers are resampled from blocks of whole agents onto windows of agents cut to a time frame
+        time_frame = TimeFrame(reference_date + timedelta(seconds=1), reference_date + timedelta(seconds=9.5))
+        windows = cut_to_windows([agent.during_time(time_frame) for agent in agent_list],
+                                 [agent_tuple.during_time(time_frame) for agent_tuple in agent_tuple_list])
+
+        layer_cache = LayerCache()
+        layer_cache.bind(agent_list, agent_tuple_list)
+
+        for node in [StateNode([anna], speed=Speed.RUN, direction=Direction.LEFT),
+                     StateNode([bob], speed=Speed.STAND),
+                     ActorTargetStateNode([anna, bob], intended_distance_change=DistanceChange.DECREASING),
+                     ActorTargetStateNode([bob, anna], intended_distance_change=DistanceChange.DECREASING),
+                     StateNode([anna, bob], speed=Speed.WALK),
+                     MutualStateNode([anna, bob], distance=Distance.ADJACENT)]:
+            self.assertListEqual(node.compute_graph_layer([anna, bob], windows).right_edges,
+                                 node.compute_graph_layer([anna, bob], windows, layer_cache).right_edges)
+
+        # Nodes of multiple agents are not cached
+        self.assertEqual(0, layer_cache.hits)
+        self.assertEqual(4, layer_cache.misses)
+
+        StateNode([anna], speed=Speed.RUN, direction=Direction.LEFT).compute_graph_layer([anna, bob], windows,
+                                                                                         layer_cache)
+        self.assertEqual(1, layer_cache.hits)
+
+    def test_eviction(self):
+        anna, bob, agents, agent_tuples = self.create_agents()
+        windows = cut_to_windows([agents[anna], agents[bob]], [])
+
+        layer_cache = LayerCache(memory_budget=80)
+        layer_cache.bind([agents[anna], agents[bob]], [])
+
+        run_node = StateNode([anna], speed=Speed.RUN)
+        stand_node = StateNode([bob], speed=Speed.STAND)
+        # Timeline of two blocks and a missing block takes 2 * 8 + 2 * 3 * 8 bytes, only a single one fits
+        run_node.compute_graph_layer([anna, bob], windows, layer_cache)
+        stand_node.compute_graph_layer([anna, bob], windows, layer_cache)
+        run_node.compute_graph_layer([anna, bob], windows, layer_cache)
+
+        self.assertEqual(3, layer_cache.misses)
+        self.assertEqual(2, layer_cache.evictions)
+        self.assertEqual(64, layer_cache.memory)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,7 +7,7 @@ from ..elementary import StateNode, MutualStateNode, ActorTargetStateNode
 
 from ...configuration import Configuration, ConfidenceConjunctionStrategy
 from ...data import (AgentVariable, cut_to_windows, Speed, Direction, DistanceChange, MutualDirection, Distance,
-                     SingleBlock, TupleBlock, Confidence)
+                     SingleBlock, TupleBlock, Confidence, RelationIndex)
 
 
 class ElementaryNodeTest(unittest.TestCase):
@@ -313,6 +313,65 @@ class StateNodeTest(unittest.TestCase):
             )
         )
 
+    def test_may_hold(self):
+        anna = AgentVariable("Anna")
+        agents, _ = (BlockBuilder([anna])
+                     .with_agent(anna, 4, Speed.RUN, Direction.STRAIGHT)
+                     .with_agent(anna, 10, Speed.WALK, Direction.LEFT)
+                     .build())
+
+        run_node = StateNode([anna], speed=Speed.RUN)
+        self.assertTrue(run_node.may_hold(agents[anna], 1.0, timedelta(seconds=4)))
+        # Running for 4 seconds may still suffice for a less conform time frame of 6 seconds
+        self.assertTrue(run_node.may_hold(agents[anna], 0.65, timedelta(seconds=6)))
+        self.assertFalse(run_node.may_hold(agents[anna], 0.65, timedelta(seconds=7)))
+
+        stand_node = StateNode([anna], speed=Speed.STAND)
+        self.assertFalse(stand_node.may_hold(agents[anna], 0.1, timedelta(0)))
+
+        # Direction halves conformity of running blocks with AVG strategy
+        run_left_node = StateNode([anna], speed=Speed.RUN, direction=Direction.LEFT)
+        self.assertFalse(run_left_node.may_hold(agents[anna], 0.65, timedelta(0)))
+
+        self.assertListEqual([(run_node, 0.65, timedelta(0))],
+                             run_node.get_state_requirements(0.65, timedelta(0)))
+        self.assertListEqual([], StateNode([anna, AgentVariable("Bob")], speed=Speed.RUN)
+                             .get_state_requirements(0.65, timedelta(0)))
+
+        self.assertAlmostEqual(4 / 14, run_node.coverage(agents[anna]))
+        self.assertAlmostEqual(2 / 14 + 5 / 14, run_left_node.coverage(agents[anna]))
+
+    def test_tuple_may_hold(self):
+        anna = AgentVariable("Anna")
+        bob = AgentVariable("Bob")
+        _, agent_tuples = (BlockBuilder([anna, bob])
+                           .with_agents(anna, bob, 4, intent_distance=DistanceChange.DECREASING,
+                                        distance=Distance.ADJACENT)
+                           .with_agents(anna, bob, 6, distance=Distance.NEAR)
+                           .build())
+        relation_index = RelationIndex({(agent_tuple.actor.agent_id, agent_tuple.target.agent_id): agent_tuple
+                                        for agent_tuple in agent_tuples.values()})
+        anna_id, bob_id = agent_tuples[anna, bob].actor.agent_id, agent_tuples[anna, bob].target.agent_id
+
+        adjacent_node = MutualStateNode([anna, bob], distance=Distance.ADJACENT)
+        # Adjacency of either order counts, for at most 4 seconds
+        self.assertTrue(adjacent_node.may_hold(relation_index, bob_id, anna_id, 0.65, timedelta(seconds=6)))
+        self.assertFalse(adjacent_node.may_hold(relation_index, anna_id, bob_id, 0.65, timedelta(seconds=7)))
+        self.assertFalse(adjacent_node.may_hold(relation_index, anna_id, bob_id, 0.9, timedelta(seconds=5)))
+        self.assertFalse(MutualStateNode([anna, bob], distance=Distance.FAR)
+                         .may_hold(relation_index, anna_id, bob_id, 0.65, timedelta(0)))
+
+        approach_node = ActorTargetStateNode([anna, bob], intended_distance_change=DistanceChange.DECREASING)
+        # Windows with no tuple block are impartial, so that any approach may suffice
+        self.assertTrue(approach_node.may_hold(relation_index, anna_id, bob_id, 0.9, timedelta(seconds=60)))
+        self.assertFalse(approach_node.may_hold(relation_index, bob_id, anna_id, 0.9, timedelta(0)))
+
+        self.assertListEqual([(adjacent_node, 0.65, timedelta(0))],
+                             adjacent_node.get_state_requirements(0.65, timedelta(0)))
+        self.assertListEqual([], MutualStateNode([anna, bob, AgentVariable("Charlie")], distance=Distance.ADJACENT)
+                             .get_state_requirements(0.65, timedelta(0)))
+        self.assertListEqual([], ActorTargetStateNode([anna, bob]).get_state_requirements(0.65, timedelta(0)))
+
     def test_eq(self):
         anna = AgentVariable("Anna")
         bob = AgentVariable("Bob")
@@ -830,6 +889,16 @@ class MutualStateNodeTest(unittest.TestCase):
         self.assertEqual(Confidence(0.0, 10.0), layer(70, 80))
         # endregion
 
+        # Only tuples of node's own variables are matched
+        pair_node = MutualStateNode([anna, charlie], distance_change=DistanceChange.DECREASING)
+        for strategy in [ConfidenceConjunctionStrategy.AVG, ConfidenceConjunctionStrategy.MIN]:
+            Configuration.confidence_conjunction_strategy = strategy
+            layer = pair_node.compute_graph_layer([anna, bob, charlie], windows)
+
+            self.assertEqual(Confidence(10.0, 10.0), layer(10, 20))
+            self.assertEqual(Confidence(20.0, 20.0), layer(20, 40))
+            self.assertEqual(Confidence(0.0, 10.0), layer(70, 80))
+
         Configuration.confidence_conjunction_strategy = confidence_conjunction_strategy
 
     def test_is_subset(self):
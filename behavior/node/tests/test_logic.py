@@ -1,6 +1,7 @@
 import unittest
+from datetime import timedelta
 
-from .behavior_utils import BlockBuilder
+from .behavior_utils import BlockBuilder, assert_rows_match_calls
 
 from ..elementary import StateNode, ActorTargetStateNode, MutualStateNode
 from ..logic import ConjunctionNode, DisjunctionNode, NegationNode
@@ -96,6 +97,7 @@ class ConjunctionNodeTest(unittest.TestCase):
         # strategy: MIN
         Configuration.confidence_conjunction_strategy = ConfidenceConjunctionStrategy.MIN
         layer = conj_node.compute_graph_layer([anna], windows)
+        assert_rows_match_calls(self, layer, len(windows))
 
         self.assertEqual(Confidence(0.0, 10.0), layer(40, 50))
         self.assertEqual(Confidence(10.0, 20.0), layer(20, 40))
@@ -106,6 +108,7 @@ class ConjunctionNodeTest(unittest.TestCase):
         # strategy: AVG
         Configuration.confidence_conjunction_strategy = ConfidenceConjunctionStrategy.AVG
         layer = conj_node.compute_graph_layer([anna], windows)
+        assert_rows_match_calls(self, layer, len(windows))
 
         self.assertEqual(Confidence(5.0, 10.0), layer(40, 50))
         self.assertEqual(Confidence(10.0, 20.0), layer(20, 40))
@@ -159,6 +162,31 @@ class ConjunctionNodeTest(unittest.TestCase):
             conj_node
         )
 
+    def test_get_state_requirements(self):
+        anna = AgentVariable("Anna")
+        bob = AgentVariable("Bob")
+
+        run_node = StateNode([anna], speed=Speed.RUN)
+        stand_node = StateNode([bob], speed=Speed.STAND)
+        conj_node = ConjunctionNode([run_node, stand_node,
+                                     ActorTargetStateNode([anna, bob], relative_direction=Direction.LEFT)])
+
+        requirements = conj_node.get_state_requirements(0.9, timedelta(seconds=2))
+        # Actor-target node may be impartial, leaving conformity to other children
+        self.assertListEqual([run_node, stand_node], [node for node, _, _ in requirements])
+        # Average of three children is 0.9 conform only if each of them is at least 0.7 conform
+        self.assertAlmostEqual(0.7, requirements[0][1])
+        self.assertEqual(timedelta(seconds=2), requirements[0][2])
+
+        self.assertListEqual([], ConjunctionNode([run_node, NegationNode(stand_node)])
+                             .get_state_requirements(0.9, timedelta(0)))
+        self.assertListEqual([], DisjunctionNode([run_node, stand_node]).get_state_requirements(0.9, timedelta(0)))
+
+        confidence_conjunction_strategy = Configuration.confidence_conjunction_strategy
+        Configuration.confidence_conjunction_strategy = ConfidenceConjunctionStrategy.MIN
+        self.assertListEqual([], conj_node.get_state_requirements(0.9, timedelta(0)))
+        Configuration.confidence_conjunction_strategy = confidence_conjunction_strategy
+
 
 class DisjunctionNodeTest(unittest.TestCase):
 
@@ -178,6 +206,8 @@ class DisjunctionNodeTest(unittest.TestCase):
 
         layer = conj_node.compute_graph_layer([anna], windows)
 
+        assert_rows_match_calls(self, layer, len(windows))
+
         self.assertEqual(Confidence(10.0, 10.0), layer(40, 50))
         self.assertEqual(Confidence(10.0, 20.0), layer(20, 40))
         self.assertEqual(Confidence(10.0, 10.0), layer(10, 20))
@@ -246,6 +276,8 @@ class NegationNodeTest(unittest.TestCase):
 
         layer = neg_node.compute_graph_layer([anna], windows)
 
+        assert_rows_match_calls(self, layer, len(windows))
+
         self.assertEqual(Confidence(0.0, 10.0), layer(40, 50))
         self.assertEqual(Confidence(10.0, 20.0), layer(20, 40))
         self.assertEqual(Confidence(10.0, 10.0), layer(10, 20))
@@ -1,7 +1,7 @@
 import unittest
 from datetime import timedelta
 
-from .behavior_utils import BlockBuilder
+from .behavior_utils import BlockBuilder, assert_rows_match_calls
 
 from ..elementary import StateNode, ActorTargetStateNode
 from ..restriction import TimeRestrictingNode, ConfidenceRestrictingNode
@@ -26,12 +26,39 @@ class TimeRestrictingNodeTest(unittest.TestCase):
 
         layer = time_restr_node.compute_graph_layer([anna], windows)
 
+        assert_rows_match_calls(self, layer, len(windows))
+
         self.assertEqual(Confidence(10.0, 10.0), layer(40, 50))
         self.assertEqual(Confidence(20.0, 20.0), layer(40, 60))
         self.assertEqual(Confidence(10.0, 20.0), layer(50, 70))
         self.assertEqual(Confidence(0.0, 10.0), layer(10, 20))
         self.assertEqual(Confidence.impossible(), layer(40, 70))
 
+    def test_end_range(self):
+        anna = AgentVariable("Anna")
+        agents, _ = (BlockBuilder([anna])
+                     .with_agent(anna, 30, Speed.WALK, Direction.STRAIGHT)
+                     .with_agent(anna, 30, Speed.STAND, Direction.NOT_MOVING)
+                     .with_agent(anna, 30, Speed.WALK, Direction.LEFT)
+                     .build())
+        windows = cut_to_windows([agents[anna]], [])
+
+        speed_state_node = StateNode([anna], speed=Speed.STAND)
+        time_restr_node = TimeRestrictingNode(speed_state_node,
+                                              RelativeTimeFrame(timedelta(seconds=10), timedelta(seconds=20)))
+
+        layer = time_restr_node.compute_graph_layer([anna], windows)
+
+        self.assertEqual((50, 61), layer.end_range(40, len(windows) + 1))
+        self.assertEqual((90, 91), layer.end_range(80, len(windows) + 1))
+        self.assertEqual((91, 91), layer.end_range(85, len(windows) + 1))
+
+        for start in range(len(windows)):
+            end_from, end_to = layer.end_range(start, len(windows) + 1)
+            for end in range(start + 1, len(windows) + 1):
+                if not end_from <= end < end_to:
+                    self.assertEqual(0.0, layer(start, end).nom)
+
     def test_eq(self):
         anna = AgentVariable("Anna")
         bob = AgentVariable("Bob")
@@ -94,6 +121,8 @@ class ConfidenceRestrictingNodeTest(unittest.TestCase):
 
         layer = conf_restr_node.compute_graph_layer([anna], windows)
 
+        assert_rows_match_calls(self, layer, len(windows))
+
         self.assertEqual(Confidence(10.0, 10.0), layer(40, 50))
         self.assertEqual(Confidence(20.0, 20.0), layer(40, 60))
 
@@ -104,6 +133,21 @@ class ConfidenceRestrictingNodeTest(unittest.TestCase):
         # layer(40, 70) for speed_state_node = Confidence(20.0, 30.0)
         self.assertEqual(Confidence.impossible(), layer(40, 70))
 
+    def test_get_state_requirements(self):
+        anna = AgentVariable("Anna")
+        run_node = StateNode([anna], speed=Speed.RUN)
+
+        node = TimeRestrictingNode(ConfidenceRestrictingNode(run_node, Confidence(0.8, 1.0)),
+                                   RelativeTimeFrame(minimal=timedelta(seconds=3)))
+
+        # Conformity based comparison accepts confidences slightly less conform than min_confidence
+        [(required_node, min_conformity, min_duration)] = node.get_state_requirements(0.65, timedelta(0))
+        self.assertIs(run_node, required_node)
+        self.assertAlmostEqual(0.8 - 0.01 / 0.99, min_conformity)
+        self.assertEqual(timedelta(seconds=3), min_duration)
+        self.assertListEqual([(run_node, 0.9, timedelta(seconds=5))],
+                             node.get_state_requirements(0.9, timedelta(seconds=5)))
+
     def test_eq(self):
         anna = AgentVariable("Anna")
         bob = AgentVariable("Bob")
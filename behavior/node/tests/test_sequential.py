@@ -1,11 +1,13 @@
 import unittest
+from datetime import timedelta
 
 from .behavior_utils import BlockBuilder
 
 from ..elementary import StateNode, ActorTargetStateNode, MutualStateNode
+from ..restriction import TimeRestrictingNode
 from ..sequential import SequentialNode
 
-from ...data import AgentVariable, Speed, Direction, DistanceChange, Confidence, cut_to_windows
+from ...data import AgentVariable, Speed, Direction, DistanceChange, Confidence, RelativeTimeFrame, cut_to_windows
 
 
 class SequentialNodeTest(unittest.TestCase):
@@ -88,6 +90,106 @@ class SequentialNodeTest(unittest.TestCase):
 
         self.assertEqual(Confidence(14.0, 15.0), layer(0, 15))
 
+    def test_extend_graph(self):
+        anna = AgentVariable("Anna")
+        agents, _ = (BlockBuilder([anna])
+                     .with_agent(anna, 30, Speed.WALK, Direction.STRAIGHT)
+                     .with_agent(anna, 30, Speed.STAND, Direction.NOT_MOVING)
+                     .with_agent(anna, 30, Speed.WALK, Direction.LEFT)
+                     .with_agent(anna, 30, Speed.STAND, Direction.NOT_MOVING)
+                     .build())
+
+        windows = cut_to_windows([agents[anna]], [])
+        seq_node = SequentialNode(
+            StateNode([anna], speed=Speed.WALK),
+            StateNode([anna], speed=Speed.STAND)
+        )
+
+        full_graph = seq_node.compute_graph([anna], windows)
+        full_paths = full_graph.best_paths()
+
+        graph = seq_node.compute_graph([anna], windows[:25], prune_dead_ends=False)
+        graph.compute()
+        for chunk_start in range(25, len(windows), 20):
+            computed_width = graph.computed_width
+            graph = seq_node.extend_graph([anna], windows[chunk_start:chunk_start + 20])
+            # Nodes computed before the extension are kept
+            self.assertEqual(computed_width, graph.computed_width)
+            graph.compute()
+
+        self.assertEqual(full_graph.width, graph.width)
+        self.assertTrue((full_graph.backtrack_map.records == graph.backtrack_map.records).all())
+        self.assertListEqual(full_paths, graph.best_paths())
+
+    def test_extend_graph_with_retention(self):
+        anna = AgentVariable("Anna")
+        agents, _ = (BlockBuilder([anna])
+                     .with_agent(anna, 60, Speed.STAND, Direction.NOT_MOVING)
+                     .with_agent(anna, 30, Speed.WALK, Direction.LEFT)
+                     .with_agent(anna, 30, Speed.STAND, Direction.NOT_MOVING)
+                     .build())
+
+        windows = cut_to_windows([agents[anna]], [])
+        seq_node = SequentialNode(
+            TimeRestrictingNode(StateNode([anna], speed=Speed.WALK), RelativeTimeFrame(maximal=timedelta(seconds=10))),
+            TimeRestrictingNode(StateNode([anna], speed=Speed.STAND), RelativeTimeFrame(maximal=timedelta(seconds=10)))
+        )
+
+        full_graph = seq_node.compute_graph([anna], windows)
+        full_paths = full_graph.best_paths()
+
+        graph = seq_node.compute_graph([anna], windows[:10])
+        for chunk_start in range(10, len(windows), 10):
+            graph = seq_node.extend_graph([anna], windows[chunk_start:chunk_start + 10], timedelta(seconds=40))
+            graph.compute()
+
+            # Only windows within retention before the last chunk are kept
+            self.assertLessEqual(len(seq_node.windows), 50)
+            self.assertEqual(len(seq_node.windows) + 1, graph.width - graph.offset)
+
+        # Last chunk was appended after 110 windows, 40 seconds of which were retained
+        self.assertEqual(len(windows) - 10 - 40, graph.offset)
+        self.assertListEqual([path for path in full_paths if path[0][0] >= graph.path_to_time([graph.offset])[0]],
+                             graph.best_paths())
+        self.assertEqual(full_paths[0], graph.best_paths(1)[0])
+
+    def test_extend_nested_graph(self):
+        anna = AgentVariable("Anna")
+        agents, _ = (BlockBuilder([anna])
+                     .with_agent(anna, 30, Speed.WALK, Direction.STRAIGHT)
+                     .with_agent(anna, 30, Speed.STAND, Direction.NOT_MOVING)
+                     .with_agent(anna, 30, Speed.WALK, Direction.LEFT)
+                     .with_agent(anna, 30, Speed.STAND, Direction.NOT_MOVING)
+                     .with_agent(anna, 30, Speed.WALK, Direction.LEFT)
+                     .build())
+
+        windows = cut_to_windows([agents[anna]], [])
+        nested_node = SequentialNode(
+            StateNode([anna], speed=Speed.STAND),
+            StateNode([anna], speed=Speed.WALK)
+        )
+        seq_node = SequentialNode(
+            StateNode([anna], speed=Speed.WALK),
+            nested_node
+        )
+
+        full_paths = seq_node.compute_graph([anna], windows).best_paths()
+
+        graph = seq_node.compute_graph([anna], windows[:25], prune_dead_ends=False)
+        for chunk_start in range(25, len(windows), 20):
+            nested_graph = nested_node.graph
+            graph = seq_node.extend_graph([anna], windows[chunk_start:chunk_start + 20], timedelta(seconds=100))
+            graph.compute()
+
+            # Nested graph is extended alongside the outer one instead of being recomputed
+            self.assertIs(nested_graph, nested_node.graph)
+            self.assertEqual(graph.offset, nested_graph.offset)
+            self.assertEqual(graph.width, nested_graph.width)
+
+        self.assertGreater(graph.offset, 0)
+        self.assertListEqual([path for path in full_paths if path[0][0] >= graph.path_to_time([graph.offset])[0]],
+                             graph.best_paths())
+
     def test_eq(self):
         anna = AgentVariable("Anna")
         bob = AgentVariable("Bob")
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import copy
+import threading
+import timeit
+from datetime import timedelta
+
+from .data import WindowCache
+from .node import LayerCache
+
+
+class SearchProgress:
+    """
+    Progress of a search of behavior over selections of agents (see BehaviorTemplate.search_iter).
+    """
+
+    total: int
+    """Number of all selections of agents, i.e., of combinations (or permutations) of agents for variables"""
+    candidates: int | None
+    """Number of selections to be considered, i.e., of agents present together (see BehaviorTemplate.agent_selections),
+    None until known (all selections are enumerated upfront only if prioritized)"""
+    considered: int
+    """Number of selections considered so far, selections of agents never present together are not considered"""
+    non_viable: int
+    """Number of considered selections which were not viable (see BehaviorTemplate.check_viability)"""
+    skipped_by_bound: int
+    """Number of considered selections skipped as they could not exceed lower bound of matches"""
+    evaluated: int
+    """Number of considered selections whose time graph was computed"""
+    matched: int
+    """Number of evaluated selections which yielded a match"""
+    is_complete: bool
+    """Whether all selections were considered, i.e., the search was not stopped early"""
+
+    processed_time: timedelta
+    """Total time spanned by evaluated selections"""
+    cutoff_time: timedelta
+    """Total time of evaluated selections cut off by viability checks"""
+    elapsed: float
+    """Seconds elapsed since the search started"""
+
+    layer_cache: LayerCache | None
+    window_cache: WindowCache | None
+
+    def __init__(self, total: int, layer_cache: LayerCache | None = None, window_cache: WindowCache | None = None):
+        self.total = total
+        self.candidates = None
+        self.considered = 0
+        self.non_viable = 0
+        self.skipped_by_bound = 0
+        self.evaluated = 0
+        self.matched = 0
+        self.is_complete = False
+        self.processed_time = timedelta(0)
+        self.cutoff_time = timedelta(0)
+        self.elapsed = 0.0
+        self.layer_cache = layer_cache
+        self.window_cache = window_cache
+
+    @property
+    def percent(self) -> int:
+        """
+        Whole percents of considered selections.
+        """
+        return (self.considered * 100) // self.total if self.considered > 0 else 0
+
+    @property
+    def coverage(self) -> float | None:
+        """
+        Fraction of selections to be considered which were considered so far (i.e., were evaluated or found to be
+        non-viable or skipped by bound), None until number of selections to be considered is known.
+        """
+        if self.candidates is None:
+            return None
+        return self.considered / self.candidates if self.candidates > 0 else 1.0
+
+    @property
+    def estimated_runtime(self) -> float:
+        """
+        Estimated total runtime of the search in seconds, assuming remaining selections take as long as considered
+        ones did.
+        """
+        if self.considered == 0:
+            return float('inf')
+        return self.elapsed / (self.considered / self.total)
+
+    def copy(self) -> SearchProgress:
+        """
+        Copy of the current progress, sharing caches.
+        """
+        return copy.copy(self)
+
+    def __repr__(self):
+        return (f"SearchProgress({self.considered}/{self.total} considered, {self.evaluated} evaluated, "
+                f"{self.matched} matched, {self.elapsed:.1f}s)")
+
+
+class CancellationToken:
+    """
+    Token by which a running search is cancelled, e.g., from another thread than the one iterating over its matches,
+    or once a timeout elapses.
+    """
+
+    def __init__(self, timeout: timedelta | None = None):
+        """
+        :param timeout: If set, token is cancelled once timeout elapses since its creation.
+        """
+        self.__event = threading.Event()
+        self.__deadline = timeit.default_timer() + timeout.total_seconds() if timeout is not None else None
+
+    def cancel(self):
+        self.__event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        if self.__deadline is not None and timeit.default_timer() > self.__deadline:
+            self.__event.set()
+        return self.__event.is_set()
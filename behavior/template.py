@@ -1,12 +1,20 @@
 import itertools
 import math
+import multiprocessing
 import timeit
+from concurrent.futures import ProcessPoolExecutor, wait
 from datetime import timedelta, datetime
+from multiprocessing.synchronize import Event
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
 
 from .configuration import Configuration
-from .data import (BehaviorVariable, Direction, Speed, Agent, AgentTuple, Confidence,
-                   ConfidenceComparer, Block, SingleBlock, TimeFrame, cut_to_windows)
-from .node import SequentialNode, BehaviorNode, optimize_node
+from .data import (BehaviorVariable, Agent, AgentTuple, BlockDataset, Confidence, ConfidenceComparer, Block,
+                   TimeFrame, PresenceIndex, RelationIndex, WindowCache, WindowTable, cut_to_windows, to_micros)
+from .node import (SequentialNode, BehaviorNode, StateNode, MutualStateNode, ActorTargetStateNode, LayerCache,
+                   optimize_node)
+from .search import SearchProgress, CancellationToken
 from .time_graph import ContractedTimetableEntry
 
 
@@ -49,12 +57,30 @@ class BehaviorTemplate:
     def search(self,
                agents: dict[int, Agent],
                agent_tuples: dict[(int, int), AgentTuple],
-               max_results: int = 100) -> list[tuple[tuple[int, ...], list[datetime], Confidence]]:
+               max_results: int = 100,
+               workers: int | None = None,
+               branch_and_bound: bool = False,
+               time_budget: timedelta | None = None,
+               progress: Callable[[SearchProgress], None] | None = None) \
+            -> list[tuple[tuple[int, ...], list[datetime], Confidence]]:
         """
-        Complete search of encoded behavior on a set of provided agents and their agent tuples.
+        Complete search of encoded behavior on a set of provided agents and their agent tuples. Matches found by
+        search_iter are merged into the best max_results of them, while progress is printed.
         :param agents: Dictionary of all Agents to search through
         :param agent_tuples: Dictionary of all AgentTuples to search through
         :param max_results: Maximum number of final results.
+        :param workers: Number of worker processes agent selections are evaluated in, partitioned by their first agent.
+        Results are merged in the order of a serial search and are thus identical to it. None or 1 searches serially.
+        :param branch_and_bound: If set, once max_results matches are held, selections whose time graph cannot yield
+        a match exceeding the worst of them (see TimeGraph.upper_bound) are skipped before computing it. Results are
+        identical to those of a complete search. Only applies to serial search, as workers evaluate selections ahead
+        of merging their results.
+        :param time_budget: If set, search stops once it runs for longer than time_budget (checked as cancellation
+        of search_iter is) and returns the best matches found so far. Selections are evaluated from the most promising
+        ones (see prioritized_selections), serial search only. Order of equally ranked matches may thus differ from
+        that of a complete search.
+        :param progress: Callback receiving progress of the search (see search_iter), e.g., to find out coverage of
+        selections by a time-bounded search.
         :return: List of potential matches in form of tuples:
         - tuple of agent IDs in order they were mapped to variables
         - list of timestamps where each chronologically successive sub-behavior started
@@ -67,112 +93,520 @@ class BehaviorTemplate:
         best_found_paths: list[tuple[tuple[int, ...], list[datetime], Confidence]] = []
 
         # region Progress info
-        start_time = timeit.default_timer()
         perm_percent = 0
-        eval_counter = 0
-        skip_viability_counter = 0
-        processed_time_counter = timedelta(0)
-        cutoff_time_counter = timedelta(0)
-        perm_counter = 0
+        last_progress: SearchProgress | None = None
         # endregion
 
-        if self.root.is_symmetrical(set(self.variables)):
-            agent_selections = itertools.combinations(agents.values(), len(self.variables))
-            perm_count = math.comb(len(agents.values()), len(self.variables))
-            # print("Template is symmetrical.")
-        else:
-            agent_selections = itertools.permutations(agents.values(), len(self.variables))
-            perm_count = math.perm(len(agents.values()), len(self.variables))
-            # print("Template is not symmetrical.")
+        external_progress = progress
+        cancellation = CancellationToken(time_budget)
 
-        for agent_selection in agent_selections:
+        def on_progress(progress: SearchProgress):
+            nonlocal perm_percent, last_progress, best_found_paths
 
             # region Progress info
-            perm_counter += 1
-            new_perm_percent = (perm_counter * 100) // perm_count
+            new_perm_percent = progress.percent
             if new_perm_percent > perm_percent:
                 perm_percent = new_perm_percent
-
-                temp_time = timeit.default_timer()
-                exact_percent = perm_counter / perm_count
-                eta = (temp_time - start_time) / exact_percent
-                print(f"{new_perm_percent}% est. runtime {temp_time - start_time:.1f}/{eta:.1f} seconds")
+                print(f"{new_perm_percent}% est. runtime "
+                      f"{progress.elapsed:.1f}/{progress.estimated_runtime:.1f} seconds")
                 print(f"    best running result: {best_found_paths[0][-1] if len(best_found_paths) > 0 else "None"}")
             # endregion
 
-            agent_selection_ids = [agent.agent_id for agent in agent_selection]
+            if last_progress is not None and progress.evaluated > last_progress.evaluated \
+                    and progress.matched == last_progress.matched:
+                # Results are re-sorted with every evaluated selection, even one with no match
+                best_found_paths = list(sorted(best_found_paths,
+                                               key=confidence_comparer_as_key_selector,
+                                               reverse=True))[:max_results]
+            last_progress = progress.copy()
+
+            if external_progress is not None:
+                external_progress(progress)
+
+        def lower_bound() -> Confidence | None:
+            # Bound is taken from results merged so far, i.e., rises as selections are evaluated
+            return BehaviorTemplate.__search_lower_bound(best_found_paths, max_results)
+
+        for match in self.search_iter(agents, agent_tuples, workers, on_progress, cancellation,
+                                      lower_bound=lower_bound if branch_and_bound else None, max_results=max_results,
+                                      prioritized=time_budget is not None, verbose=True):
+            best_found_paths = list(sorted(best_found_paths + [match],
+                                           key=confidence_comparer_as_key_selector,
+                                           reverse=True))[:max_results]
 
-            agent_tuple_selection = [agent_tuples[actor.agent_id, target.agent_id]
-                                     for actor, target
-                                     in itertools.permutations(agent_selection, 2)
-                                     if (actor.agent_id, target.agent_id) in agent_tuples]
+        progress = last_progress
+        print()
+        print("Total considered agent variations:", progress.considered)
+        if progress.is_complete:
+            # Selections of a stopped search may not have been enumerated
+            print("Total agent variations never present together:", progress.total - progress.considered)
+        print("Total non-viable agent variations:", progress.non_viable)
+        if branch_and_bound:
+            print("Total agent variations skipped by confidence bound:", progress.skipped_by_bound)
+        print("Total evaluated agent variations: ", progress.evaluated)
+        if time_budget is not None:
+            if not progress.is_complete:
+                print(f"Search stopped after time budget of {time_budget}")
+            if progress.coverage is not None:
+                print(f"Coverage of agent variations: {progress.considered}/{progress.candidates} "
+                      f"({progress.coverage:.1%})")
+        print()
+        print("Total processed time saved via viability checks: ", progress.cutoff_time, "/", progress.processed_time,
+              "s")
+        layer_cache, window_cache = progress.layer_cache, progress.window_cache
+        if layer_cache.hits + layer_cache.misses > 0:
+            print(f"Layer cache hits/misses: {layer_cache.hits}/{layer_cache.misses}, "
+                  f"{layer_cache.evictions} evicted, {layer_cache.memory / 2 ** 20:.1f} MiB held")
+        if window_cache.hits + window_cache.misses > 0:
+            print(f"Window cache hits/misses: {window_cache.hits}/{window_cache.misses}")
 
-            is_viable, viability_start_time, viability_stop_time = self.check_viability(list(agent_selection))
-            if not is_viable:
-                skip_viability_counter += 1
-                continue
+        return [fp for fp in best_found_paths if fp[-1].denom != float('inf')]
 
-            eval_counter += 1
-            selection_start = min([agent.blocks[0].start_time for agent in agent_selection if len(agent.blocks) > 0])
-            selection_end = max([agent.blocks[-1].end_time for agent in agent_selection if len(agent.blocks) > 0])
-            processed_time_counter += selection_end - selection_start
-            cutoff_time_counter += selection_end - viability_stop_time
-            cutoff_time_counter += viability_start_time - selection_start
+    def search_iter(self,
+                    agents: dict[int, Agent],
+                    agent_tuples: dict[(int, int), AgentTuple],
+                    workers: int | None = None,
+                    progress: Callable[[SearchProgress], None] | None = None,
+                    cancellation: CancellationToken | None = None,
+                    lower_bound: Callable[[], Confidence | None] | None = None,
+                    prioritized: bool = False,
+                    max_results: int | None = None,
+                    verbose: bool = False) -> Iterator[tuple[tuple[int, ...], list[datetime], Confidence]]:
+        """
+        Search encoded behavior on a set of provided agents and their agent tuples, yielding the best match of each
+        selection of agents as soon as it is found. Search stops early once cancelled, or once the caller stops
+        iterating (e.g., by closing the generator), in which case no further selections are evaluated.
+        :param agents: Dictionary of all Agents to search through
+        :param agent_tuples: Dictionary of all AgentTuples to search through
+        :param workers: Number of worker processes agent selections are evaluated in (see search).
+        :param progress: Callback receiving progress of the search once it starts, after each considered selection
+        of agents (before its match is yielded) and once all selections are considered. Progress is updated in place,
+        use SearchProgress.copy to retain it.
+        :param cancellation: Token by which the search is cancelled, checked before each selection of agents and while
+        selections are prioritized. Parallel search checks it while waiting for workers as well, their running
+        partitions then stop after the selection being evaluated, so that the search overruns cancellation by at most
+        evaluation of a single selection.
+        :param lower_bound: Callback returning a confidence (or None) matches must exceed, queried before each
+        selection of agents. Selections which cannot yield such a match are skipped (see process_windows). Only
+        applies to serial search.
+        :param prioritized: If set, selections are evaluated from the most promising ones (see prioritized_selections)
+        instead of in the order of their enumeration. Only applies to serial search.
+        :param max_results: If set, only matches which may be among the best max_results of all matches (merged as by
+        search) are yielded. Workers of parallel search then drop matches not among the best max_results of their
+        partition, selections of dropped matches are counted as evaluated with no match. Only applies to comparers
+        with a scalar key (see ConfidenceComparer.get_scalar_key), all matches are yielded otherwise.
+        :param verbose: Whether candidates of variables are printed before searching.
+        :return: Generator of matches in the order of selections of agents, in form of tuples (see search). Matches
+        of impossible confidence (i.e., of infinite denominator) are yielded as well.
+        """
+        start_time = timeit.default_timer()
+
+        agent_list = list(agents.values())
+        if self.root.is_symmetrical(set(self.variables)):
+            perm_count = math.comb(len(agent_list), len(self.variables))
+        else:
+            perm_count = math.perm(len(agent_list), len(self.variables))
+
+        variable_candidates = self.variable_candidates(agent_list)
+        pair_candidates = self.pair_candidates(agent_list, agent_tuples)
+        if verbose:
+            for variable, candidates in zip(self.variables, variable_candidates):
+                print(f"Candidates for {variable}: {candidates.sum()}/{len(agent_list)} agents")
+            for (first, second), candidates in pair_candidates.items():
+                print(f"Candidates for ({self.variables[first]}, {self.variables[second]}): "
+                      f"{candidates.sum()}/{len(agent_list) ** 2} agent pairs")
+
+        layer_cache = LayerCache()
+        window_cache = WindowCache(Configuration.window_cache_size)
+        search_progress = SearchProgress(perm_count, layer_cache, window_cache)
+        if progress is not None:
+            progress(search_progress)
+
+        if workers is None or workers <= 1:
+            if prioritized:
+                selection_idxs = self.prioritized_selections(agent_list, variable_candidates, pair_candidates,
+                                                             cancellation)
+                search_progress.candidates = len(selection_idxs)
+                agent_selections = (tuple(agent_list[idx] for idx in selection.tolist())
+                                    for selection in selection_idxs)
+            else:
+                agent_selections = self.agent_selections(agent_list, None, variable_candidates, pair_candidates)
+
+            def search_serial():
+                for agent_selection in agent_selections:
+                    if cancellation is not None and cancellation.is_cancelled:
+                        return
+                    yield agent_selection, self.search_selection(agent_selection, agent_tuples, layer_cache,
+                                                                 window_cache,
+                                                                 lower_bound() if lower_bound is not None else None)
+
+            selection_results = search_serial()
+        else:
+            selection_results = self.__search_parallel(agent_list, agent_tuples, variable_candidates, pair_candidates,
+                                                       workers, cancellation, max_results)
+
+        for agent_selection, selection_result in selection_results:
+            if cancellation is not None and cancellation.is_cancelled:
+                return
+
+            matches = []
+            search_progress.considered += 1
+            if selection_result is None:
+                search_progress.non_viable += 1
+            elif selection_result[0] is None:
+                # Selection could not yield a match exceeding lower_bound
+                search_progress.skipped_by_bound += 1
+            else:
+                best_paths, processed_time, cutoff_time = selection_result
+                search_progress.evaluated += 1
+                search_progress.processed_time += processed_time
+                search_progress.cutoff_time += cutoff_time
+
+                agent_selection_ids = [agent.agent_id for agent in agent_selection]
+                matches = [(agent_selection_ids, timestamp_path, conf) for timestamp_path, conf in best_paths]
+                search_progress.matched += len(matches) > 0
+
+            search_progress.elapsed = timeit.default_timer() - start_time
+            if progress is not None:
+                progress(search_progress)
+            yield from matches
+
+        if cancellation is not None and cancellation.is_cancelled:
+            return
+        search_progress.candidates = search_progress.considered
+        search_progress.is_complete = True
+        if progress is not None:
+            progress(search_progress)
 
-            best_paths = self.process([agent.during_time(TimeFrame(viability_start_time, viability_stop_time))
-                                       for agent in agent_selection],
-                                      [agent_tuple.during_time(TimeFrame(viability_start_time, viability_stop_time))
-                                       for agent_tuple in agent_tuple_selection])
+    @staticmethod
+    def __search_lower_bound(best_found_paths: list[tuple[tuple[int, ...], list[datetime], Confidence]],
+                             max_results: int) -> Confidence | None:
+        """
+        Find confidence a match must exceed (by Configuration.comparer) to change results held by search, i.e., the
+        confidence of the worst of them once max_results are held. Results are re-sorted with every merged selection,
+        with a match not exceeding the worst one being sorted last and dropped, while others keep their order.
+        For comparers with no scalar key (see ConfidenceComparer.get_scalar_key), comparisons are not transitive and
+        re-sorting only keeps the order if each result is not less than the next one, no bound is given otherwise.
+        :return: Confidence of the worst held result, or None if any match may change results.
+        """
+        if not best_found_paths or len(best_found_paths) < max_results:
+            return None
+
+        comparer = Configuration.comparer
+        if comparer.get_scalar_key() is None and any(comparer.compare_int(first[-1], second[-1]) < 0
+                                                     for first, second in itertools.pairwise(best_found_paths)):
+            return None
+        return best_found_paths[-1][-1]
+
+    def agent_selections(self, agents: list[Agent], first_agent_idx: int | None = None,
+                         variable_candidates: list[np.ndarray] | None = None,
+                         pair_candidates: dict[tuple[int, int], np.ndarray] | None = None,
+                         presence_index: PresenceIndex | None = None) \
+            -> Iterator[tuple[Agent, ...]]:
+        """
+        Enumerate selections of agents to be mapped to template's variables. Combinations are enumerated if template
+        is symmetrical, permutations otherwise. Selections whose agents are not present together as required by
+        variable sequence are skipped, as they can never be viable (see check_viability).
+        :param agents: List of all agents.
+        :param first_agent_idx: If set, only selections starting with agent at this index are enumerated. Partitions
+        of all first agents, in order, enumerate all selections in the same order.
+        :param variable_candidates: Agents which may be mapped to each variable (see variable_candidates). Computed if
+        not provided.
+        :param pair_candidates: Agent pairs which may be mapped to pairs of variables (see pair_candidates). Pairs are
+        not restricted if not provided.
+        :param presence_index: Index of presence of agents (see PresenceIndex), e.g., shared by partitions of
+        selections. Built if not provided.
+        """
+        if presence_index is None:
+            presence_index = PresenceIndex(agents)
 
-            best_found_paths += [(agent_selection_ids, timestamp_path, conf)
-                                 for timestamp_path, conf
-                                 in best_paths]
+        selections = self.__join_selections(agents, presence_index, first_agent_idx, variable_candidates,
+                                            pair_candidates)
+        return (tuple(agents[idx] for idx in selection) for selection in selections)
 
-            best_found_paths = list(sorted(best_found_paths,
-                                           key=confidence_comparer_as_key_selector,
-                                           reverse=True))[:max_results]
+    def prioritized_selections(self, agents: list[Agent], variable_candidates: list[np.ndarray] | None = None,
+                               pair_candidates: dict[tuple[int, int], np.ndarray] | None = None,
+                               cancellation: CancellationToken | None = None,
+                               chunk_size: int = 4096) -> np.ndarray:
+        """
+        Enumerate selections of agents as agent_selections does, ordered from the most promising ones. Promise of
+        a selection is the total duration agents of each group of variables of variable sequence are present together,
+        weighted by the mean coverage of agents by state nodes required by their variables (see variable_coverages).
+        Selections of equal promise are kept in the order of agent_selections. Selections are scored in chunks as they
+        are enumerated and held as indexes of agents, so that no objects are held per selection.
+        :param agents: List of all agents.
+        :param variable_candidates: Agents which may be mapped to each variable (see agent_selections).
+        :param pair_candidates: Agent pairs which may be mapped to pairs of variables (see agent_selections).
+        :param cancellation: Token checked while selections are enumerated and scored, once per chunk. Once cancelled,
+        selections enumerated so far are returned in the order of agent_selections.
+        :param chunk_size: Number of selections enumerated and scored at once.
+        :return: Array of shape (selections, variables) of indexes of agents of each selection.
+        """
+        presence_index = PresenceIndex(agents)
+        selections = self.__join_selections(agents, presence_index, None, variable_candidates, pair_candidates)
+        group_positions = [[self.variables.index(var) for var in variables] for variables in self.variable_sequence]
+        coverages = None
 
-        print()
-        print("Total considered agent variations:", perm_counter)
-        print("Total non-viable agent variations:", skip_viability_counter)
-        print("Total evaluated agent variations: ", eval_counter)
-        print()
-        print("Total processed time saved via viability checks: ", cutoff_time_counter, "/", processed_time_counter, "s")
+        chunks, promises = [], []
+        is_cancelled = False
+        while True:
+            if cancellation is not None and cancellation.is_cancelled:
+                is_cancelled = True
+                break
+            chunk = np.array(list(itertools.islice(selections, chunk_size)), dtype=np.int32)
+            if len(chunk) == 0:
+                break
+
+            if coverages is None:
+                coverages = self.variable_coverages(agents)
+            chunk_promises = np.zeros(len(chunk), dtype=np.float64)
+            for positions in group_positions:
+                if not positions:
+                    continue
+                group_idxs = chunk[:, positions]
+                co_presence = (presence_index.ends[group_idxs].min(axis=1) -
+                               presence_index.starts[group_idxs].max(axis=1))
+                chunk_promises += np.maximum(co_presence, 0)
+            chunk_promises *= coverages[np.arange(len(self.variables)), chunk].mean(axis=1)
+
+            chunks.append(chunk)
+            promises.append(chunk_promises)
+
+        if not chunks:
+            return np.empty((0, len(self.variables)), dtype=np.int32)
+        selection_idxs = np.concatenate(chunks)
+        if is_cancelled:
+            return selection_idxs
+        return selection_idxs[np.argsort(-np.concatenate(promises), kind='stable')]
+
+    def __join_selections(self, agents: list[Agent], presence_index: PresenceIndex, first_agent_idx: int | None,
+                          variable_candidates: list[np.ndarray] | None,
+                          pair_candidates: dict[tuple[int, int], np.ndarray] | None) -> Iterator[tuple[int, ...]]:
+        """
+        Enumerate selections of agents (see agent_selections) as tuples of indexes of agents.
+        """
+        if variable_candidates is None:
+            variable_candidates = self.variable_candidates(agents)
 
-        return [fp for fp in best_found_paths if fp[-1].denom != float('inf')]
+        variable_groups = [[self.variables.index(var) for var in variables] for variables in self.variable_sequence]
+        return presence_index.join(variable_groups, list(self.time_req_sequence),
+                                   self.root.is_symmetrical(set(self.variables)), first_agent_idx,
+                                   variable_candidates, pair_candidates)
 
-    def check_viability(self, agents: list[Agent]) -> tuple[True, datetime, datetime] | tuple[False, None, None]:
+    @staticmethod
+    def min_step_conformity() -> float:
+        """
+        Least conformity of a sequential step accepted by the time graph, which compares steps to minimal confidence
+        by ConformityBased comparer (see ConfidenceComparer.min_accepted_conformity).
+        """
+        return ConfidenceComparer.ConformityBased().min_accepted_conformity(Confidence(Configuration.min_confidence,
+                                                                                        1.0))
+
+    def variable_coverages(self, agents: list[Agent]) -> np.ndarray:
+        """
+        Find how much of their lifetime agents conform to single-variable state nodes required by each of template's
+        variables (see StateNode.coverage), as the least coverage by any of the nodes.
+        :param agents: List of all agents.
+        :return: Array of coverages of shape (variables, agents), in the order variables are defined. Coverage is 1 for
+        variables which require no such nodes.
+        """
+        coverages = np.ones((len(self.variables), len(agents)), dtype=np.float64)
+        for child in self.root.children:
+            for node, _, _ in child.get_state_requirements(self.min_step_conformity(), timedelta(0)):
+                if isinstance(node, StateNode):
+                    variable = self.variables.index(node.variables[0])
+                    coverages[variable] = np.minimum(coverages[variable], [node.coverage(agent) for agent in agents])
+        return coverages
+
+    def variable_candidates(self, agents: list[Agent]) -> list[np.ndarray]:
+        """
+        Find agents which may be mapped to each of template's variables, i.e., those for which all single-variable
+        state nodes required by the template (see BehaviorNode.get_state_requirements) may hold. Each sequential step
+        must be accepted by minimal confidence of the time graph (see min_step_conformity).
+        :param agents: List of all agents.
+        :return: Boolean mask of agents for each variable, in the order variables are defined.
+        """
+        variable_candidates = [np.ones(len(agents), dtype=bool) for _ in self.variables]
+        for child in self.root.children:
+            for node, min_conformity, min_duration in child.get_state_requirements(self.min_step_conformity(),
+                                                                                  timedelta(0)):
+                if isinstance(node, StateNode):
+                    candidates = variable_candidates[self.variables.index(node.variables[0])]
+                    candidates &= [node.may_hold(agent, min_conformity, min_duration) for agent in agents]
+        return variable_candidates
+
+    def pair_candidates(self, agents: list[Agent], agent_tuples: dict[(int, int), AgentTuple]) \
+            -> dict[tuple[int, int], np.ndarray]:
+        """
+        Find agent pairs which may be mapped to pairs of template's variables, i.e., those for which all two-variable
+        mutual and actor-target state nodes required by the template (see BehaviorNode.get_state_requirements) may
+        hold, as given by an index of their tuple features (see RelationIndex).
+        :param agents: List of all agents.
+        :param agent_tuples: Dictionary of all AgentTuples.
+        :return: Dictionary of boolean matrices of agent pairs, by positions of variables (in the order variables are
+        defined, first lower than second). Element [i, j] tells whether i-th agent may be mapped to the first variable
+        and j-th agent to the second one. Only restricted pairs of variables are present.
+        """
+        agent_idxs = {agent.agent_id: idx for idx, agent in enumerate(agents)}
+        relation_index = None
+        pair_candidates = {}
+        for child in self.root.children:
+            for node, min_conformity, min_duration in child.get_state_requirements(self.min_step_conformity(),
+                                                                                  timedelta(0)):
+                if not isinstance(node, (MutualStateNode, ActorTargetStateNode)):
+                    continue
+                if relation_index is None:
+                    relation_index = RelationIndex(agent_tuples)
+
+                def may_hold(first_id: int | None, second_id: int | None) -> bool:
+                    return node.may_hold(relation_index, first_id, second_id, min_conformity, min_duration)
+
+                # Pairs with no agent tuple (in neither order) are indexed as having no tuple blocks
+                candidates = np.full((len(agents), len(agents)), may_hold(None, None), dtype=bool)
+                for actor_id, target_id in agent_tuples.keys():
+                    if actor_id in agent_idxs and target_id in agent_idxs:
+                        actor_idx, target_idx = agent_idxs[actor_id], agent_idxs[target_id]
+                        candidates[actor_idx, target_idx] = may_hold(actor_id, target_id)
+                        candidates[target_idx, actor_idx] = may_hold(target_id, actor_id)
+
+                first, second = [self.variables.index(variable) for variable in node.variables]
+                if first > second:
+                    first, second, candidates = second, first, candidates.T
+                if (first, second) in pair_candidates:
+                    pair_candidates[first, second] &= candidates
+                else:
+                    pair_candidates[first, second] = candidates
+        return pair_candidates
+
+    def search_selection(self, agent_selection: tuple[Agent, ...], agent_tuples: dict[(int, int), AgentTuple],
+                         layer_cache: LayerCache | None = None, window_cache: WindowCache | None = None,
+                         lower_bound: Confidence | None = None) \
+            -> tuple[list[ContractedTimetableEntry] | None, timedelta, timedelta] | None:
+        """
+        Search behavior on a single selection of agents, mapped to template's variables in the order they are defined.
+        :param agent_selection: Selected agents.
+        :param agent_tuples: Dictionary of all AgentTuples.
+        :param layer_cache: Cache of elementary layers shared by selections of the same agents (see LayerCache).
+        :param window_cache: Cache of windows shared by selections of the same set of agents (see WindowCache).
+        :param lower_bound: If set, selection is skipped if no found path can exceed it (see process_windows).
+        :return: None if selection is not viable, otherwise tuple of:
+        - found path with the best possible confidence (see process), None if selection was skipped by lower_bound
+        - processed time
+        - time cut off by viability checks
+        """
+        agent_tuple_selection = [agent_tuples[actor.agent_id, target.agent_id]
+                                 for actor, target
+                                 in itertools.permutations(agent_selection, 2)
+                                 if (actor.agent_id, target.agent_id) in agent_tuples]
+
+        is_viable, viability_start_time, viability_stop_time = self.check_viability(list(agent_selection),
+                                                                                    window_cache)
+        if not is_viable:
+            return None
+
+        selection_start = min([agent.blocks[0].start_time for agent in agent_selection if len(agent.blocks) > 0])
+        selection_end = max([agent.blocks[-1].end_time for agent in agent_selection if len(agent.blocks) > 0])
+        processed_time = selection_end - selection_start
+        cutoff_time = (selection_end - viability_stop_time) + (viability_start_time - selection_start)
+
+        if layer_cache is not None:
+            layer_cache.bind(list(agent_selection), agent_tuple_selection)
+        viability_time_frame = TimeFrame(viability_start_time, viability_stop_time)
+        if window_cache is not None:
+            best_paths = self.process_windows(window_cache.windows(list(agent_selection), agent_tuples,
+                                                                   viability_time_frame),
+                                              layer_cache, lower_bound)
+        else:
+            best_paths = self.process([agent.during_time(viability_time_frame) for agent in agent_selection],
+                                      [agent_tuple.during_time(viability_time_frame)
+                                       for agent_tuple in agent_tuple_selection],
+                                      layer_cache, lower_bound)
+
+        return best_paths, processed_time, cutoff_time
+
+    def __search_parallel(self, agents: list[Agent], agent_tuples: dict[(int, int), AgentTuple],
+                          variable_candidates: list[np.ndarray], pair_candidates: dict[tuple[int, int], np.ndarray],
+                          workers: int, cancellation: CancellationToken | None = None,
+                          max_results: int | None = None) \
+            -> Iterator[tuple[tuple[Agent, ...], tuple[list[ContractedTimetableEntry], timedelta, timedelta] | None]]:
+        """
+        Evaluate agent selections in a pool of worker processes, one task per first agent of selections.
+        :param cancellation: Token checked while waiting for results of workers (see search_iter).
+        :param max_results: Number of best matches each worker keeps of its partition (see search_iter).
+        :return: Generator of evaluated selections (see search_selection), in the order of serial search.
+        """
+        configuration = {key: value for key, value in vars(Configuration).items() if not key.startswith('_')}
+        agents_by_id = {agent.agent_id: agent for agent in agents}
+        if Configuration.comparer.get_scalar_key() is None:
+            # Best matches of partitions are not the best of all matches if comparisons are not transitive
+            max_results = None
+
+        # Workers attach to data in shared memory, instead of unpickling all agents and their blocks
+        dataset = BlockDataset.from_agents(agents_by_id, agent_tuples).share()
+        stop_event = multiprocessing.Event()
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_search_worker,
+                                       initargs=(self, dataset, variable_candidates, pair_candidates, configuration,
+                                                 stop_event))
+        try:
+            futures = [executor.submit(_search_partition, first_agent_idx, max_results)
+                       for first_agent_idx in range(len(agents))]
+            for future in futures:
+                # Cancellation is polled, as results of a partition may take arbitrarily long
+                while not future.done():
+                    if cancellation is not None and cancellation.is_cancelled:
+                        return
+                    wait([future], timeout=0.1)
+                for selection_ids, selection_result in future.result():
+                    yield tuple(agents_by_id[agent_id] for agent_id in selection_ids), selection_result
+        finally:
+            # Partitions not started yet are not evaluated if search stops early, running ones stop after the selection
+            # being evaluated
+            stop_event.set()
+            executor.shutdown(cancel_futures=True)
+            dataset.close()
+
+    def check_viability(self, agents: list[Agent], window_cache: WindowCache | None = None) \
+            -> tuple[True, datetime, datetime] | tuple[False, None, None]:
         """
         Check whether provided set of agents is viable, by checking whether agents have sufficient presence
         with regards to their required presence as defined by the behavioral pattern structure.
         :param agents: Set of agents mapped to template's behavioral variables.
+        :param window_cache: Cache of windows of lifetimes of agents shared by all orders of the same agents.
         :return: True if tuple of agents is viable and should be processed.
         False if tuple can be safely discarded.
         """
 
+        # Times are compared in microseconds
+        time_req_sequence = [to_micros(time_req) for time_req in self.time_req_sequence]
+
         current_sequential_idx = 0
         current_variables = self.variable_sequence[current_sequential_idx]
         current_variable_indexes = [self.variables.index(var) for var in current_variables]
-        sequential_time_left = self.time_req_sequence[current_sequential_idx]
+        sequential_time_left = time_req_sequence[current_sequential_idx]
 
-        windows = list(
-            Block.granulate(
-                *[[SingleBlock(agent.blocks[0].start_time, agent.blocks[-1].end_time,
-                               Speed.STAND, Direction.NOT_MOVING)] for agent in agents],
+        if window_cache is not None:
+            lifetime_windows = window_cache.lifetime_windows(agents)
+        else:
+            lifetime_windows = Block.granulate_indexes(
+                *[[Block(agent.blocks[0].start_time, agent.blocks[-1].end_time)] for agent in agents],
                 strip_incomplete=False, max_window_size=timedelta.max)
-        )
+        if len(lifetime_windows) == 0:
+            return False, None, None
+        # Whether each agent is present in each window
+        windows = (lifetime_windows.block_idxs >= 0).tolist()
+        window_durations = lifetime_windows.durations.tolist()
 
         current_window_idx = 0
-        current_window, (current_window_start, current_window_end) = windows[current_window_idx]
-        window_time_left = current_window_end - current_window_start
+        current_window = windows[current_window_idx]
+        window_time_left = window_durations[current_window_idx]
 
         is_viable = None
         while True:
             # Window must contain all current variables
-            if any(current_window[i] is None for i in current_variable_indexes):
+            if not all(current_window[i] for i in current_variable_indexes):
                 # print(f"Seq {current_sequential_idx} does not fit win {current_window_idx} ({[self.variables[i].name if block is not None else "-" for i, block in enumerate(current_window)]})")
                 # reset sequence
-                sequential_time_left = self.time_req_sequence[current_sequential_idx]
+                sequential_time_left = time_req_sequence[current_sequential_idx]
 
                 # go to next window
                 current_window_idx += 1
@@ -181,8 +615,8 @@ class BehaviorTemplate:
                     is_viable = False
                     break
 
-                current_window, (current_window_start, current_window_end) = windows[current_window_idx]
-                window_time_left = current_window_end - current_window_start
+                current_window = windows[current_window_idx]
+                window_time_left = window_durations[current_window_idx]
 
                 continue
 
@@ -202,7 +636,7 @@ class BehaviorTemplate:
 
                 current_variables = self.variable_sequence[current_sequential_idx]
                 current_variable_indexes = [self.variables.index(var) for var in current_variables]
-                sequential_time_left = self.time_req_sequence[current_sequential_idx]
+                sequential_time_left = time_req_sequence[current_sequential_idx]
 
             if shift_window:
                 sequential_time_left -= window_time_left
@@ -215,8 +649,8 @@ class BehaviorTemplate:
                     is_viable = False
                     break
 
-                current_window, (current_window_start, current_window_end) = windows[current_window_idx]
-                window_time_left = current_window_end - current_window_start
+                current_window = windows[current_window_idx]
+                window_time_left = window_durations[current_window_idx]
 
         if not is_viable:
             return False, None, None
@@ -227,43 +661,152 @@ class BehaviorTemplate:
             first_var_seq = self.variable_sequence[0]
             first_var_seq_idxs = [self.variables.index(var) for var in first_var_seq]
             first_potential_time = None
-            for blocks, time_frame in windows:
+            for window_idx, is_present in enumerate(windows):
                 is_window_viable_start = True
                 for idx in first_var_seq_idxs:
-                    if not blocks[idx]:
+                    if not is_present[idx]:
                         is_window_viable_start = False
 
                 if is_window_viable_start:
-                    first_potential_time = time_frame[0]
+                    first_potential_time, _ = lifetime_windows.time_frame(window_idx)
                     break
 
             # same for end
             last_var_seq = self.variable_sequence[-1]
             last_var_seq_idxs = [self.variables.index(var) for var in last_var_seq]
             last_potential_time = None
-            for blocks, time_frame in windows[::-1]:
+            for window_idx, is_present in reversed(list(enumerate(windows))):
                 is_window_viable_end = True
                 for idx in last_var_seq_idxs:
-                    if not blocks[idx]:
+                    if not is_present[idx]:
                         is_window_viable_end = False
 
                 if is_window_viable_end:
-                    last_potential_time = time_frame[1]
+                    _, last_potential_time = lifetime_windows.time_frame(window_idx)
                     break
 
             return True, first_potential_time, last_potential_time
 
-    def process(self, agents: list[Agent], agent_tuples: list[AgentTuple]) -> list[ContractedTimetableEntry]:
+    def process(self, agents: list[Agent], agent_tuples: list[AgentTuple], layer_cache: LayerCache | None = None,
+                lower_bound: Confidence | None = None) -> list[ContractedTimetableEntry] | None:
         """
         Process a specific tuple of agents and their agent tuples using internal behavioral tree.
         :param agents: Set of agents to be checked, mapped to template's variables in the order they are defined.
         :param agent_tuples: Set of agent tuples for agents.
-        :return: Found path with the best possible confidence.
+        :param layer_cache: Cache of elementary layers bound to the same agents (see LayerCache.bind), possibly before
+        they were cut to a time frame.
+        :param lower_bound: If set, processing is skipped if no path can exceed it (see process_windows).
+        :return: Found path with the best possible confidence, None if processing was skipped.
         """
         windows = cut_to_windows(agents, agent_tuples)
-        graph = self.root.compute_graph(self.variables, windows)
+        return self.process_windows(windows, layer_cache, lower_bound)
 
+    def process_windows(self, windows: WindowTable, layer_cache: LayerCache | None = None,
+                        lower_bound: Confidence | None = None) -> list[ContractedTimetableEntry] | None:
+        """
+        Process windows of a specific tuple of agents (see cut_to_windows) using internal behavioral tree.
+        :param windows: Windows with agents mapped to template's variables in the order they are defined.
+        :param layer_cache: Cache of elementary layers bound to the same agents (see LayerCache.bind).
+        :param lower_bound: If set, the time graph is not computed if upper bound of its paths (see
+        TimeGraph.upper_bound) is less than lower_bound by Configuration.comparer.
+        :return: Found path with the best possible confidence, None if processing was skipped.
+        """
+        graph = self.root.create_graph(self.variables, windows, layer_cache)
+        if lower_bound is not None:
+            upper_bound = graph.upper_bound()
+            # Tolerance covers rounding of sums, which the bound is computed differently from
+            tolerance = 1e-9
+            if upper_bound is not None and Configuration.comparer.compare(lower_bound, upper_bound) > tolerance:
+                return None
         return graph.best_paths(1)
 
+    @property
+    def retention(self) -> timedelta | None:
+        """
+        Maximal duration of a match as declared by the template's time requirements, None if it is unlimited.
+        """
+        time_requirement = self.root.get_time_requirement()
+        return time_requirement.maximal if time_requirement.has_max else None
+
+    def process_stream(self, windows_stream: Iterable[WindowTable], retention: timedelta | None = None) \
+            -> Iterator[list[ContractedTimetableEntry]]:
+        """
+        Process windows of a specific tuple of agents incrementally, as they are being appended (e.g., from footage
+        still being recorded). Only the appended windows are computed in each step.
+        :param windows_stream: Iterable of successive tables of windows (see cut_to_windows), with agents mapped to
+        template's variables in the order they are defined.
+        :param retention: Maximal duration of a match, windows older than that are discarded. Defaults to template's
+        retention, if it has any.
+        :return: Generator yielding path with the best possible confidence after each table of windows.
+        """
+        if retention is None:
+            retention = self.retention
+
+        is_first = True
+        for windows in windows_stream:
+            if not windows:
+                continue
+            if is_first:
+                graph = self.root.compute_graph(self.variables, windows, prune_dead_ends=False)
+                is_first = False
+            else:
+                graph = self.root.extend_graph(self.variables, windows, retention)
+            yield graph.best_paths(1)
+
     def __repr__(self):
         return f"BehaviorTemplate({repr(self.root)})"
+
+
+_search_worker_state: tuple[BehaviorTemplate, list[Agent], dict[(int, int), AgentTuple], list[np.ndarray],
+                            dict[tuple[int, int], np.ndarray], PresenceIndex, LayerCache, WindowCache, Event] \
+    | None = None
+"""Template and data searched by the current worker process, see BehaviorTemplate.search"""
+
+
+def _init_search_worker(template: BehaviorTemplate, dataset: BlockDataset, variable_candidates: list[np.ndarray],
+                        pair_candidates: dict[tuple[int, int], np.ndarray], configuration: dict,
+                        stop_event: Event):
+    global _search_worker_state
+
+    # Configuration of the searching process is not inherited by spawned processes
+    for key, value in configuration.items():
+        setattr(Configuration, key, value)
+
+    agents, agent_tuples = dataset.to_agents()
+    agents = list(agents.values())
+    _search_worker_state = (template, agents, agent_tuples, variable_candidates, pair_candidates,
+                            PresenceIndex(agents), LayerCache(), WindowCache(Configuration.window_cache_size),
+                            stop_event)
+
+
+def _search_partition(first_agent_idx: int, max_results: int | None = None) \
+        -> list[tuple[tuple[int, ...], tuple[list[ContractedTimetableEntry], timedelta, timedelta] | None]]:
+    """
+    Evaluate selections of agents starting with agent at first_agent_idx, keeping only matches among the best
+    max_results of the partition if set.
+    :return: List of IDs of agents of each selection with its result (see BehaviorTemplate.search_selection).
+    """
+    (template, agents, agent_tuples, variable_candidates, pair_candidates,
+     presence_index, layer_cache, window_cache, stop_event) = _search_worker_state
+    results = []
+    for agent_selection in template.agent_selections(agents, first_agent_idx, variable_candidates, pair_candidates,
+                                                     presence_index):
+        # Results of stopped searches are not merged
+        if stop_event.is_set():
+            break
+        results.append((tuple(agent.agent_id for agent in agent_selection),
+                        template.search_selection(agent_selection, agent_tuples, layer_cache, window_cache)))
+    if max_results is None:
+        return results
+
+    # Matches are ranked as search merges them, equally ranked ones in the order of selections
+    confidence_comparer_as_key_selector = Configuration.comparer.get_key_sorter(lambda match: match[1][-1])
+    matches = [(result_idx, path) for result_idx, (_, result) in enumerate(results)
+               if result is not None and result[0] is not None for path in result[0]]
+    best_matches = sorted(matches, key=confidence_comparer_as_key_selector, reverse=True)[:max_results]
+    kept = {id(path) for _, path in best_matches}
+    for result_idx in {result_idx for result_idx, _ in matches}:
+        selection_ids, (best_paths, processed_time, cutoff_time) = results[result_idx]
+        results[result_idx] = selection_ids, ([path for path in best_paths if id(path) in kept], processed_time,
+                                              cutoff_time)
+    return results
@@ -1,12 +1,15 @@
+import itertools
 import unittest
 from datetime import timedelta
 
-from ..data import (Speed, DistanceChange, MutualDirection, Direction, Distance, Confidence, RelativeTimeFrame,
-                    AgentVariable)
+from ..configuration import Configuration
+from ..data import (Speed, DistanceChange, MutualDirection, Direction, Distance, Confidence, ConfidenceComparer,
+                    RelativeTimeFrame, AgentVariable, cut_to_windows)
 from ..data.tests import reference_date
 from ..node import (SequentialNode, ConjunctionNode, StateNode, MutualStateNode, ActorTargetStateNode, DisjunctionNode,
-                    TimeRestrictingNode)
+                    TimeRestrictingNode, ConfidenceRestrictingNode)
 from ..node.tests import BlockBuilder
+from ..search import SearchProgress, CancellationToken
 from ..template import BehaviorTemplate
 
 
@@ -270,6 +273,369 @@ class BehaviorTemplateTest(unittest.TestCase):
         self.assertEqual(reference_date, time_path[0])
         self.assertEqual(reference_date + timedelta(seconds=50), time_path[-1])
 
+    def test_process_stream(self):
+        anna = AgentVariable("Anna")
+        bob = AgentVariable("Bob")
+
+        agents, agent_tuples = (
+            BlockBuilder([anna, bob])
+            .with_agent(anna, 40, Speed.STAND, Direction.NOT_MOVING)
+            .with_agent(bob, 10, Speed.STAND, Direction.NOT_MOVING)
+            .with_agents(anna, bob, 10, distance=Distance.ADJACENT)
+            .with_agents(bob, anna, 10, distance=Distance.ADJACENT)
+            .with_agent(bob, 10, Speed.WALK, Direction.STRAIGHT)
+            .with_agents(bob, anna, 10, intent_distance=DistanceChange.INCREASING)
+            .with_agent(bob, 10, Speed.STAND, Direction.NOT_MOVING)
+            .with_agents(bob, anna, 10, intent_distance=DistanceChange.CONSTANT)
+            .with_agent(bob, 10, Speed.WALK, Direction.STRAIGHT)
+            .with_agents(bob, anna, 10, intent_distance=DistanceChange.DECREASING)
+            .build()
+        )
+
+        template = BehaviorTemplate(
+            SequentialNode(
+                MutualStateNode([anna, bob], distance=Distance.ADJACENT),
+                SequentialNode(
+                    ActorTargetStateNode([bob, anna], intended_distance_change=DistanceChange.INCREASING),
+                    ActorTargetStateNode([bob, anna], intended_distance_change=DistanceChange.CONSTANT)
+                ),
+                ActorTargetStateNode([bob, anna], intended_distance_change=DistanceChange.DECREASING)
+            )
+        )
+        self.assertIsNone(template.retention)
+
+        agent_list = [agents[var] for var in template.variables]
+        windows = cut_to_windows(agent_list, list(agent_tuples.values()))
+        chunks = [windows[i:i + 7] for i in range(0, len(windows), 7)]
+
+        stream_results = list(template.process_stream(chunks))
+
+        self.assertEqual(len(chunks), len(stream_results))
+        self.assertListEqual(template.process(agent_list, list(agent_tuples.values())), stream_results[-1])
+
+        time_path, confidence = stream_results[-1][0]
+        self.assertEqual(reference_date, time_path[0])
+        self.assertEqual(reference_date + timedelta(seconds=40), time_path[-1])
+
+    def test_search_parallel(self):
+        anna = AgentVariable("Anna")
+        bob = AgentVariable("Bob")
+        cyril = AgentVariable("Cyril")
+        dana = AgentVariable("Dana")
+
+        agents, agent_tuples = (
+            BlockBuilder([anna, bob, cyril, dana])
+            .with_agent(anna, 10, Speed.WALK).with_agent(anna, 10, Speed.STAND)
+            .with_agent(bob, 5, Speed.WALK).with_agent(bob, 15, Speed.STAND)
+            .with_agent(cyril, 20, Speed.STAND)
+            .with_agent(dana, 15, Speed.WALK).with_agent(dana, 5, Speed.RUN)
+            .with_agents(anna, bob, 20, distance=Distance.NEAR)
+            .with_agents(cyril, dana, 20, distance=Distance.NEAR)
+            .build()
+        )
+        agents = {agent.agent_id: agent for agent in agents.values()}
+        agent_tuples = {(agent_tuple.actor.agent_id, agent_tuple.target.agent_id): agent_tuple
+                        for agent_tuple in agent_tuples.values()
+                        if agent_tuple.blocks}
+
+        template = BehaviorTemplate(
+            SequentialNode(
+                ConjunctionNode([
+                    StateNode([anna], speed=Speed.WALK),
+                    MutualStateNode([anna, bob], distance=Distance.NEAR)
+                ]),
+                StateNode([bob], speed=Speed.STAND)
+            )
+        )
+
+        serial_results = template.search(agents, agent_tuples, max_results=2)
+        parallel_results = template.search(agents, agent_tuples, max_results=2, workers=2)
+
+        self.assertEqual(2, len(serial_results))
+        self.assertListEqual(serial_results, parallel_results)
+
+        # Workers are not waited for once search is cancelled
+        cancelled_matches = list(template.search_iter(agents, agent_tuples, workers=2,
+                                                      cancellation=CancellationToken(timedelta(0))))
+        self.assertListEqual([], cancelled_matches)
+
+        comparer = Configuration.comparer
+        Configuration.comparer = ConfidenceComparer(1)
+
+        # Workers keep only the best matches of their partitions
+        template = BehaviorTemplate(SequentialNode(StateNode([anna], speed=Speed.WALK),
+                                                   StateNode([bob], speed=Speed.STAND)))
+        serial_matches = list(template.search_iter(agents, agent_tuples))
+        parallel_matches = list(template.search_iter(agents, agent_tuples, workers=2, max_results=1))
+        # Partitions are of selections by their first agent, of which the first match of the highest nominator is kept
+        best_matches = [max(matches, key=lambda match: match[-1].nom)
+                        for _, matches in itertools.groupby(serial_matches, key=lambda match: match[0][0])]
+        self.assertEqual(7, len(serial_matches))
+        self.assertEqual(3, len(best_matches))
+        self.assertListEqual(best_matches, parallel_matches)
+        self.assertListEqual(template.search(agents, agent_tuples, max_results=1),
+                             template.search(agents, agent_tuples, max_results=1, workers=2))
+
+        Configuration.comparer = comparer
+
+    def test_search_iter(self):
+        anna = AgentVariable("Anna")
+        bob = AgentVariable("Bob")
+        cyril = AgentVariable("Cyril")
+
+        agents, _ = (
+            BlockBuilder([anna, bob, cyril])
+            .with_agent(anna, 10, Speed.WALK).with_agent(anna, 10, Speed.STAND)
+            .with_agent(bob, 5, Speed.WALK).with_agent(bob, 15, Speed.STAND)
+            .with_agent(cyril, 20, Speed.RUN)
+            .build()
+        )
+        agents = {agent.agent_id: agent for agent in agents.values()}
+
+        template = BehaviorTemplate(
+            SequentialNode(
+                StateNode([anna], speed=Speed.WALK),
+                StateNode([anna], speed=Speed.STAND)
+            )
+        )
+
+        progresses = []
+        matches = list(template.search_iter(agents, {}, progress=lambda progress: progresses.append(progress.copy())))
+        self.assertListEqual(template.search(agents, {}), matches)
+
+        # Progress is reported once search starts, after each selection and once it finishes, Cyril never walks and
+        # is not considered
+        self.assertListEqual([0, 1, 2, 2], [progress.considered for progress in progresses])
+        self.assertEqual(3, progresses[-1].total)
+        self.assertEqual(1.0, progresses[-1].coverage)
+        self.assertEqual(2, progresses[-1].matched)
+        self.assertTrue(progresses[-1].is_complete)
+
+        # No further selections are evaluated once search is cancelled
+        cancellation = CancellationToken()
+        cancelled_progresses = []
+
+        def cancel_after_first(progress: SearchProgress):
+            cancelled_progresses.append(progress.copy())
+            if progress.considered == 1:
+                cancellation.cancel()
+
+        cancelled_matches = list(template.search_iter(agents, {}, progress=cancel_after_first,
+                                                      cancellation=cancellation))
+        self.assertListEqual(matches[:1], cancelled_matches)
+        self.assertEqual(1, cancelled_progresses[-1].considered)
+        self.assertIsNone(cancelled_progresses[-1].coverage)
+        self.assertFalse(cancelled_progresses[-1].is_complete)
+
+    def test_search_time_budget(self):
+        anna = AgentVariable("Anna")
+        bob = AgentVariable("Bob")
+        cyril = AgentVariable("Cyril")
+
+        agents, _ = (
+            BlockBuilder([anna, bob, cyril])
+            .with_agent(anna, 5, Speed.RUN).with_agent(anna, 5, Speed.WALK).with_agent(anna, 10, Speed.STAND)
+            .with_agent(bob, 5, Speed.WALK).with_agent(bob, 10, Speed.STAND).with_agent(bob, 5, Speed.RUN)
+            .with_agent(cyril, 10, Speed.WALK).with_agent(cyril, 10, Speed.STAND)
+            .build()
+        )
+        variable_agents = agents
+        agents = {agent.agent_id: agent for agent in agents.values()}
+
+        template = BehaviorTemplate(
+            SequentialNode(
+                StateNode([anna], speed=Speed.WALK),
+                StateNode([anna], speed=Speed.STAND)
+            )
+        )
+
+        # Cyril walks for the longest time, Anna and Bob equally long and keep their order
+        agent_list = list(agents.values())
+        selections = template.prioritized_selections(agent_list)
+        self.assertListEqual([[agent_list.index(variable_agents[cyril])], [agent_list.index(variable_agents[anna])],
+                              [agent_list.index(variable_agents[bob])]], selections.tolist())
+        # Selections are ordered across chunks they are scored in
+        self.assertListEqual(selections.tolist(), template.prioritized_selections(agent_list, chunk_size=1).tolist())
+
+        progresses = []
+        results = template.search(agents, {}, max_results=1, time_budget=timedelta(0),
+                                  progress=lambda progress: progresses.append(progress.copy()))
+
+        # Budget is checked while selections are prioritized, before any of them is evaluated
+        self.assertListEqual([], results)
+        self.assertEqual(0, progresses[-1].considered)
+        self.assertFalse(progresses[-1].is_complete)
+
+        cancellation = CancellationToken(timedelta(hours=1))
+        progresses = []
+
+        def cancel_after_first(progress: SearchProgress):
+            progresses.append(progress.copy())
+            if progress.considered == 1:
+                cancellation.cancel()
+
+        matches = list(template.search_iter(agents, {}, progress=cancel_after_first, cancellation=cancellation,
+                                            prioritized=True))
+
+        # Search stops after the first selection, which is the most promising one
+        self.assertEqual(1, progresses[-1].considered)
+        self.assertAlmostEqual(1 / 3, progresses[-1].coverage)
+        self.assertListEqual(template.search(agents, {}, max_results=1), matches)
+        self.assertTrue(CancellationToken(timedelta(0)).is_cancelled)
+
+    def test_search_branch_and_bound(self):
+        anna = AgentVariable("Anna")
+        bob = AgentVariable("Bob")
+        cyril = AgentVariable("Cyril")
+
+        agents, agent_tuples = (
+            BlockBuilder([anna, bob, cyril])
+            .with_agent(anna, 10, Speed.WALK).with_agent(anna, 10, Speed.STAND)
+            .with_agent(bob, 5, Speed.WALK).with_agent(bob, 10, Speed.STAND).with_agent(bob, 5, Speed.RUN)
+            .with_agent(cyril, 2, Speed.WALK).with_agent(cyril, 18, Speed.RUN)
+            .build()
+        )
+        bob_windows = cut_to_windows([agents[bob]], [])
+        agents = {agent.agent_id: agent for agent in agents.values()}
+
+        template = BehaviorTemplate(
+            SequentialNode(
+                StateNode([anna], speed=Speed.WALK),
+                StateNode([anna], speed=Speed.STAND)
+            )
+        )
+
+        results = template.search(agents, {}, max_results=1)
+        bounded_results = template.search(agents, {}, max_results=1, branch_and_bound=True)
+        self.assertListEqual(results, bounded_results)
+
+        # Bob walks or stands for only 15 seconds, which cannot exceed Anna's 20 seconds
+        self.assertEqual(Confidence(20.0, 20.0), results[0][-1])
+        self.assertIsNone(template.process_windows(bob_windows, lower_bound=results[0][-1]))
+        self.assertIsNotNone(template.process_windows(bob_windows, lower_bound=Confidence(10.0, 10.0)))
+
+    def test_variable_candidates(self):
+        anna = AgentVariable("Anna")
+        bob = AgentVariable("Bob")
+
+        agents, _ = (
+            BlockBuilder([anna, bob])
+            .with_agent(anna, 10, Speed.RUN)
+            .with_agent(bob, 10, Speed.WALK)
+            .build()
+        )
+
+        template = BehaviorTemplate(
+            SequentialNode(
+                StateNode([anna], speed=Speed.WALK),
+                ConfidenceRestrictingNode(
+                    ConjunctionNode([StateNode([bob], speed=Speed.RUN), StateNode([anna], speed=Speed.WALK)]),
+                    Confidence(0.9, 1.0)
+                )
+            )
+        )
+        agent_list = [agents[anna], agents[bob]]
+
+        variable_candidates = template.variable_candidates(agent_list)
+        self.assertListEqual([False, True], variable_candidates[template.variables.index(anna)].tolist())
+        self.assertListEqual([True, False], variable_candidates[template.variables.index(bob)].tolist())
+        self.assertListEqual([(agents[bob], agents[anna])] if template.variables[0] == anna
+                             else [(agents[anna], agents[bob])],
+                             list(template.agent_selections(agent_list)))
+
+    def test_variable_candidates_at_threshold(self):
+        anna = AgentVariable("Anna")
+        agents, _ = BlockBuilder([anna]).with_agent(anna, 129, Speed.RUN).with_agent(anna, 71, Speed.WALK).build()
+
+        min_confidence = Configuration.min_confidence
+        Configuration.min_confidence = 0.65
+        try:
+            # Step of 129 / 200 conformity is accepted by the time graph's comparer, so the agent must not be excluded
+            template = BehaviorTemplate(SequentialNode(
+                TimeRestrictingNode(StateNode([anna], speed=Speed.RUN),
+                                    RelativeTimeFrame(minimal=timedelta(seconds=200)))
+            ))
+            self.assertListEqual([True], template.variable_candidates([agents[anna]])[0].tolist())
+            results = template.search({0: agents[anna]}, {})
+            self.assertEqual(1, len(results))
+            self.assertEqual(Confidence(129.0, 200.0), results[0][-1])
+
+            # Far less conform agents are still excluded
+            agents, _ = BlockBuilder([anna]).with_agent(anna, 120, Speed.RUN).with_agent(anna, 80, Speed.WALK).build()
+            self.assertListEqual([False], template.variable_candidates([agents[anna]])[0].tolist())
+        finally:
+            Configuration.min_confidence = min_confidence
+
+    def test_pair_candidates_at_threshold(self):
+        anna = AgentVariable("Anna")
+        bob = AgentVariable("Bob")
+        agents, agent_tuples = (
+            BlockBuilder([anna, bob])
+            .with_agent(anna, 200)
+            .with_agent(bob, 200)
+            .with_agents(anna, bob, 129, distance=Distance.ADJACENT)
+            .with_agents(anna, bob, 71, distance=Distance.FAR)
+            .build()
+        )
+        agent_tuples = {(agent_tuple.actor.agent_id, agent_tuple.target.agent_id): agent_tuple
+                        for agent_tuple in agent_tuples.values() if agent_tuple.blocks}
+
+        min_confidence = Configuration.min_confidence
+        Configuration.min_confidence = 0.65
+        try:
+            template = BehaviorTemplate(SequentialNode(
+                TimeRestrictingNode(MutualStateNode([anna, bob], distance=Distance.ADJACENT),
+                                    RelativeTimeFrame(minimal=timedelta(seconds=200)))
+            ))
+            pair_candidates = template.pair_candidates([agents[anna], agents[bob]], agent_tuples)
+            self.assertListEqual([[False, True], [True, False]], pair_candidates[0, 1].tolist())
+            results = template.search({agent.agent_id: agent for agent in agents.values()}, agent_tuples)
+            self.assertEqual(Confidence(129.0, 200.0), results[0][-1])
+        finally:
+            Configuration.min_confidence = min_confidence
+
+    def test_pair_candidates(self):
+        anna = AgentVariable("Anna")
+        bob = AgentVariable("Bob")
+        cyril = AgentVariable("Cyril")
+
+        agents, agent_tuples = (
+            BlockBuilder([anna, bob, cyril])
+            .with_agent(anna, 10)
+            .with_agent(bob, 10)
+            .with_agent(cyril, 10)
+            .with_agents(anna, bob, 10, distance=Distance.ADJACENT)
+            .with_agents(anna, cyril, 10, distance=Distance.FAR)
+            .build()
+        )
+        agent_tuples = {(agent_tuple.actor.agent_id, agent_tuple.target.agent_id): agent_tuple
+                        for agent_tuple in agent_tuples.values() if agent_tuple.blocks}
+
+        perp = AgentVariable("Perp")
+        victim = AgentVariable("Victim")
+        template = BehaviorTemplate(SequentialNode(MutualStateNode([perp, victim], distance=Distance.ADJACENT)))
+        agent_list = [agents[anna], agents[bob], agents[cyril]]
+
+        pair_candidates = template.pair_candidates(agent_list, agent_tuples)
+        self.assertListEqual([(0, 1)], list(pair_candidates.keys()))
+        self.assertListEqual([[False, True, False], [True, False, False], [False, False, False]],
+                             pair_candidates[0, 1].tolist())
+        self.assertListEqual([(agents[anna], agents[bob])],
+                             list(template.agent_selections(agent_list, pair_candidates=pair_candidates)))
+
+    def test_retention(self):
+        anna = AgentVariable("Anna")
+
+        template = BehaviorTemplate(
+            SequentialNode(
+                TimeRestrictingNode(StateNode([anna], speed=Speed.WALK),
+                                    RelativeTimeFrame(minimal=timedelta(seconds=5), maximal=timedelta(seconds=10))),
+                TimeRestrictingNode(StateNode([anna], speed=Speed.STAND),
+                                    RelativeTimeFrame(maximal=timedelta(seconds=20)))
+            )
+        )
+        self.assertEqual(timedelta(seconds=30), template.retention)
+
 
 if __name__ == "__main__":
     unittest.main()
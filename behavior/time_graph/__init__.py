@@ -1,3 +1,5 @@
-from .layer import TimeGraphLayer, LambdaTimeGraphLayer, DenseTimeGraphLayer, ContractedTimeGraphLayer
+from .layer import (TimeGraphLayer, LambdaTimeGraphLayer, DenseTimeGraphLayer, ContractedTimeGraphLayer,
+                    max_window_bounds)
+from .backtrack_map import BacktrackMap
 from .time_graph import TimeGraph
-from .types import ContractedTimetableEntry
+from .types import ContractedTimetableEntry, WindowBounds
@@ -0,0 +1,161 @@
+import numpy as np
+
+from .types import BacktrackEntry, BacktrackInfo
+
+from ..data import Confidence, ConfidenceArray
+
+
+class BacktrackMap:
+    """
+    Array-backed storage of confident incoming edges (backtrack entries) of all nodes of a time graph.
+    Each node holds up to capacity entries, kept in preallocated arrays of shape (depth, width, capacity) along with
+    the number of entries filled for each node.
+    Nodes are addressed by their time (index in the graph). Map may be extended by new nodes and its oldest nodes may
+    be discarded, in which case arrays only hold nodes starting at time offset.
+    Entries may be inserted along with scalar ranks, ascending from the best entry, by which insert positions are found
+    within the arrays (see position).
+    """
+
+    entry_dtype = np.dtype([('node_idx', np.int32), ('path_idx', np.int32), ('nom', np.float64), ('denom', np.float64),
+                          ('rank', np.float64)])
+
+    records: np.ndarray
+    """All entries, as records of entry_dtype. Fields are also accessible via views below."""
+    node_idxs: np.ndarray
+    """Index of parent in previous layer"""
+    path_idxs: np.ndarray
+    """Index of previous path segment in parent"""
+    confidences: ConfidenceArray
+    """Incoming confidences"""
+    ranks: np.ndarray
+    """Ranks of entries, if inserted with them"""
+    counts: np.ndarray
+    """Of shape (depth, width - offset), number of filled entries of each node"""
+    offset: int
+    """Time of the first node held in arrays"""
+
+    def __init__(self, depth: int, width: int, capacity: int):
+        self.offset = 0
+        self.__set_arrays(BacktrackMap.__empty_records(depth, width, capacity),
+                          np.zeros((depth, width), dtype=np.int32))
+
+    @staticmethod
+    def __empty_records(depth: int, width: int, capacity: int) -> np.ndarray:
+        records = np.zeros((depth, width, capacity), dtype=BacktrackMap.entry_dtype)
+        records['node_idx'] = -1
+        records['path_idx'] = -1
+        return records
+
+    def __set_arrays(self, records: np.ndarray, counts: np.ndarray):
+        self.records = records
+        self.node_idxs = records['node_idx']
+        self.path_idxs = records['path_idx']
+        self.confidences = ConfidenceArray(records['nom'], records['denom'])
+        self.ranks = records['rank']
+        self.counts = counts
+
+    @property
+    def depth(self) -> int:
+        return self.counts.shape[0]
+
+    @property
+    def width(self) -> int:
+        return self.offset + self.counts.shape[1]
+
+    @property
+    def capacity(self) -> int:
+        return self.records.shape[2]
+
+    def extend(self, width: int):
+        """
+        Append empty nodes, so that the map holds nodes up to (excluding) width.
+        """
+        appended = width - self.width
+        if appended <= 0:
+            return
+        self.__set_arrays(
+            np.concatenate([self.records, BacktrackMap.__empty_records(self.depth, appended, self.capacity)], axis=1),
+            np.concatenate([self.counts, np.zeros((self.depth, appended), dtype=np.int32)], axis=1))
+
+    def discard_before(self, time: int):
+        """
+        Discard all nodes before time. Entries of remaining nodes may still refer to discarded nodes, such paths can
+        no longer be backtracked.
+        """
+        discarded = min(time, self.width) - self.offset
+        if discarded <= 0:
+            return
+        self.__set_arrays(self.records[:, discarded:].copy(), self.counts[:, discarded:].copy())
+        self.offset += discarded
+
+    def clear(self):
+        """
+        Remove all entries of all nodes.
+        """
+        self.counts[:] = 0
+
+    def count(self, depth: int, time: int) -> int:
+        return int(self.counts[depth, time - self.offset])
+
+    def entry(self, depth: int, time: int, idx: int) -> BacktrackEntry:
+        node_idx, path_idx, nom, denom, _ = self.records[depth, time - self.offset, idx].tolist()
+        return node_idx, path_idx, Confidence(nom, denom)
+
+    def entries(self, depth: int, time: int) -> BacktrackInfo:
+        time -= self.offset
+        return [(node_idx, path_idx, Confidence(nom, denom))
+                for node_idx, path_idx, nom, denom, _ in self.records[depth, time, :self.counts[depth, time]].tolist()]
+
+    def assign(self, depth: int, time: int, entries: list[BacktrackEntry], ranks: list[float] | None = None):
+        """
+        Replace all entries of a node by entries (at most capacity of them), along with their ranks if given.
+        """
+        time -= self.offset
+        if ranks is None:
+            ranks = [0.0] * len(entries)
+        self.records[depth, time, :len(entries)] = [(node_idx, path_idx, nom, denom, rank)
+                                                    for (node_idx, path_idx, (nom, denom)), rank in zip(entries, ranks)]
+        self.counts[depth, time] = len(entries)
+
+    def position(self, depth: int, time: int, rank: float) -> int:
+        """
+        Find position of an entry of rank among node's entries (all inserted with ranks), before those of equal rank.
+        """
+        time -= self.offset
+        count = int(self.counts[depth, time])
+        ranks = self.ranks[depth, time]
+        # Entries are mostly ranked after all held ones, or inserted into an empty node
+        if count == 0 or rank > ranks[count - 1]:
+            return count
+        return int(ranks[:count].searchsorted(rank))
+
+    def insert(self, depth: int, time: int, idx: int, entry: BacktrackEntry, rank: float = 0.0):
+        """
+        Insert entry at idx of node's entries, shifting the following ones. If the node is full, its last entry is
+        discarded.
+        :param rank: Rank of the entry (see position).
+        """
+        time -= self.offset
+        count = min(int(self.counts[depth, time]), self.capacity - 1)
+        node_idx, path_idx, (nom, denom) = entry
+        records = self.records[depth, time]
+        if idx < count:
+            records[idx + 1:count + 1] = records[idx:count]
+        records[idx] = (node_idx, path_idx, nom, denom, rank)
+        self.counts[depth, time] = count + 1
+
+    def backtrack(self, depth: int, time: int, idx: int) -> list[int] | None:
+        """
+        Reconstruct path ending with idx-th entry of the node at specified depth and time.
+        :return: Times of nodes on the path, from the first layer. None if the path leads through discarded nodes.
+        """
+        path = [time]
+        while depth > 0:
+            time, idx = (self.node_idxs[depth, time - self.offset, idx].item(),
+                         self.path_idxs[depth, time - self.offset, idx].item())
+            depth -= 1
+            if time < self.offset:
+                return None
+            path.append(time)
+        path.reverse()
+        return path
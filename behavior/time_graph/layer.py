@@ -1,10 +1,85 @@
 from __future__ import annotations
 
+import copy
+import math
 from typing import Callable
 
-from .types import ContractedPathEntry
+import numpy as np
 
-from ..data import Confidence
+from .types import ContractedPathEntry, WindowBounds
+
+from ..data import Confidence, ConfidenceArray
+
+
+class PrefixSums:
+    """
+    Prefix sums of a sequence of values, allowing sum of any span of values to be obtained in constant time.
+    Sums are compensated (each prefix is kept as a pair of high and low part), so that span sums are not affected
+    by the magnitude of preceding values. Infinite values are counted separately, so that spans containing them
+    correctly sum to infinity instead of NaN.
+    """
+
+    high: np.ndarray
+    """Of size len(values) + 1, where i-th value is the (rounded) sum of finite values[0:i]. Once values are
+    discarded (see extended), sums also include the discarded values, which cancel out in spans."""
+    low: np.ndarray
+    """Of size len(values) + 1, where i-th value is the rounding error of high[i]"""
+    infinities: np.ndarray
+    """Of size len(values) + 1, where i-th value is the count of infinite values in values[0:i]"""
+
+    def __init__(self, values: list[float]):
+        self.high = np.zeros(1, dtype=np.float64)
+        self.low = np.zeros(1, dtype=np.float64)
+        self.infinities = np.zeros(1, dtype=np.int64)
+        self.__append(values)
+
+    def extended(self, values: list[float], discarded: int = 0) -> PrefixSums:
+        """
+        Prefix sums of the summed values without the first discarded ones, followed by appended values. Prefixes of
+        retained values are reused, only the appended values are summed.
+        """
+        sums = copy.copy(self)
+        sums.high = self.high[discarded:]
+        sums.low = self.low[discarded:]
+        sums.infinities = self.infinities[discarded:]
+        sums.__append(values)
+        return sums
+
+    def __append(self, values: list[float]):
+        start = len(self.high)
+        high, low, infinities = self.high[-1].item(), self.low[-1].item(), self.infinities[-1].item()
+
+        self.high = np.concatenate([self.high, np.zeros(len(values), dtype=np.float64)])
+        self.low = np.concatenate([self.low, np.zeros(len(values), dtype=np.float64)])
+        self.infinities = np.concatenate([self.infinities, np.zeros(len(values), dtype=np.int64)])
+
+        for idx, value in enumerate(values, start=start):
+            if math.isinf(value):
+                infinities += 1
+            else:
+                high, error = _two_sum(high, value)
+                low += error
+            self.high[idx] = high
+            self.low[idx] = low
+            self.infinities[idx] = infinities
+
+    def span(self, i: int | np.ndarray, j: int | np.ndarray) -> float | np.ndarray:
+        """
+        Sum of values[i:j]. Both i and j may also be arrays of indices, in which case an array of sums is returned.
+        """
+        high, error = _two_sum(self.high[j], -self.high[i])
+        total = high + (error + (self.low[j] - self.low[i]))
+        return np.where(self.infinities[j] > self.infinities[i], np.inf, total)
+
+
+def _two_sum(a, b):
+    """
+    Error-free transformation of a sum, returning the rounded sum and its rounding error.
+    """
+    total = a + b
+    b_virtual = total - a
+    error = (a - (total - b_virtual)) + (b - b_virtual)
+    return total, error
 
 
 class TimeGraphLayer:
@@ -19,6 +94,32 @@ class TimeGraphLayer:
     def __call__(self, i: int, j: int) -> Confidence:
         raise "Abstract method"
 
+    def row(self, i: int, j_from: int, j_to: int) -> ConfidenceArray:
+        """
+        Batch counterpart of __call__, computing confidences of edges (i, j) for every j in range(j_from, j_to).
+        Layers capable of vectorized computation override this, otherwise each edge is computed via __call__.
+        """
+        return ConfidenceArray.from_confidences(self(i, j) for j in range(j_from, j_to))
+
+    def end_range(self, i: int, width: int) -> tuple[int, int]:
+        """
+        Range of ends j of edges (i, j) which may have non-zero nominator. Confidences of edges ending outside of this
+        range are guaranteed to have zero nominator, allowing them to be skipped when such confidences are rejected.
+        :param width: Number of nodes in the time graph, i.e., the upper limit of the range.
+        :return: Range of ends as a pair of j_from (inclusive) and j_to (exclusive).
+        """
+        return i + 1, width
+
+    def window_bounds(self) -> WindowBounds | None:
+        """
+        Upper bounds of confidences of edges, given per window: any edge (i, j) has nominator (and denominator) at
+        most the sum of bounds of windows i..j-1, and conformity at most the conformity bound. Sum of step confidences
+        of any path is then bounded by bounds of windows it spans, regardless of where its steps start or end.
+        :return: Bounds of nominators and denominators of windows and bound of conformity, or None if the layer
+        provides no bounds.
+        """
+        return None
+
     @property
     def memory(self) -> dict[tuple[int, int], Confidence]:
         raise "Abstract method"
@@ -29,38 +130,81 @@ class TimeGraphLayer:
 
 class ContractedTimeGraphLayer(TimeGraphLayer):
     paths: dict[tuple[int, int], ContractedPathEntry]
+    offset: int
+    """Index of the first node of the contracted graph (see TimeGraph.offset). Edges of the layer are indexed
+    relatively to it, as are other layers, while contracted paths are not."""
+
+    bounding: Callable[[], WindowBounds | None] | None
+    """Optional bounds of confidences of paths, see TimeGraphLayer.window_bounds"""
 
     def __init__(self,
                  paths: list[ContractedPathEntry],
                  name: str | None = None,
-                 sublayers: list[TimeGraphLayer] | None = None):
+                 sublayers: list[TimeGraphLayer] | None = None,
+                 bounding: Callable[[], WindowBounds | None] | None = None,
+                 offset: int = 0):
         super().__init__(name, sublayers)
         self.paths = {(path[0], path[-1]): (path, confidence) for path, confidence in paths}
+        self.bounding = bounding
+        self.offset = offset
 
     def __call__(self, i: int, j: int) -> Confidence:
-        if (i, j) not in self.paths:
+        if (i + self.offset, j + self.offset) not in self.paths:
             return Confidence.impartial()
-        return self.paths[i, j][-1]
+        return self.paths[i + self.offset, j + self.offset][-1]
+
+    def window_bounds(self) -> WindowBounds | None:
+        if self.bounding is None:
+            return None
+        return self.bounding()
 
     @property
     def memory(self) -> dict[tuple[int, int], Confidence]:
-        return {edge: conf for edge, (path, conf) in self.paths.items()}
+        return {(i - self.offset, j - self.offset): conf for (i, j), (path, conf) in self.paths.items()}
 
 
 class LambdaTimeGraphLayer(TimeGraphLayer):
     width: int
+    weighting: Callable[[int, int], Confidence]
+    rowing: Callable[[int, int, int], ConfidenceArray] | None
+    """Optional batch counterpart of weighting, see TimeGraphLayer.row"""
+    ranging: Callable[[int, int], tuple[int, int]] | None
+    """Optional limitation of ends of edges, see TimeGraphLayer.end_range"""
+    bounding: Callable[[], WindowBounds | None] | None
+    """Optional bounds of confidences of edges, see TimeGraphLayer.window_bounds"""
 
     def __init__(self,
                  weighting: Callable[[int, int], Confidence],
                  width: int, name: str | None = None,
-                 sublayers: list[TimeGraphLayer] | None = None):
+                 sublayers: list[TimeGraphLayer] | None = None,
+                 rowing: Callable[[int, int, int], ConfidenceArray] | None = None,
+                 ranging: Callable[[int, int], tuple[int, int]] | None = None,
+                 bounding: Callable[[], WindowBounds | None] | None = None):
         super().__init__(name, sublayers)
         self.width = width
         self.weighting = weighting
+        self.rowing = rowing
+        self.ranging = ranging
+        self.bounding = bounding
 
     def __call__(self, i: int, j: int) -> Confidence:
         return self.weighting(i, j)
 
+    def row(self, i: int, j_from: int, j_to: int) -> ConfidenceArray:
+        if self.rowing is None:
+            return super().row(i, j_from, j_to)
+        return self.rowing(i, j_from, j_to)
+
+    def end_range(self, i: int, width: int) -> tuple[int, int]:
+        if self.ranging is None:
+            return super().end_range(i, width)
+        return self.ranging(i, width)
+
+    def window_bounds(self) -> WindowBounds | None:
+        if self.bounding is None:
+            return None
+        return self.bounding()
+
     @property
     def memory(self) -> dict[tuple[int, int], Confidence]:
         memory = {}
@@ -74,7 +218,15 @@ class DenseTimeGraphLayer(TimeGraphLayer):
     right_edges: list[Confidence]
     bot_edges: list[Confidence] | None
     default: float
-    confidences: dict[tuple[int, int], Confidence]
+
+    noms: PrefixSums
+    """Prefix sums of nominators of right_edges."""
+    denoms: PrefixSums
+    """Prefix sums of denominators of right_edges."""
+    last_noms: np.ndarray
+    """Nominators of the final edge of each span, i.e., of bot_edges if set, of right_edges otherwise"""
+    last_denoms: np.ndarray
+    """Denominators of the final edge of each span, i.e., of bot_edges if set, of right_edges otherwise"""
 
     def __init__(self,
                  right_edges: list[Confidence], bot_edges: list[Confidence] | None = None,
@@ -84,26 +236,65 @@ class DenseTimeGraphLayer(TimeGraphLayer):
         self.right_edges = right_edges
         self.bot_edges = bot_edges
         self.default = default
-        self.confidences = {}
+
+        self.noms = PrefixSums([nom for nom, _ in right_edges])
+        self.denoms = PrefixSums([denom for _, denom in right_edges])
+
+        last_edges = right_edges if bot_edges is None else bot_edges
+        self.last_noms = np.array([nom for nom, _ in last_edges], dtype=np.float64)
+        self.last_denoms = np.array([denom for _, denom in last_edges], dtype=np.float64)
+
+    def extended(self, right_edges: list[Confidence], discarded: int = 0) -> DenseTimeGraphLayer:
+        """
+        Layer over edges of this layer without the first discarded ones, followed by appended right_edges, e.g., of
+        windows appended to a stream. Prefix sums of retained edges are reused. Only layers without bot_edges may be
+        extended.
+        """
+        if self.bot_edges is not None:
+            raise ValueError("Layers with bottom edges cannot be extended")
+
+        layer = copy.copy(self)
+        layer.right_edges = self.right_edges[discarded:] + right_edges
+        layer.noms = self.noms.extended([nom for nom, _ in right_edges], discarded)
+        layer.denoms = self.denoms.extended([denom for _, denom in right_edges], discarded)
+        layer.last_noms = np.concatenate([self.last_noms[discarded:],
+                                          np.array([nom for nom, _ in right_edges], dtype=np.float64)])
+        layer.last_denoms = np.concatenate([self.last_denoms[discarded:],
+                                            np.array([denom for _, denom in right_edges], dtype=np.float64)])
+        return layer
 
     def __call__(self, i: int, j: int) -> Confidence:
         if i >= j:
             return Confidence.impossible()
 
-        if (i, j) not in self.confidences:
-            edges = self.right_edges[i:j - 1] + [
-                self.bot_edges[j - 1] if self.bot_edges is not None else self.right_edges[j - 1]]
+        # Edges right_edges[i:j-1] are summed via prefix sums, the last edge of the span is then added separately,
+        # as it is either a bottom edge (if set) or a right edge.
+        nom = self.noms.span(i, j - 1) + self.last_noms[j - 1]
+        denom = self.denoms.span(i, j - 1) + self.last_denoms[j - 1]
+        return Confidence(float(nom), float(denom))
+
+    def row(self, i: int, j_from: int, j_to: int) -> ConfidenceArray:
+        ends = np.arange(j_from, j_to)
+        noms = self.noms.span(i, ends - 1) + self.last_noms[ends - 1]
+        denoms = self.denoms.span(i, ends - 1) + self.last_denoms[ends - 1]
 
-            self.confidences[i, j] = sum(edges, start=Confidence.impartial())
+        return ConfidenceArray(noms, denoms).where(ends > i, Confidence.impossible())
 
-        return self.confidences[i, j]
+    def window_bounds(self) -> WindowBounds | None:
+        if self.bot_edges is not None:
+            return None
+
+        # Edges are sums of windows, which are thus bounded by themselves. Conformity of a sum is at most that of the
+        # most conform summand.
+        conformities = ConfidenceArray(self.last_noms, self.last_denoms).conformities()
+        conformities = np.where(np.isnan(conformities), 0.0, conformities)
+        return self.last_noms, self.last_denoms, float(np.max(conformities, initial=0.0))
 
     @property
     def memory(self) -> dict[tuple[int, int], Confidence]:
-        for i in range(len(self.right_edges)):
-            for j in range(i + 1, len(self.right_edges) + 1):
-                self.confidences[(i, j)] = self(i, j)
-        return self.confidences
+        return {(i, j): self(i, j)
+                for i in range(len(self.right_edges))
+                for j in range(i + 1, len(self.right_edges) + 1)}
 
     def __repr__(self):
         return f"DenseTimeGraphLayer({self.right_edges}, {self.bot_edges}, {self.default})"
@@ -112,3 +303,16 @@ class DenseTimeGraphLayer(TimeGraphLayer):
         bots = self.right_edges if self.bot_edges is None else self.bot_edges
         return ("".join([f"() -[{c:.2f}]->" for c, d in self.right_edges])
                 + "".join([f"   \\[{c:.2f}]\\v" for c, d in bots]))
+
+
+def max_window_bounds(bounds: list[WindowBounds | None]) -> WindowBounds | None:
+    """
+    Bounds of confidences selected from any of the bounded layers (or of sums of such confidences over disjoint spans,
+    e.g., steps of a path), i.e., the maximum of bounds of each window and of conformity bounds.
+    :return: Combined bounds, or None if any of the layers provides no bounds.
+    """
+    if not bounds or any(bound is None for bound in bounds):
+        return None
+    return (np.max([noms for noms, _, _ in bounds], axis=0),
+            np.max([denoms for _, denoms, _ in bounds], axis=0),
+            max(conformity for _, _, conformity in bounds))
@@ -0,0 +1,56 @@
+import unittest
+
+from ..backtrack_map import BacktrackMap
+
+from ...data import Confidence
+
+
+class BacktrackMapTest(unittest.TestCase):
+
+    def test_insert(self):
+        backtrack_map = BacktrackMap(2, 3, 2)
+
+        backtrack_map.insert(1, 2, 0, (0, 0, Confidence(1.0, 1.0)))
+        backtrack_map.insert(1, 2, 0, (1, 0, Confidence(2.0, 2.0)))
+        self.assertListEqual([(1, 0, Confidence(2.0, 2.0)), (0, 0, Confidence(1.0, 1.0))],
+                             backtrack_map.entries(1, 2))
+
+        # Node is full, last entry is discarded
+        backtrack_map.insert(1, 2, 1, (1, 1, Confidence(3.0, 3.0)))
+        self.assertEqual(2, backtrack_map.count(1, 2))
+        self.assertListEqual([(1, 0, Confidence(2.0, 2.0)), (1, 1, Confidence(3.0, 3.0))],
+                             backtrack_map.entries(1, 2))
+        self.assertEqual((1, 1, Confidence(3.0, 3.0)), backtrack_map.entry(1, 2, 1))
+
+        self.assertListEqual([], backtrack_map.entries(1, 1))
+        self.assertListEqual([], backtrack_map.entries(0, 2))
+
+    def test_position(self):
+        backtrack_map = BacktrackMap(2, 3, 3)
+        self.assertEqual(0, backtrack_map.position(1, 2, 0.0))
+
+        backtrack_map.insert(1, 2, 0, (0, 0, Confidence(1.0, 1.0)), -1.0)
+        backtrack_map.insert(1, 2, 1, (1, 0, Confidence(0.5, 1.0)), -0.5)
+        self.assertListEqual([-1.0, -0.5], backtrack_map.ranks[1, 2, :2].tolist())
+
+        # Entries are placed before those of equal rank
+        self.assertEqual(0, backtrack_map.position(1, 2, -1.0))
+        self.assertEqual(1, backtrack_map.position(1, 2, -0.75))
+        self.assertEqual(1, backtrack_map.position(1, 2, -0.5))
+        self.assertEqual(2, backtrack_map.position(1, 2, 0.0))
+
+    def test_backtrack(self):
+        backtrack_map = BacktrackMap(3, 4, 2)
+        backtrack_map.counts[0, :] = 1
+
+        backtrack_map.insert(1, 1, 0, (0, 0, Confidence(1.0, 1.0)))
+        backtrack_map.insert(1, 2, 0, (1, 0, Confidence(1.0, 1.0)))
+        backtrack_map.insert(2, 3, 0, (2, 0, Confidence(2.0, 2.0)))
+        backtrack_map.insert(2, 3, 1, (1, 0, Confidence(2.0, 2.0)))
+
+        self.assertListEqual([1, 2, 3], backtrack_map.backtrack(2, 3, 0))
+        self.assertListEqual([0, 1, 3], backtrack_map.backtrack(2, 3, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
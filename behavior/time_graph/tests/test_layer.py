@@ -0,0 +1,101 @@
+import random
+import unittest
+
+from ..layer import DenseTimeGraphLayer, PrefixSums
+
+from ...data import Confidence
+
+
+class PrefixSumsTest(unittest.TestCase):
+
+    def test_span(self):
+        values = [1.0, 2.0, 0.5, 4.0]
+        sums = PrefixSums(values)
+
+        self.assertEqual(0.0, sums.span(2, 2))
+        self.assertEqual(1.0, sums.span(0, 1))
+        self.assertEqual(2.5, sums.span(1, 3))
+        self.assertEqual(7.5, sums.span(0, 4))
+
+    def test_span_is_not_affected_by_preceding_values(self):
+        values = [1e16, 1 / 3, 1 / 3, 1 / 3]
+        sums = PrefixSums(values)
+
+        self.assertEqual(sum(values[1:]), sums.span(1, 4))
+
+    def test_span_with_infinity(self):
+        values = [1.0, float('inf'), 2.0]
+        sums = PrefixSums(values)
+
+        self.assertEqual(1.0, sums.span(0, 1))
+        self.assertEqual(float('inf'), sums.span(0, 2))
+        self.assertEqual(float('inf'), sums.span(1, 3))
+        self.assertEqual(2.0, sums.span(2, 3))
+
+    def test_extended(self):
+        values = [1.0, float('inf'), 2.0, 0.5]
+        sums = PrefixSums(values[:3]).extended(values[3:], 2)
+
+        self.assertEqual(2.0, sums.span(0, 1))
+        self.assertEqual(2.5, sums.span(0, 2))
+        self.assertEqual(0.5, sums.span(1, 2))
+
+
+class DenseTimeGraphLayerTest(unittest.TestCase):
+
+    def test_call(self):
+        layer = DenseTimeGraphLayer([Confidence(1.0, 1.0), Confidence(0.0, 2.0), Confidence(0.5, 1.0)])
+
+        self.assertEqual(Confidence.impossible(), layer(1, 1))
+        self.assertEqual(Confidence.impossible(), layer(2, 1))
+        self.assertEqual(Confidence(1.0, 1.0), layer(0, 1))
+        self.assertEqual(Confidence(1.0, 3.0), layer(0, 2))
+        self.assertEqual(Confidence(0.5, 3.0), layer(1, 3))
+        self.assertEqual(Confidence(1.5, 4.0), layer(0, 3))
+
+    def test_call_with_bot_edges(self):
+        layer = DenseTimeGraphLayer([Confidence(1.0, 1.0), Confidence(0.0, 2.0), Confidence(0.5, 1.0)],
+                                    [Confidence(0.0, 0.0), Confidence(2.0, 2.0), Confidence(1.0, 1.0)])
+
+        self.assertEqual(Confidence(0.0, 0.0), layer(0, 1))
+        self.assertEqual(Confidence(3.0, 3.0), layer(0, 2))
+        self.assertEqual(Confidence(1.0, 3.0), layer(1, 3))
+
+    def test_row(self):
+        layer = DenseTimeGraphLayer([Confidence(1.0, 1.0), Confidence(0.0, 2.0), Confidence(0.5, 1.0)],
+                                    [Confidence(0.0, 0.0), Confidence(2.0, 2.0), Confidence(1.0, 1.0)])
+
+        for i in range(3):
+            self.assertListEqual([layer(i, j) for j in range(4)], layer.row(i, 0, 4).to_confidences())
+
+    def test_extended(self):
+        edges = [Confidence(1.0, 1.0), Confidence(0.0, 2.0), Confidence(0.5, 1.0), Confidence(2.0, 3.0)]
+        layer = DenseTimeGraphLayer(edges[:3])
+
+        extended = layer.extended(edges[3:], 1)
+        retained = DenseTimeGraphLayer(edges[1:])
+        self.assertListEqual(retained.right_edges, extended.right_edges)
+        for i in range(3):
+            self.assertListEqual(retained.row(i, 0, 4).to_confidences(), extended.row(i, 0, 4).to_confidences())
+        # Extended layer is a new one
+        self.assertEqual(Confidence(1.5, 4.0), layer(0, 3))
+
+        with self.assertRaises(ValueError):
+            DenseTimeGraphLayer(edges[:1], edges[:1]).extended(edges[1:])
+
+    def test_call_matches_summation(self):
+        rng = random.Random(42)
+        edges = [Confidence(rng.choice([0.0, 1 / 3, 0.5, 2 / 3, 1.0]) * duration, duration)
+                 for duration in [rng.choice([0.2, 0.5, 1.0]) for _ in range(200)]]
+        layer = DenseTimeGraphLayer(edges)
+
+        for _ in range(500):
+            i = rng.randrange(0, len(edges))
+            j = rng.randrange(i + 1, len(edges) + 1)
+            expected = sum(edges[i:j], start=Confidence.impartial())
+            self.assertAlmostEqual(expected.nom, layer(i, j).nom, places=9)
+            self.assertAlmostEqual(expected.denom, layer(i, j).denom, places=9)
+
+
+if __name__ == "__main__":
+    unittest.main()
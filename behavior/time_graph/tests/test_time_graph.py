@@ -0,0 +1,176 @@
+import random
+import unittest
+
+from ..layer import DenseTimeGraphLayer, LambdaTimeGraphLayer
+from ..time_graph import TimeGraph
+from ..types import BacktrackInfo
+
+from ...configuration import Configuration
+from ...data import Confidence, ConfidenceComparer
+
+
+def merge_backtrack_map(layers: list[DenseTimeGraphLayer], width: int,
+                        comparer: ConfidenceComparer) -> list[list[BacktrackInfo]]:
+    """
+    Compute ancestors of all nodes by concatenating, sorting and filtering lists of entries once a node is reached
+    again, as TimeGraph did before entries were kept in a BacktrackMap.
+    """
+    cmp = ConfidenceComparer.ConformityBased()
+    min_confidence = Confidence(Configuration.min_confidence, 1.0)
+    key_selector = comparer.get_key_sorter(-1)
+
+    def merge(left: BacktrackInfo, right: BacktrackInfo) -> BacktrackInfo:
+        merged = sorted(left + right, key=key_selector, reverse=True)
+        merged = [entry for entry in merged if comparer.compare(entry[-1], min_confidence) >= 0]
+        return merged[:Configuration.max_memory]
+
+    backtrack_map = [[[(-1, -1, Confidence.impartial())] for _ in range(width)],
+                     *[[[] for _ in range(width)] for _ in layers]]
+    for depth, layer in enumerate(layers):
+        is_unmerged = [False] * width
+        for time_start in range(width - 1):
+            source_ancestors = backtrack_map[depth][time_start]
+            for time_end in range(time_start + 1, width):
+                step_confidence = layer(time_start, time_end)
+                if cmp.compare(step_confidence, min_confidence) < 0:
+                    continue
+                if not source_ancestors:
+                    if is_unmerged[time_end]:
+                        backtrack_map[depth + 1][time_end] = merge([], backtrack_map[depth + 1][time_end])
+                        is_unmerged[time_end] = False
+                    continue
+
+                target_ancestors = [(time_start, idx, confidence + step_confidence)
+                                    for idx, (_, _, confidence) in enumerate(source_ancestors)]
+                if backtrack_map[depth + 1][time_end]:
+                    backtrack_map[depth + 1][time_end] = merge(target_ancestors, backtrack_map[depth + 1][time_end])
+                    is_unmerged[time_end] = False
+                else:
+                    backtrack_map[depth + 1][time_end] = target_ancestors
+                    is_unmerged[time_end] = True
+    return backtrack_map
+
+
+class TimeGraphTest(unittest.TestCase):
+
+    def test_compute(self):
+        walk = [Confidence.certain(1.0)] * 4 + [Confidence(0.0, 1.0)] * 4
+        stand = [Confidence(0.0, 1.0)] * 4 + [Confidence.certain(1.0)] * 4
+
+        graph = TimeGraph([DenseTimeGraphLayer(walk), DenseTimeGraphLayer(stand)], len(walk) + 1)
+        graph.compute()
+
+        # Nodes of the first layer are only reached from nodes of the virtual start layer
+        self.assertListEqual([], graph.backtrack_map.entries(1, 0))
+        self.assertEqual((0, 0, Confidence.certain(4.0)), graph.backtrack_map.entry(1, 4, 0))
+
+        path, confidence = graph.contracted.paths[0, 8]
+        self.assertListEqual([0, 4, 8], path)
+        self.assertEqual(Confidence.certain(8.0), confidence)
+
+    def test_compute_keeps_best_ancestors(self):
+        first = [Confidence.certain(1.0)] * 4
+        second = [Confidence.certain(1.0), Confidence(0.5, 1.0), Confidence.certain(1.0), Confidence.certain(1.0)]
+
+        max_memory = Configuration.max_memory
+        Configuration.max_memory = 2
+
+        graph = TimeGraph([DenseTimeGraphLayer(first), DenseTimeGraphLayer(second)], len(first) + 1)
+        graph.compute()
+
+        Configuration.max_memory = max_memory
+
+        # Best paths to node 4 start at 0 and continue via nodes 2 and 3 (equally), path via node 1 is less confident.
+        # New entries precede existing entries of equal rank, the later ancestor is therefore first.
+        ancestors = graph.backtrack_map.entries(2, 4)
+        self.assertEqual(2, len(ancestors))
+        self.assertListEqual([3, 2], [node_idx for node_idx, _, _ in ancestors])
+        self.assertEqual(Confidence.certain(4.0), ancestors[0][-1])
+
+        # Comparers with a scalar key rank entries in the backtrack map, in the same order
+        Configuration.max_memory = 2
+        scalar_graph = TimeGraph([DenseTimeGraphLayer(first), DenseTimeGraphLayer(second)], len(first) + 1,
+                                 comparer=ConfidenceComparer(1))
+        scalar_graph.compute()
+        Configuration.max_memory = max_memory
+
+        self.assertIsNotNone(scalar_graph.scalar_key)
+        self.assertListEqual(ancestors, scalar_graph.backtrack_map.entries(2, 4))
+        self.assertListEqual([-4.0, -4.0], scalar_graph.backtrack_map.ranks[2, 4].tolist())
+
+    def test_compute_keeps_unmerged_ancestors(self):
+        # Ancestors of a node reached by a single edge are neither sorted nor filtered by comparer
+        graph = TimeGraph([DenseTimeGraphLayer([Confidence(0.33, 0.5)])], 2)
+        self.assertDictEqual({(0, 1): ([0, 1], Confidence(0.33, 0.5))}, graph.contracted.paths)
+
+        rng = random.Random(42)
+        for comparer in [ConfidenceComparer(Configuration.confidence_coefficient), ConfidenceComparer(1)]:
+            for _ in range(50):
+                width = rng.randint(2, 10)
+                layers = [DenseTimeGraphLayer([Confidence(rng.choice([0.0, 0.33, 0.5, 0.7, 1.0]) * duration, duration)
+                                               for duration in [rng.choice([0.5, 1.0]) for _ in range(width - 1)]])
+                          for _ in range(rng.randint(1, 3))]
+
+                graph = TimeGraph(layers, width, comparer=comparer, prune_dead_ends=False)
+                graph.compute()
+                backtrack_map = merge_backtrack_map(layers, width, comparer)
+                for depth in range(1, len(layers) + 1):
+                    for time in range(width):
+                        self.assertListEqual(backtrack_map[depth][time], graph.backtrack_map.entries(depth, time))
+
+    def test_compute_prunes_unconfident_edges(self):
+        walk = [Confidence(0.0, 1.0)] * 4
+
+        graph = TimeGraph([DenseTimeGraphLayer(walk)], len(walk) + 1)
+        graph.compute()
+
+        self.assertEqual(0, graph.backtrack_map.counts[1].sum())
+        self.assertListEqual([], graph.best_paths())
+
+    def test_compute_prunes_dead_ends(self):
+        def create_layer(min_length: int) -> LambdaTimeGraphLayer:
+            def weighting(i: int, j: int) -> Confidence:
+                return Confidence.certain(j - i) if j - i >= min_length else Confidence(0.0, j - i)
+
+            return LambdaTimeGraphLayer(weighting, 10, ranging=lambda i, width: (min(i + min_length, width), width))
+
+        graph = TimeGraph([create_layer(3), create_layer(4)], 11)
+        graph.compute()
+
+        # Edges of the first layer ending after node 6 cannot be followed by edges of the second one
+        self.assertEqual(0, graph.backtrack_map.counts[1, 7:].sum())
+        self.assertGreater(graph.pruned_dead_ends, 0)
+
+        unpruned_graph = TimeGraph([create_layer(3), create_layer(4)], 11, prune_dead_ends=False)
+        unpruned_graph.compute()
+
+        self.assertEqual(0, unpruned_graph.pruned_dead_ends)
+        self.assertGreater(unpruned_graph.backtrack_map.counts[1, 7:].sum(), 0)
+        self.assertDictEqual(unpruned_graph.contracted.paths, graph.contracted.paths)
+        self.assertTrue((unpruned_graph.backtrack_map.records[-1] == graph.backtrack_map.records[-1]).all())
+
+    def test_upper_bound(self):
+        walk = [Confidence.certain(1.0)] * 4 + [Confidence(0.0, 1.0)] * 4
+        stand = [Confidence(0.5, 1.0)] * 4 + [Confidence(1.0, 2.0)] * 4
+
+        graph = TimeGraph([DenseTimeGraphLayer(walk), DenseTimeGraphLayer(stand)], len(walk) + 1)
+        noms, denoms, conformity = graph.window_bounds()
+        self.assertListEqual([1.0] * 4 + [1.0] * 4, noms.tolist())
+        self.assertListEqual([1.0] * 4 + [2.0] * 4, denoms.tolist())
+        self.assertEqual(1.0, conformity)
+
+        # Bound is not computed from paths
+        upper_bound = graph.upper_bound()
+        self.assertFalse(graph.is_computed)
+        self.assertEqual(Confidence(8.0, 8.0), upper_bound)
+        for _, confidence in graph.best_paths():
+            self.assertLessEqual(confidence.nom, upper_bound.nom)
+            self.assertLessEqual(float(confidence), float(upper_bound))
+
+        # Layers with no bounds do not bound the graph
+        unbounded_graph = TimeGraph([DenseTimeGraphLayer(walk), LambdaTimeGraphLayer(lambda i, j: walk[i], 8)], 9)
+        self.assertIsNone(unbounded_graph.upper_bound())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,67 +1,94 @@
 from __future__ import annotations
 
+import itertools
+import math
 from datetime import timedelta, datetime
 from typing import Callable, Any
 
-from .layer import TimeGraphLayer, ContractedTimeGraphLayer
-from .types import BacktrackMap, BacktrackInfo, ContractedPathEntry, ContractedTimetableEntry
+import numpy as np
+
+from .layer import TimeGraphLayer, ContractedTimeGraphLayer, max_window_bounds
+from .backtrack_map import BacktrackMap
+from .types import BacktrackEntry, ContractedPathEntry, ContractedTimetableEntry, WindowBounds
 
 from ..configuration import Configuration
-from ..data import Confidence, ConfidenceComparer
+from ..data import Confidence, ConfidenceComparer, to_micros, from_micros
 
 
 class TimeGraph:
     layers: list[TimeGraphLayer]
     width: int
 
-    timetable: list[timedelta]
-    """Of size self.width, where i-th value is accumulated duration of all blocks [0:i+1] of processed data"""
+    timetable: list[int]
+    """Of size self.width - self.offset, where i-th value is accumulated duration of all blocks [0:offset+i] of
+    processed data in microseconds (see to_micros), converted to time only once paths are returned"""
     reference_time: datetime
 
+    offset: int = 0
+    """Index of the first retained node, nodes before it were discarded (see discard_before).
+    Layers are computed over blocks starting at offset, i.e., are indexed relatively to it."""
+    computed_width: int = 0
+    """Number of nodes whose ancestors were computed"""
+
     max_memory: int
     min_confidence: Confidence
 
+    prune_dead_ends: bool
+    """Whether nodes from which no node of the last layer is reachable are skipped"""
+    pruned_unreachable: int = 0
+    """Number of nodes skipped during computing, as they were not reached by any confident path"""
+    pruned_dead_ends: int = 0
+    """Number of nodes skipped during computing, as no node of the last layer is reachable from them"""
+
     comparer: ConfidenceComparer
     comparer_as_key_selector: Callable[[Any], Any]
+    scalar_key: Callable[[Confidence], float] | None
+    """Scalar key of comparer (see ConfidenceComparer.get_scalar_key), by which entries are ranked in backtrack_map"""
 
-    is_computed: bool = False
     backtrack_map: BacktrackMap = None
     contracted_layer: ContractedTimeGraphLayer = None
+    contracted_paths: list[ContractedPathEntry]
+    """Paths of the contracted layer, kept so that only paths ending in appended nodes are backtracked once the
+    graph is extended"""
+    contracted_width: int = 0
+    """Number of nodes whose paths were backtracked into contracted_paths"""
 
     name: str | None
 
     def __init__(self, layers: list[TimeGraphLayer], width: int,
                  comparer: ConfidenceComparer = ConfidenceComparer(Configuration.confidence_coefficient),
-                 timetable: list[timedelta] | None = None,
+                 timetable: list[int] | None = None,
                  reference_time: datetime | None = None,
-                 name: str | None = None):
+                 name: str | None = None,
+                 prune_dead_ends: bool | None = None):
         """
 
         :param layers: List of computed layers of children of the calling SequentialLayer.
         :param width: Number of blocks in the processed data.
         :param comparer: Specific version of ConfidenceComparer deciding whether accuracy or reliability are preferred.
-        :param timetable: List of durations of processed blocks.
+        :param timetable: List of durations of processed blocks in microseconds.
         :param name: Name of the layer for debugging purposes
+        :param prune_dead_ends: Whether nodes from which the last layer cannot be reached are skipped.
+        Defaults to Configuration.prune_dead_ends.
         """
         self.layers = layers
         self.width = width
 
         if timetable is None:
-            self.timetable = [timedelta(i) for i in range(width + 1)]
+            self.timetable = [to_micros(timedelta(i)) for i in range(width + 1)]
         else:
-            self.timetable = []
-            acc = timedelta(0)
-            for time in timetable:
-                self.timetable.append(acc)
-                acc += time
-            self.timetable.append(acc)
+            self.timetable = list(itertools.accumulate(timetable, initial=0))
         self.reference_time = reference_time
 
         self.min_confidence = Confidence(Configuration.min_confidence, 1.0)
         self.max_memory = Configuration.max_memory
+        self.prune_dead_ends = Configuration.prune_dead_ends if prune_dead_ends is None else prune_dead_ends
 
         self.comparer = comparer
         self.comparer_as_key_selector = self.comparer.get_key_sorter(-1)
+        self.scalar_key = self.comparer.get_scalar_key()
+
+        self.contracted_paths = []
 
         self.name = name
 
@@ -69,97 +96,287 @@ class TimeGraph:
     def height(self) -> int:
         return len(self.layers)
 
+    @property
+    def is_computed(self) -> bool:
+        return self.computed_width == self.width
+
+    def extend(self, layers: list[TimeGraphLayer], timetable: list[int]):
+        """
+        Extend the graph by newly appended blocks. Ancestors of already computed nodes are final, as edges only lead
+        forward in time, only nodes of appended blocks are therefore computed.
+        Dead ends may no longer be such with appended blocks, pruning of dead ends is therefore turned off and if any
+        were pruned, the graph is recomputed.
+        :param layers: Layers of children of the calling SequentialLayer, computed over all retained blocks
+        (i.e., starting at offset), including the appended ones.
+        :param timetable: List of durations of appended blocks in microseconds.
+        """
+        self.layers = layers
+        self.width += len(timetable)
+
+        for time in timetable:
+            self.timetable.append(self.timetable[-1] + time)
+
+        self.contracted_layer = None
+
+        self.prune_dead_ends = False
+        if self.pruned_dead_ends:
+            self.backtrack_map.clear()
+            self.computed_width = self.offset
+            self.pruned_unreachable = self.pruned_dead_ends = 0
+            self.contracted_paths = []
+            self.contracted_width = 0
+
+    def discard_before(self, time: int):
+        """
+        Discard nodes before time, so that memory stays bounded when the graph is extended repeatedly. Paths leading
+        through discarded nodes can no longer be backtracked and are omitted from results. Layers passed to later
+        extensions must be computed over blocks starting at the new offset.
+        """
+        time = min(time, self.computed_width)
+        if time <= self.offset:
+            return
+
+        if self.backtrack_map is not None:
+            self.backtrack_map.discard_before(time)
+        self.timetable = self.timetable[time - self.offset:]
+        self.offset = time
+        self.contracted_layer = None
+
     def compute(self):
         if self.is_computed:
             return
 
         cmp = ConfidenceComparer.ConformityBased()
         min_confidence = Confidence(Configuration.min_confidence, 1.0)
+        offset = self.offset
+        computed_width = self.computed_width
 
-        backtrack_map = [
-            # ancestor of first layer is virtual #START node
-            [[(-1, -1, Confidence.impartial())] for _ in range(self.width)],
+        if self.backtrack_map is None:
             # ancestors of next layers are to be computed (+ #END layer)
-            *[[[] for _ in range(self.width)] for _ in self.layers]
-        ]
+            self.backtrack_map = BacktrackMap(self.height + 1, self.width, max(self.max_memory, 1))
+        else:
+            self.backtrack_map.extend(self.width)
+        backtrack_map = self.backtrack_map
+        # ancestor of first layer is virtual #START node, i.e., entry (-1, -1, Confidence.impartial())
+        backtrack_map.counts[0, computed_width - offset:] = 1
+
+        # Edges outside of layers' end ranges have zero nominators. These can only be skipped if they are never
+        # confident enough, which does not hold e.g. for zero minimal confidence.
+        is_range_limited = np.signbit(cmp.compare_arrays(0.0, [0.0, 1.0, np.inf],
+                                                         min_confidence.nom, min_confidence.denom)).all()
+        end_ranges = self.__compute_end_ranges() if is_range_limited else None
+        is_completing = self.__compute_completing(end_ranges) \
+            if is_range_limited and self.prune_dead_ends and computed_width == offset else None
 
         for depth, layer in enumerate(self.layers):
-            for time_start in range(self.width - 1):
+            # Ranking keys of entries of nodes at depth + 1, kept alongside the entries to avoid recomputing them.
+            # Scalar keys are kept in backtrack_map instead.
+            target_keys = {} if self.scalar_key is None else None
+            # Nodes whose ancestors were assigned from a single edge, without being merged (i.e., sorted and filtered)
+            is_unmerged = np.zeros(self.width - offset, dtype=bool)
+
+            for time_start in range(offset, self.width - 1):
+
+                # Only nodes not computed yet are targeted
+                end_from, end_to = max(time_start + 1, computed_width), self.width
+                if end_from >= end_to:
+                    continue
+
+                if is_completing is not None and not is_completing[depth, time_start - offset]:
+                    self.pruned_dead_ends += 1
+                    continue
+
+                source_ancestors = backtrack_map.entries(depth, time_start)
+                if not source_ancestors:
+                    self.pruned_unreachable += 1
+
+                if is_range_limited:
+                    range_from, range_to = (end_ranges[depth, time_start - offset] + offset).tolist()
+                    end_from, end_to = max(end_from, range_from), min(end_to, range_to)
+                    if end_from >= end_to:
+                        continue
 
-                source_ancestors = backtrack_map[depth][time_start]
+                # Merging no ancestors only affects nodes which have not been merged yet
+                if not source_ancestors and not is_unmerged[end_from - offset:end_to - offset].any():
+                    continue
 
-                for time_end in range(time_start + 1, self.width):
-                    step_confidence = layer(time_start, time_end)
+                steps = layer.row(time_start - offset, end_from - offset, end_to - offset)
+                is_confident = ~np.signbit(cmp.compare_arrays(steps.noms, steps.denoms,
+                                                              min_confidence.nom, min_confidence.denom))
+                if is_completing is not None:
+                    is_confident &= is_completing[depth + 1, end_from - offset:end_to - offset]
+                time_ends = np.flatnonzero(is_confident) + end_from
 
-                    if cmp.compare_int(step_confidence, min_confidence) < 0:
-                        continue
+                if not source_ancestors:
+                    for time_end in time_ends[is_unmerged[time_ends - offset]].tolist():
+                        self.__merge_backtrack_entries(backtrack_map, depth + 1, time_end, target_keys)
+                    is_unmerged[time_ends - offset] = False
+                    continue
 
+                for time_end, step_confidence in zip(time_ends.tolist(), steps[is_confident]):
                     target_ancestors = [(time_start, idx, confidence + step_confidence)
                                         for idx, (_, _, confidence) in enumerate(source_ancestors)]
 
-                    existing_ancestors = backtrack_map[depth + 1][time_end]
-                    if existing_ancestors:
-                        backtrack_map[depth + 1][time_end] = self.__merge_backtrack_info(target_ancestors,
-                                                                                         existing_ancestors)
-                    else:
-                        backtrack_map[depth + 1][time_end] = target_ancestors
-
-        self.is_computed = True
-        self.backtrack_map = backtrack_map
-
-    def __merge_backtrack_info(self, left: BacktrackInfo, right: BacktrackInfo) -> BacktrackInfo:
-        merge: BacktrackInfo = left + right
-        merge = sorted(merge, key=self.comparer_as_key_selector, reverse=True)
-        merge = [(node_idx, path_idx, conf)
-                 for node_idx, path_idx, conf in merge
-                 if self.comparer.compare(conf, self.min_confidence) >= 0]
-        return merge[:self.max_memory]
-
-    def __backtrack_all(self, time: int, depth: int) -> list[list[int]]:
-        depth = depth % len(self.backtrack_map)
-        finish_node = self.backtrack_map[depth][time]
-        paths = []
-        for backtrack_info in finish_node:
-            path = [time]
-            while depth >= 0:
-                node_idx = backtrack_info[0]
-                path_idx = backtrack_info[1]
-                depth -= 1
-                backtrack_info = self.backtrack_map[depth][node_idx][path_idx]
-                path.append(node_idx)
-            path.reverse()
-            paths.append(path)
-        return paths
-
-    def __backtrack(self, time: int, depth: int, idx: int) -> list[int]:
-        depth = depth % len(self.backtrack_map)
-        finish_node = self.backtrack_map[depth][time]
-        backtrack_info = finish_node[idx]
-        path = [time]
-        while depth > 0:
-            node_idx = backtrack_info[0]
-            path_idx = backtrack_info[1]
-            depth -= 1
-            backtrack_info = self.backtrack_map[depth][node_idx][path_idx]
-            path.append(node_idx)
-        path.reverse()
-        return path
+                    if backtrack_map.count(depth + 1, time_end) == 0:
+                        # Ancestors reached by a single edge are kept as they are, until the node is reached again
+                        self.__assign_backtrack_entries(backtrack_map, depth + 1, time_end, target_ancestors)
+                        is_unmerged[time_end - offset] = True
+                        continue
+                    if is_unmerged[time_end - offset]:
+                        self.__merge_backtrack_entries(backtrack_map, depth + 1, time_end, target_keys)
+                        is_unmerged[time_end - offset] = False
+
+                    # Inserted in reverse, so that new entries of equal rank keep their order
+                    keys = target_keys.setdefault(time_end, []) if target_keys is not None else None
+                    for entry in reversed(target_ancestors):
+                        self.__insert_backtrack_entry(backtrack_map, depth + 1, time_end, keys, entry)
+
+        self.computed_width = self.width
+
+    def __compute_end_ranges(self) -> np.ndarray:
+        """
+        Compute end ranges of edges from all retained nodes of all layers.
+        :return: Array of shape (height, width - offset, 2), holding ranges relative to offset.
+        """
+        width = self.width - self.offset
+        end_ranges = np.empty((self.height, width, 2), dtype=np.int64)
+        for depth, layer in enumerate(self.layers):
+            end_ranges[depth, :-1] = [layer.end_range(time, width) for time in range(width - 1)]
+            end_ranges[depth, -1] = width, width
+        return end_ranges
+
+    def __compute_completing(self, end_ranges: np.ndarray) -> np.ndarray:
+        """
+        Backward pass over the graph, finding nodes from which any node of the last layer is reachable via edges
+        within end ranges, i.e., those which are not dead ends. Other nodes cannot be on any complete path.
+        :return: Boolean array of shape (height + 1, width - offset).
+        """
+        width = self.width - self.offset
+        is_completing = np.zeros((self.height + 1, width), dtype=bool)
+        is_completing[-1] = True
+        for depth in range(self.height - 1, -1, -1):
+            reachable_counts = np.concatenate([[0], np.cumsum(is_completing[depth + 1])])
+            range_from = np.maximum(end_ranges[depth, :, 0], np.arange(1, width + 1)).clip(max=width)
+            range_to = end_ranges[depth, :, 1].clip(max=width)
+            is_completing[depth] = reachable_counts[np.maximum(range_from, range_to)] > reachable_counts[range_from]
+        return is_completing
+
+    def __assign_backtrack_entries(self, backtrack_map: BacktrackMap, depth: int, time: int,
+                                   entries: list[BacktrackEntry]):
+        """
+        Replace entries of a node by entries in their given order, ranked if comparer has a scalar key.
+        """
+        ranks = [-self.scalar_key(confidence) for _, _, confidence in entries] if self.scalar_key is not None else None
+        backtrack_map.assign(depth, time, entries, ranks)
+
+    def __merge_backtrack_entries(self, backtrack_map: BacktrackMap, depth: int, time: int,
+                                  target_keys: dict[int, list] | None):
+        """
+        Merge entries of a node reached by a single edge so far with no new entries, i.e., sort them from the best,
+        discard those below minimal confidence and limit them to max_memory entries.
+        :param target_keys: Ranking keys of entries of nodes at depth (see compute), None if comparer has a scalar key.
+        """
+        entries = sorted(backtrack_map.entries(depth, time), key=self.comparer_as_key_selector, reverse=True)
+        entries = [entry for entry in entries
+                   if self.comparer.compare(entry[-1], self.min_confidence) >= 0][:self.max_memory]
+        self.__assign_backtrack_entries(backtrack_map, depth, time, entries)
+        if target_keys is not None:
+            target_keys[time] = [self.comparer_as_key_selector(entry) for entry in entries]
+
+    def __insert_backtrack_entry(self, backtrack_map: BacktrackMap, depth: int, time: int, keys: list | None,
+                                 entry: BacktrackEntry):
+        """
+        Insert entry into incoming edges of a merged node, which are kept sorted from the best and limited to
+        max_memory entries. Entries are placed before existing entries of equal rank, as a stable sort of new entries
+        followed by existing ones would. Entries below minimal confidence are discarded.
+        :param keys: Ranking keys of entries of the node, modified in place. None if comparer has a scalar key, whose
+        negated values rank entries in backtrack_map instead.
+        """
+        if self.comparer.compare(entry[-1], self.min_confidence) < 0:
+            return
+
+        if keys is None:
+            rank = -self.scalar_key(entry[-1])
+            idx = backtrack_map.position(depth, time, rank)
+            if idx < self.max_memory:
+                backtrack_map.insert(depth, time, idx, entry, rank)
+            return
+
+        key = self.comparer_as_key_selector(entry)
+        low, high = 0, len(keys)
+        while low < high:
+            mid = (low + high) // 2
+            if key < keys[mid]:
+                low = mid + 1
+            else:
+                high = mid
+
+        if low >= self.max_memory:
+            return
+
+        backtrack_map.insert(depth, time, low, entry)
+        keys.insert(low, key)
+        if len(keys) > self.max_memory:
+            keys.pop()
+
+    def __backtrack_all(self, time: int, depth: int) -> list[list[int] | None]:
+        depth = depth % self.backtrack_map.depth
+        return [self.backtrack_map.backtrack(depth, time, idx) for idx in range(self.backtrack_map.count(depth, time))]
+
+    def __backtrack(self, time: int, depth: int, idx: int) -> list[int] | None:
+        depth = depth % self.backtrack_map.depth
+        return self.backtrack_map.backtrack(depth, time, idx)
 
     def __create_contracted_layer(self):
         if self.contracted_layer is not None:
             return
 
-        contracted_edge_info: list[ContractedPathEntry] = []
-        for final_time in range(self.width):
-            if not self.backtrack_map[-1][final_time]:
-                continue
-
-            for nth_best in range(len(self.backtrack_map[-1][final_time])):
-                _, _, confidence = self.backtrack_map[-1][final_time][nth_best]
+        # Paths ending in nodes computed before the graph was extended are final, unless they lead through nodes
+        # discarded since then
+        contracted_edge_info: list[ContractedPathEntry] = [(path, confidence)
+                                                           for path, confidence in self.contracted_paths
+                                                           if path[0] >= self.offset]
+        for final_time in range(max(self.offset, self.contracted_width), self.width):
+            for nth_best in range(self.backtrack_map.count(-1, final_time)):
+                _, _, confidence = self.backtrack_map.entry(-1, final_time, nth_best)
                 path = self.__backtrack(final_time, -1, nth_best)
-                contracted_edge_info.append((path, confidence))
+                if path is not None:
+                    contracted_edge_info.append((path, confidence))
+
+        self.contracted_paths = contracted_edge_info
+        self.contracted_width = self.width
 
-        self.contracted_layer = ContractedTimeGraphLayer(contracted_edge_info, name=self.name)
+        # Bounds of layers are relative to offset, while contracted paths are not
+        self.contracted_layer = ContractedTimeGraphLayer(contracted_edge_info, name=self.name,
+                                                         bounding=self.window_bounds if self.offset == 0 else None,
+                                                         offset=self.offset)
+
+    def window_bounds(self) -> WindowBounds | None:
+        """
+        Bounds of confidences of paths (see TimeGraphLayer.window_bounds). Each step of a path is an edge of a layer,
+        steps span disjoint ranges of windows, hence bounds of any of the layers bound each window of a path.
+        """
+        return max_window_bounds([layer.window_bounds() for layer in self.layers])
+
+    def upper_bound(self) -> Confidence | None:
+        """
+        Bound of confidences of all paths of the graph, which does not require computing the graph. Its nominator
+        is at least that of any path, so is its conformity.
+        :return: Bounding confidence, or None if any of the layers provides no bounds, or if the bound is infinite.
+        """
+        bounds = self.window_bounds()
+        if bounds is None:
+            return None
+
+        noms, _, conformity = bounds
+        nom = float(np.sum(noms))
+        if not math.isfinite(nom) or not math.isfinite(conformity):
+            return None
+        if nom == 0:
+            return Confidence.impartial()
+        if conformity == 0:
+            return Confidence(nom, float('inf'))
+        return Confidence(nom, nom / conformity)
 
     @property
     def contracted(self) -> ContractedTimeGraphLayer:
@@ -168,7 +385,7 @@ class TimeGraph:
         return self.contracted_layer
 
     def path_to_time(self, path: list[int]) -> list[datetime]:
-        return [self.reference_time + self.timetable[idx] for idx in path]
+        return [self.reference_time + from_micros(self.timetable[idx - self.offset]) for idx in path]
 
     def best_paths_debug(self, n: int | None = None):
         self.compute()
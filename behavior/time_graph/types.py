@@ -1,16 +1,18 @@
 from datetime import datetime
 
+import numpy as np
+
 from ..data import Confidence
 
 BacktrackEntry = tuple[int, int, Confidence]
 """ [index of parent in prev. layer, index of prev. path segment in parent, incoming confidence] """
 BacktrackInfo = list[BacktrackEntry]
 """ List of all confident incoming edges of a node. """
-BacktrackInfoRow = list[BacktrackInfo]
-""" List of BacktrackInfo for specific depth. """
-BacktrackMap = list[BacktrackInfoRow]
-""" 2D matrix representing confident edges for whole graph. """
 ContractedPathEntry = tuple[list[int], Confidence]
 """ Entry for single known path in contracted layer's memory. """
 
 ContractedTimetableEntry = tuple[list[datetime], Confidence]
+
+WindowBounds = tuple[np.ndarray, np.ndarray, float]
+""" Upper bounds of confidences of a layer's edges (see TimeGraphLayer.window_bounds):
+[bounds of nominators of windows, bounds of denominators of windows, bound of conformity] """
@@ -3,7 +3,7 @@ import csv
 import os
 import pickle
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta
 from random import sample
 
 from behavior import (BehaviorTemplate, AgentTuple, Agent, Confidence, parse_behavior, Configuration as BehaviorConfig,
@@ -234,6 +234,8 @@ if __name__ == "__main__":
     parser.add_argument('-c', '--min_confidence', type=float, default=None, help="Minimal threshold for confidence. Any intermediate confidence below this threshold will be removed from further processing.")
     parser.add_argument('-m', '--max_memory', type=int, default=None, help="Maximal size of memory stack for each node in time graph.")
     parser.add_argument('--and_strategy', choices=['avg', 'min'], default=None, help="Strategy used for conjunction of confidences.")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="Number of worker processes used for query search. Defaults to a serial search.")
+    parser.add_argument('-t', '--time_budget', type=float, default=None, help="Time budget of query search in seconds. If set, the most promising agent selections are searched first and best results found within the budget are returned.")
 
     parser.add_argument('-r', '--results_path', type=str, default=None, help="Path where results are saved/loaded. Defaults to ./results/<preset>/<query_file.name>.csv")
     parser.add_argument('-v', '--video_path', type=str, default=None, help="Path where video is stored. Defaults to ./videos/<preset>.mp4")
@@ -303,7 +305,8 @@ if __name__ == "__main__":
     if template is None:
         raise Exception("Template is undefined. Either query is not provided or results file is invalid.")
 
-    best_paths = template.search(agents, agent_tuples)
+    time_budget = timedelta(seconds=args.time_budget) if args.time_budget is not None else None
+    best_paths = template.search(agents, agent_tuples, workers=args.workers, time_budget=time_budget)
     save_paths(results_path, template, best_paths, args.results_path is None)
 
     agent_labels = [f"{var.name}" for var in template.variables]